@@ -22,6 +22,7 @@ Environment Variables (set these in your .env file or your hosting environment):
   
 Dependencies:  
 pip install quart aiohttp azure-communication-callautomation azure-eventgrid python-dotenv  
+pip install orjson  # optional, faster JSON for media frames (json_codec.py)  
   
 ACS Event Registration:  
 Register the /api/incomingCall endpoint as the ACS IncomingCall webhook or via an EventGrid subscription.  
@@ -34,7 +35,6 @@ python acs_realtime_module.py
   
 import asyncio  
 import base64  
-import json  
 import logging  
 import os  
 import uuid  
@@ -52,6 +52,8 @@ from azure.communication.callautomation import (
     MediaStreamingTransportType,  
 )  
 from azure.eventgrid import EventGridEvent, SystemEventNames  
+
+import json_codec
   
 # Load environment variables from .env file  
 dotenv.load_dotenv()  
@@ -105,7 +107,7 @@ async def incoming_call_handler() -> Response:
             validation_code = event.data["validationCode"]  
             validation_response = {"validationResponse": validation_code}  
             return Response(  
-                response=json.dumps(validation_response),  
+                response=json_codec.dumps(validation_response),  
                 status=200,  
                 mimetype="application/json",  
             )  
@@ -192,7 +194,7 @@ async def acs_realtime_bridge():
     if not caller_id:  
         error_msg = "No callerId provided in the query parameters."  
         logger.error(error_msg)  
-        await websocket.send(json.dumps({"error": error_msg}))  
+        await websocket.send(json_codec.dumps({"error": error_msg}))  
         return  
   
     # Construct the realtime endpoint URL by substituting the caller_id.  
@@ -214,7 +216,7 @@ async def acs_realtime_bridge():
                             break  
 
                         try:  
-                            data = json.loads(message)  
+                            data = json_codec.loads(message)  
                         except Exception as e:  
                             logger.error("Error decoding ACS message: %s", e)  
                             continue  
@@ -227,7 +229,7 @@ async def acs_realtime_bridge():
                                 "audio": audio_base64  
                             }  
                             try:  
-                                await realtime_ws.send_json(realtime_message)  
+                                await realtime_ws.send_json(realtime_message, dumps=json_codec.dumps)  
                             except Exception as send_err:  
                                 logger.error("Error sending message to realtime endpoint: %s", send_err)  
                                 break  
@@ -242,7 +244,7 @@ async def acs_realtime_bridge():
                                 logger.error("Received empty message from realtime endpoint.")  
                                 continue  
                             try:  
-                                message = json.loads(msg.data)  
+                                message = json_codec.loads(msg.data)  
                             except Exception as e:  
                                 logger.error("Error decoding realtime message: %s", e)  
                                 continue  
@@ -252,13 +254,13 @@ async def acs_realtime_bridge():
                                     "audioData": {"data": message["delta"]}  
                                 }  
                                 try:  
-                                    await websocket.send(json.dumps(acs_message))  
+                                    await websocket.send(json_codec.dumps(acs_message))  
                                 except Exception as send_err:  
                                     logger.error("Error sending realtime event to ACS: %s", send_err)  
                                     break  
                             elif message and message.get("type") == "input_audio_buffer.speech_started": #to interrupt the model's audio output
 
-                                    await websocket.send(json.dumps({"Kind": "StopAudio", "AudioData": None, "StopAudio": {}}))
+                                    await websocket.send(json_codec.dumps({"Kind": "StopAudio", "AudioData": None, "StopAudio": {}}))
 
                             else:  
                                 logger.debug("Unhandled realtime message: %s", message)  
@@ -271,7 +273,7 @@ async def acs_realtime_bridge():
         except Exception as e:  
             logger.error("Error connecting to /realtime endpoint: %s", e)  
             try:  
-                await websocket.send(json.dumps({"error": str(e)}))  
+                await websocket.send(json_codec.dumps({"error": str(e)}))  
             except Exception as se:  
                 logger.error("Error sending error message to ACS websocket: %s", se)  
 
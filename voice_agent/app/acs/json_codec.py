@@ -0,0 +1,43 @@
+"""
+JSON encoding and decoding for the ACS bridge's websocket frames.
+
+Every media frame is JSON in both directions, so the codec is on the hot path of each
+call. orjson is used when it is installed (several times faster than the json module on
+these payloads, mostly long base64 audio strings), the standard library otherwise;
+JSON_CODEC=json forces the standard library. dumps returns str, as websocket text frames
+carry, and can be passed to aiohttp's send_json; loads takes str or bytes.
+
+A copy of backend/json_codec.py, for the bridge's frames to ACS and to the realtime
+endpoint: the bridge is deployed on its own. Keep the two the same.
+"""
+
+import json
+import logging
+import os
+from typing import Any
+
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+JSON_CODEC = os.getenv("JSON_CODEC", "orjson" if orjson is not None else "json").lower()
+if JSON_CODEC == "orjson" and orjson is None:
+    logger.warning("JSON_CODEC=orjson, but orjson is not installed; using json")
+    JSON_CODEC = "json"
+
+if JSON_CODEC == "orjson":
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj)
+
+    loads = json.loads
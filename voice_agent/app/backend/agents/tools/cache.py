@@ -0,0 +1,239 @@
+"""
+Small caching building blocks shared by the agent tools.
+
+TTLLRUCache is a bounded, thread-safe in-process cache. RedisCacheTier is an optional
+shared tier that uses the same Redis settings as utility.SessionState
+(AZURE_REDIS_ENDPOINT / AZURE_REDIS_KEY), so several workers can share cached values.
+LookupCache puts either one in front of the booking lookup tools.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", 10000))
+LOOKUP_CACHE_TTL_SECONDS = float(os.getenv("LOOKUP_CACHE_TTL_SECONDS", 300))
+LOOKUP_CACHE_REDIS = os.getenv("LOOKUP_CACHE_REDIS", "false").lower() == "true"
+
+
+def redis_client_from_env() -> Optional[redis.StrictRedis]:
+    """Create a Redis client from the SessionState settings, or None when Redis is not configured."""
+    AZURE_REDIS_ENDPOINT = os.getenv("AZURE_REDIS_ENDPOINT")
+    AZURE_REDIS_KEY = os.getenv("AZURE_REDIS_KEY")
+    if not AZURE_REDIS_KEY:
+        return None
+    return redis.StrictRedis(host=AZURE_REDIS_ENDPOINT, port=6380, password=AZURE_REDIS_KEY, ssl=True)
+
+
+class TTLLRUCache:
+    """Bounded in-process cache with LRU eviction and a per-entry time to live."""
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = self._clock() + ttl_seconds if ttl_seconds is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._entries.pop(key, _MISSING) is not _MISSING
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisCacheTier:
+    """Shared cache tier in Redis; values are stored as bytes under a common key prefix."""
+
+    def __init__(self, client: redis.StrictRedis, prefix: str, ttl_seconds: Optional[float] = None,
+                 encode: Callable[[Any], bytes] = lambda value: value,
+                 decode: Callable[[bytes], Any] = lambda data: data):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.encode = encode
+        self.decode = decode
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get_many(self, keys: list[str]) -> list[Any]:
+        """Fetch several keys in one round trip; missing keys (or a Redis failure) come back as None."""
+        if not keys:
+            return []
+        try:
+            values = self.client.mget([self._key(key) for key in keys])
+        except redis.RedisError:
+            self.errors += 1
+            return [None] * len(keys)
+        found = [None if data is None else self.decode(data) for data in values]
+        hits = sum(value is not None for value in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def set_many(self, items: dict[str, Any]) -> None:
+        if not items:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(self._key(key), self.encode(value),
+                         ex=int(self.ttl_seconds) if self.ttl_seconds else None)
+            pipe.execute()
+        except redis.RedisError:
+            self.errors += 1
+
+    def delete_many(self, keys: list[str]) -> None:
+        if not keys:
+            return
+        try:
+            self.client.delete(*(self._key(key) for key in keys))
+        except redis.RedisError:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+class LookupCache:
+    """Read-through cache of tool results (JSON text) keyed by customer, ticket or reservation.
+
+    Writers call invalidate() with the keys a change made stale once it has committed.
+    Without a shared tier the results live in a TTLLRUCache; a load that overlapped an
+    invalidation is returned but not cached, so it cannot put stale data back. With a
+    shared Redis tier the Redis copy is the only one, so every worker sees an
+    invalidation immediately; the TTL bounds staleness from loads racing a change made
+    by another worker.
+    """
+
+    def __init__(self, max_entries: int = LOOKUP_CACHE_SIZE, ttl_seconds: float = LOOKUP_CACHE_TTL_SECONDS,
+                 shared: Optional[RedisCacheTier] = None):
+        self.local = None if shared else TTLLRUCache(max_entries, ttl_seconds)
+        self.shared = shared
+        self._lock = threading.Lock()
+        # Loads in progress per key; invalidate() drops a key's entry so those loads aren't cached.
+        self._loading: dict[str, set[object]] = {}
+        self.invalidated_keys = 0
+
+    def get_or_load(self, key: str, loader: Callable[[], str]) -> str:
+        if self.shared:
+            value = self.shared.get_many([key])[0]
+            if value is None:
+                value = loader()
+                self.shared.set_many({key: value})
+            return value
+        value = self.local.get(key)
+        if value is None:
+            token = object()
+            with self._lock:
+                self._loading.setdefault(key, set()).add(token)
+            try:
+                value = loader()
+            finally:
+                with self._lock:
+                    loads = self._loading.get(key)
+                    current = loads is not None and token in loads
+                    if current:
+                        loads.discard(token)
+                        if not loads:
+                            del self._loading[key]
+            if current:
+                self.local.set(key, value)
+        return value
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        with self._lock:
+            self.invalidated_keys += len(keys)
+            if self.local:
+                for key in keys:
+                    self._loading.pop(key, None)
+                    self.local.delete(key)
+        if self.shared:
+            self.shared.delete_many(keys)
+
+    def stats(self) -> dict:
+        stats = (self.shared or self.local).stats()
+        stats["invalidated_keys"] = self.invalidated_keys
+        return stats
+
+
+def create_lookup_cache(prefix: str) -> LookupCache:
+    """A LookupCache configured from LOOKUP_CACHE_*; prefix namespaces its keys in Redis."""
+    if LOOKUP_CACHE_REDIS:
+        client = redis_client_from_env()
+        if client is not None:
+            return LookupCache(shared=RedisCacheTier(
+                client, f"lookup:{prefix}", LOOKUP_CACHE_TTL_SECONDS,
+                encode=lambda value: value.encode("utf-8"),
+                decode=lambda data: data.decode("utf-8"),
+            ))
+        logger.warning("LOOKUP_CACHE_REDIS is set but Redis is not configured; using the in-process cache only")
+    return LookupCache()
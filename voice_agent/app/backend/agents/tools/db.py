@@ -0,0 +1,270 @@
+"""
+Pooled SQLAlchemy access for the tool databases.
+
+Every tool invocation opens its own session with `database.session()`, backed by a
+connection from a sized QueuePool, so concurrent conversations neither share ORM state
+nor serialize behind one module-level session. Pool usage (checked-out connections,
+time spent waiting for a connection, timeouts) is available from `pool_stats()`.
+
+Writes (booking changes) do not take a pooled session. They go through
+`await database.write(fn)`, which queues `fn(session)` for the database's single
+writer thread. The writer commits everything that queued up meanwhile in one
+transaction (group commit), each change in its own savepoint so that a failed one
+rolls back alone and no change is ever run twice. Concurrent bookings never contend
+for the SQLite write lock, and with WAL journaling readers are not blocked by the
+writer. `database.close()` commits the changes still queued and stops the writer.
+
+`create_schema()` doubles as the migration path for databases created before an index
+was declared on a model: missing tables are created and missing indexes are built.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+
+from sqlalchemy import MetaData, create_engine, event, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 4))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 10))
+# How long SQLite waits on a locked database before raising "database is locked".
+DB_BUSY_TIMEOUT_SECONDS = float(os.getenv("DB_BUSY_TIMEOUT_SECONDS", 15))
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", 64))
+
+
+class Database:
+    """A database engine with a sized connection pool that hands out one session per call."""
+
+    def __init__(self, url: str, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_POOL_MAX_OVERFLOW,
+                 pool_timeout: float = DB_POOL_TIMEOUT_SECONDS, journal_mode: str = DB_JOURNAL_MODE,
+                 synchronous: str = DB_SYNCHRONOUS, write_batch_max: int = DB_WRITE_BATCH_MAX):
+        self.engine = create_engine(
+            url,
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            # Sessions are used from the tool threads, never concurrently from two threads.
+            connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_SECONDS},
+        )
+
+        @event.listens_for(self.engine, "connect")
+        def _configure_connection(dbapi_connection, _):
+            # Let SQLAlchemy, not pysqlite, emit BEGIN so that savepoints work (see _begin).
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+            cursor.close()
+
+        @event.listens_for(self.engine, "begin")
+        def _begin(connection):
+            # The writer takes the write lock up front instead of upgrading a read transaction.
+            connection.exec_driver_sql("BEGIN IMMEDIATE" if connection.info.get("writer") else "BEGIN")
+
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.writer = BookingWriter(self, write_batch_max)
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def connect(self) -> Connection:
+        """A pooled connection; waiting time and pool timeouts are recorded in pool_stats()."""
+        start = time.perf_counter()
+        try:
+            connection = self.engine.connect()
+        except PoolTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            logger.warning("Timed out waiting for a database connection: %s", self.pool_stats())
+            raise
+        self._record_wait(time.perf_counter() - start)
+        return connection
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        """A session on its own pooled connection; rolled back on error and always returned to the pool."""
+        connection = self.connect()
+        session = Session(bind=connection, expire_on_commit=False)
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+            connection.close()
+
+    async def write(self, fn: Callable[[Session], T]) -> T:
+        """Run fn(session) as one atomic change on the writer thread and return its result once committed.
+
+        fn must not commit; if it raises, only its own changes are rolled back and the
+        exception is raised here.
+        """
+        return await asyncio.wrap_future(self.writer.submit(fn))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Commit the changes still queued, stop the writer and close the pooled connections."""
+        self.writer.close(timeout)
+        self.engine.dispose()
+
+    def create_schema(self, metadata: MetaData) -> list[str]:
+        """Create missing tables and build any declared index an existing table lacks."""
+        metadata.create_all(self.engine)
+        inspector = inspect(self.engine)
+        created = []
+        for table in metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    logger.info("Building index %s on %s", index.name, table.name)
+                    index.create(self.engine)
+                    created.append(index.name)
+        return created
+
+    def pool_stats(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_mean": 1000 * self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+            "wait_ms_max": 1000 * self.wait_seconds_max,
+        }
+
+
+class BookingWriter:
+    """Single writer thread for a database, committing queued changes in groups.
+
+    Started on the first submitted change; it holds one connection of its own until
+    close().
+    """
+
+    def __init__(self, database: Database, batch_max: int = DB_WRITE_BATCH_MAX):
+        self.database = database
+        self.batch_max = batch_max
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.writes = 0
+        self.failed = 0
+        self.groups = 0
+        self.group_size_max = 0
+        self.commit_seconds_total = 0.0
+
+    def submit(self, fn: Callable[[Session], T]) -> "Future[T]":
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The booking writer is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tool-db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((fn, future))
+        return future
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Commit the changes submitted so far and stop the writer thread; later submits raise."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._thread is None:
+                return
+            # Queued behind every change submitted before it.
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        connection = self.database.engine.connect()
+        connection.info["writer"] = True
+        closing = False
+        while not closing:
+            group = [self._queue.get()]
+            while group[-1] is not None and len(group) < self.batch_max:
+                try:
+                    group.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if group[-1] is None:
+                closing = True
+                group.pop()
+            if not group:
+                continue
+            try:
+                self._commit_group(connection, group)
+            except Exception:
+                logger.exception("Booking writer failed to commit a group of %d changes", len(group))
+        connection.close()
+
+    def _commit_group(self, connection: Connection, group: list) -> None:
+        group = [(fn, future) for fn, future in group if future.set_running_or_notify_cancel()]
+        session = Session(bind=connection, expire_on_commit=False)
+        applied = []
+        try:
+            for fn, future in group:
+                # A failed change rolls back to its savepoint alone; the others are kept
+                # as they are, so no change is ever run twice.
+                savepoint = session.begin_nested()
+                try:
+                    result = fn(session)
+                    savepoint.commit()
+                except Exception as e:
+                    savepoint.rollback()
+                    self.failed += 1
+                    future.set_exception(e)
+                    continue
+                applied.append((future, result))
+            start = time.perf_counter()
+            session.commit()
+            self.commit_seconds_total += time.perf_counter() - start
+        except Exception as e:
+            session.rollback()
+            self.failed += len(applied)
+            for future, _ in applied:
+                future.set_exception(e)
+            raise
+        finally:
+            session.close()
+        self.groups += 1
+        self.writes += len(applied)
+        self.group_size_max = max(self.group_size_max, len(group))
+        for future, result in applied:
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "failed": self.failed,
+            "groups": self.groups,
+            "mean_group_size": self.writes / self.groups if self.groups else 0.0,
+            "max_group_size": self.group_size_max,
+            "commit_ms_mean": 1000 * self.commit_seconds_total / self.groups if self.groups else 0.0,
+            "queued": self._queue.qsize(),
+        }
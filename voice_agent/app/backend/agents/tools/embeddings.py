@@ -0,0 +1,245 @@
+"""
+Query embeddings for the knowledge base tools, with a cache in front of Azure OpenAI.
+
+Knowledge base queries repeat a lot ("what's the baggage allowance"), so embeddings
+are cached by normalized query text and embedding deployment in a bounded LRU with a
+TTL. When EMBEDDING_CACHE_REDIS=true and Redis is configured for SessionState, a
+shared Redis tier sits behind the in-process one.
+
+Async callers (the kernel functions) go through EmbeddingBatcher, which coalesces
+concurrent requests from all sessions for up to EMBEDDING_BATCH_MAX_WAIT_MS or
+EMBEDDING_BATCH_MAX_SIZE inputs and sends them as one embeddings.create request.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from agents.tools.cache import RedisCacheTier, TTLLRUCache, redis_client_from_env
+
+logger = logging.getLogger(__name__)
+
+# Constants for Azure OpenAI
+AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_EMB_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMB_DEPLOYMENT")
+AZURE_OPENAI_EMB_ENDPOINT = os.getenv("AZURE_OPENAI_EMB_ENDPOINT", AZURE_OPENAI_ENDPOINT)
+AZURE_OPENAI_EMB_API_KEY = os.getenv("AZURE_OPENAI_EMB_API_KEY", AZURE_OPENAI_API_KEY)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 4096))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 24 * 3600))
+EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "false").lower() == "true"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 64))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+
+# Azure OpenAI client setup
+embedding_client = AzureOpenAI(
+    api_key=AZURE_OPENAI_EMB_API_KEY,
+    azure_endpoint=AZURE_OPENAI_EMB_ENDPOINT,
+    api_version="2023-12-01-preview"
+)
+async_embedding_client = AsyncAzureOpenAI(
+    api_key=AZURE_OPENAI_EMB_API_KEY,
+    azure_endpoint=AZURE_OPENAI_EMB_ENDPOINT,
+    api_version="2023-12-01-preview"
+)
+
+
+def normalize_query(text: str) -> str:
+    """Cache key form of a query: case-folded with whitespace collapsed."""
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """Two-tier (in-process LRU, optional shared Redis) cache of float32 query embeddings."""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS,
+                 redis_tier: Optional[RedisCacheTier] = None):
+        self.local = TTLLRUCache(max_entries, ttl_seconds)
+        self.shared = redis_tier
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        digest = hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def get_many(self, keys: list[str]) -> list[Optional[np.ndarray]]:
+        found = [self.local.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(found) if vector is None]
+        if self.shared and missing:
+            for i, vector in zip(missing, self.shared.get_many([keys[i] for i in missing])):
+                if vector is not None:
+                    self.local.set(keys[i], vector)
+                    found[i] = vector
+        return found
+
+    def set_many(self, items: dict[str, np.ndarray]) -> None:
+        for key, vector in items.items():
+            self.local.set(key, vector)
+        if self.shared:
+            self.shared.set_many(items)
+
+    def stats(self) -> dict:
+        stats = {"local": self.local.stats()}
+        if self.shared:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+def _create_cache() -> EmbeddingCache:
+    redis_tier = None
+    if EMBEDDING_CACHE_REDIS:
+        client = redis_client_from_env()
+        if client is not None:
+            redis_tier = RedisCacheTier(
+                client, "emb", EMBEDDING_CACHE_TTL_SECONDS,
+                encode=lambda vector: np.asarray(vector, dtype=np.float32).tobytes(),
+                decode=lambda data: np.frombuffer(data, dtype=np.float32),
+            )
+            logger.info("Using Redis for the shared embedding cache")
+        else:
+            logger.warning("EMBEDDING_CACHE_REDIS is set but Redis is not configured; using the in-process cache only")
+    return EmbeddingCache(redis_tier=redis_tier)
+
+
+embedding_cache = _create_cache()
+
+
+def get_embeddings(texts: list[str], model: str = AZURE_OPENAI_EMB_DEPLOYMENT) -> list[np.ndarray]:
+    """Generate text embeddings for a batch of texts, serving repeats from the cache."""
+    keys = [EmbeddingCache.key(text, model) for text in texts]
+    vectors = embedding_cache.get_many(keys)
+    missing = {}
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(keys[i], []).append(i)
+    if missing:
+        inputs = [texts[positions[0]].replace("\n", " ") for positions in missing.values()]
+        response = embedding_client.embeddings.create(input=inputs, model=model)
+        fetched = {}
+        for key, item in zip(missing, sorted(response.data, key=lambda item: item.index)):
+            fetched[key] = np.asarray(item.embedding, dtype=np.float32)
+            for i in missing[key]:
+                vectors[i] = fetched[key]
+        embedding_cache.set_many(fetched)
+    return vectors
+
+
+def get_embedding(text: str, model: str = AZURE_OPENAI_EMB_DEPLOYMENT) -> np.ndarray:
+    """Generate text embeddings using Azure OpenAI."""
+    return get_embeddings([text], model)[0]
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests into batched embeddings.create calls.
+
+    The first request for a deployment opens a batch window of max_wait_ms; the batch is
+    sent when the window closes or max_batch_size inputs are waiting, whichever comes
+    first, and each caller gets its own vector (or the request's exception) back.
+    """
+
+    def __init__(self, client: AsyncAzureOpenAI, max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: dict[str, list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._inflight: set[asyncio.Task] = set()
+        self.requests = 0
+        self.batches = 0
+        self.inputs_sent = 0
+
+    async def embed(self, text: str, model: str = AZURE_OPENAI_EMB_DEPLOYMENT) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(model, [])
+        pending.append((text.replace("\n", " "), future))
+        self.requests += 1
+        if len(pending) >= self.max_batch_size:
+            self._flush(model)
+        elif len(pending) == 1:
+            self._timers[model] = loop.call_later(self.max_wait_ms / 1000, self._flush, model)
+        return await future
+
+    def _flush(self, model: str) -> None:
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(model, [])
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(model, batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, model: str, batch: list[tuple[str, asyncio.Future]]) -> None:
+        inputs = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.inputs_sent += len(inputs)
+        try:
+            response = await self.client.embeddings.create(input=inputs, model=model)
+            vectors = {
+                inputs[item.index]: np.asarray(item.embedding, dtype=np.float32) for item in response.data
+            }
+            for text, future in batch:
+                if future.done():
+                    continue
+                if text in vectors:
+                    future.set_result(vectors[text])
+                else:
+                    future.set_exception(ValueError(
+                        f"embeddings response for {model} has no vector for one of its inputs"))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancelled with the batch on its way: its callers must not be left waiting either.
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "inputs_sent": self.inputs_sent,
+            "mean_batch_size": self.inputs_sent / self.batches if self.batches else 0.0,
+        }
+
+
+embedding_batcher = EmbeddingBatcher(async_embedding_client)
+
+
+async def aget_embeddings(texts: list[str], model: str = AZURE_OPENAI_EMB_DEPLOYMENT) -> list[np.ndarray]:
+    """Async get_embeddings: cache misses are coalesced with other sessions' requests."""
+    keys = [EmbeddingCache.key(text, model) for text in texts]
+    if embedding_cache.shared:
+        vectors = await asyncio.to_thread(embedding_cache.get_many, keys)
+    else:
+        vectors = embedding_cache.get_many(keys)
+    missing = {}
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(keys[i], []).append(i)
+    if missing:
+        fetched = await asyncio.gather(*(embedding_batcher.embed(texts[positions[0]], model)
+                                         for positions in missing.values()))
+        for positions, vector in zip(missing.values(), fetched):
+            for i in positions:
+                vectors[i] = vector
+        items = dict(zip(missing, fetched))
+        if embedding_cache.shared:
+            await asyncio.to_thread(embedding_cache.set_many, items)
+        else:
+            embedding_cache.set_many(items)
+    return vectors
+
+
+async def aget_embedding(text: str, model: str = AZURE_OPENAI_EMB_DEPLOYMENT) -> np.ndarray:
+    return (await aget_embeddings([text], model))[0]
@@ -0,0 +1,47 @@
+"""
+Run blocking tool work off the event loop.
+
+The kernel functions share the aiohttp event loop with the audio relay of every
+session on the worker, so anything that blocks (SQLAlchemy queries, vector scoring)
+is handed to a bounded thread pool instead of running inline.
+
+Database work goes through its own executor, sized to the connection pool (see db.py)
+so a database thread never waits on a connection another database thread holds.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, TypeVar
+
+from agents.tools.db import DB_POOL_SIZE
+
+T = TypeVar("T")
+
+TOOL_THREAD_POOL_SIZE = int(os.getenv("TOOL_THREAD_POOL_SIZE", min(8, (os.cpu_count() or 1) + 2)))
+DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", DB_POOL_SIZE))
+
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_THREAD_POOL_SIZE, thread_name_prefix="tool")
+db_executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE, thread_name_prefix="tool-db")
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run CPU-bound or blocking work on the tool thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(tool_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a database call on the database thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+
+def on_db_thread(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """Turn a blocking tool method into a coroutine function that runs on the database thread pool.
+
+    Apply it below @kernel_function; the wrapped signature (and its annotations) is kept.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await run_db(fn, *args, **kwargs)
+    return wrapper
@@ -1,8 +1,8 @@
 from typing import Annotated, Any  
 from semantic_kernel.functions import kernel_function  
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey  
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index  
 from sqlalchemy.ext.declarative import declarative_base  
-from sqlalchemy.orm import sessionmaker, relationship 
+from sqlalchemy.orm import relationship 
 from sqlalchemy.exc import SQLAlchemyError 
 from datetime import datetime, timedelta  
 from dateutil import parser  
@@ -11,24 +11,24 @@ import os
 import json  
 from dotenv import load_dotenv  
 from pathlib import Path  
-from scipy import spatial  
-from openai import AzureOpenAI  
+from agents.tools.cache import create_lookup_cache  
+from agents.tools.db import Database  
+from agents.tools.executor import on_db_thread, run_blocking  
+from agents.tools.embeddings import aget_embeddings, get_embeddings
+from agents.tools.knowledge_base import SearchClient  
   
   
 # Constants for Azure OpenAI  
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")  
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")  
-AZURE_OPENAI_EMB_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMB_DEPLOYMENT")
-AZURE_OPENAI_EMB_ENDPOINT = os.getenv("AZURE_OPENAI_EMB_ENDPOINT", AZURE_OPENAI_ENDPOINT)
-AZURE_OPENAI_EMB_API_KEY = os.getenv("AZURE_OPENAI_EMB_API_KEY", AZURE_OPENAI_API_KEY)
 AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")  
   
 # SQLAlchemy setup  
 Base = declarative_base()  
 sqllite_db_path = os.environ.get("SQLITE_DB_PATH", "./data/flight_db.db")  
-engine = create_engine(f'sqlite:///{sqllite_db_path}')  
-Session = sessionmaker(bind=engine)  
-session = Session()  
+# Each tool call gets its own session from the connection pool (see db.py)  
+database = Database(f'sqlite:///{sqllite_db_path}')  
+engine = database.engine  
   
 # Database models  
 class Customer(Base):  
@@ -53,39 +53,21 @@ class Flight(Base):
     gate = Column(String)  
     status = Column(String)  
   
-Base.metadata.create_all(engine)  
-  
-# Azure OpenAI client setup  
-embedding_client = AzureOpenAI(  
-    api_key=AZURE_OPENAI_EMB_API_KEY,  
-    azure_endpoint=AZURE_OPENAI_EMB_ENDPOINT,  
-    api_version="2023-12-01-preview"  
-)  
-  
-def get_embedding(text: str, model: str = AZURE_OPENAI_EMB_DEPLOYMENT) -> list[float]:  
-    """Generate text embeddings using Azure OpenAI."""  
-    text = text.replace("\n", " ")  
-    return embedding_client.embeddings.create(input=[text], model=model).data[0].embedding  
-  
-class SearchClient:  
-    """Client for performing semantic search on a knowledge base."""  
-    def __init__(self, emb_map_file_path: str):  
-        with open(emb_map_file_path) as file:  
-            self.chunks_emb = json.load(file)  
-  
-    def find_article(self, question: str, topk: int = 3) -> str:  
-        """Find relevant articles based on cosine similarity."""  
-        input_vector = get_embedding(question)  
-        cosine_list = [  
-            (item['id'], item['policy_text'], 1 - spatial.distance.cosine(input_vector, item['policy_text_embedding']))  
-            for item in self.chunks_emb  
-        ]  
-        cosine_list.sort(key=lambda x: x[2], reverse=True)  
-        cosine_list = cosine_list[:topk]  
-  
-        return "\n".join(f"{chunk_id}\n{content}" for chunk_id, content, _ in cosine_list)  
-search_client = SearchClient("./data/flight_policy.json")
-def query_flight_by_ticket(ticket_num: str):  
+    # One index per tool access path; status is last so each lookup is a single range scan  
+    __table_args__ = (  
+        Index('ix_flights_customer_status', 'customer_id', 'status'),  
+        Index('ix_flights_ticket_status', 'ticket_num', 'status'),  
+        Index('ix_flights_flight_departure_status', 'flight_num', 'departure_airport', 'status'),  
+    )  
+  
+# Also builds indexes missing from databases created before they were declared  
+database.create_schema(Base.metadata)  
+  
+# Either the JSON knowledge base or a binary store converted from it (see knowledge_base.py)  
+search_client = SearchClient(os.environ.get("FLIGHT_POLICY_PATH", "./data/flight_policy.json"), get_embeddings, aget_embeddings)
+# Lookup tool results by customer and by flight, invalidated by confirm_flight_change  
+lookup_cache = create_lookup_cache("flight")  
+def query_flight_by_ticket(session, ticket_num: str):  
     return session.query(Flight).filter_by(ticket_num=ticket_num, status="open").first()  
   
 # Kernel functions  
@@ -100,7 +82,7 @@ class Flight_Tools:
     async def search_airline_knowledgebase(self,  
         search_query: Annotated[str, "The search query to use to search the knowledge base."]  
     ) -> str:  
-        return search_client.find_article(search_query)  
+        return await search_client.afind_article(search_query)  
   
     @kernel_function(  
         name="query_flights",  
@@ -127,11 +109,16 @@ class Flight_Tools:
         name="check_flight_status",  
         description="Checks the flight status for a flight."  
     )  
-    async def check_flight_status(self,  
+    @on_db_thread  
+    def check_flight_status(self,  
         flight_num: Annotated[str, "The flight number."],  
         from_: Annotated[str, "The departure airport code."]  
     ) -> str:  
-        flight = session.query(Flight).filter_by(flight_num=flight_num, departure_airport=from_, status="open").first()  
+        return lookup_cache.get_or_load(f"status:{flight_num}:{from_}", lambda: self._flight_status(flight_num, from_))  
+  
+    def _flight_status(self, flight_num: str, from_: str) -> str:  
+        with database.session() as session:  
+            flight = session.query(Flight).filter_by(flight_num=flight_num, departure_airport=from_, status="open").first()  
         if flight:  
             return json.dumps({  
                 'flight_num': flight.flight_num,  
@@ -154,7 +141,17 @@ class Flight_Tools:
         new_arrival_time: Annotated[str, "The new arrival time."]  
     ) -> str:  
         charge = 80  
-        old_flight = query_flight_by_ticket(current_ticket_number)  
+        # One atomic transaction on the database's writer thread (see db.py)  
+        try:  
+            message, stale_keys = await database.write(lambda session: self._change_flight(  
+                session, charge, current_ticket_number, new_flight_number, new_departure_time, new_arrival_time))  
+        except SQLAlchemyError as e:  
+            return f"Failed to change the flight due to an error: {str(e)}"  
+        await run_blocking(lookup_cache.invalidate, stale_keys)  
+        return message  
+  
+    def _change_flight(self, session, charge, current_ticket_number, new_flight_number, new_departure_time, new_arrival_time) -> tuple[str, list[str]]:  
+        old_flight = query_flight_by_ticket(session, current_ticket_number)  
         if old_flight:  
             new_ticket_num = str(random.randint(1000000000, 9999999999))  
             new_flight = Flight(  
@@ -172,20 +169,19 @@ class Flight_Tools:
                 gate=old_flight.gate,  
                 status="open"  
             )  
-            try:
-                with session.begin():
-                    session.add(new_flight)
-                    old_flight.status = "cancelled"
-                    session.commit()
+            session.add(new_flight)
+            old_flight.status = "cancelled"
+            stale_keys = [
+                f"customer:{old_flight.customer_id}",
+                f"status:{old_flight.flight_num}:{old_flight.departure_airport}",
+                f"status:{new_flight_number}:{old_flight.departure_airport}",
+            ]
 
-                return (f"Your new flight is {new_flight_number}, departing from {new_flight.departure_airport} to {new_flight.arrival_airport} "
-                        f"on {new_departure_time}, arriving at {new_arrival_time}. Your new ticket number is {new_ticket_num}. "
-                        f"Your credit card has been charged ${charge}.")
-            except SQLAlchemyError as e:
-                session.rollback()
-                return f"Failed to change the flight due to an error: {str(e)}"  
+            return (f"Your new flight is {new_flight_number}, departing from {new_flight.departure_airport} to {new_flight.arrival_airport} "
+                    f"on {new_departure_time}, arriving at {new_arrival_time}. Your new ticket number is {new_ticket_num}. "
+                    f"Your credit card has been charged ${charge}."), stale_keys
  
-        return "Could not find the current ticket to change."  
+        return "Could not find the current ticket to change.", []  
   
     @kernel_function(  
         name="check_change_booking",  
@@ -204,10 +200,15 @@ class Flight_Tools:
         name="load_user_flight_info",  
         description="Loads the flight information for a user."  
     )  
-    async def load_user_flight_info(self,  
+    @on_db_thread  
+    def load_user_flight_info(self,  
         user_id: Annotated[str, "The user id."]  
     ) -> str:  
-        flights = session.query(Flight).filter_by(customer_id=user_id, status="open").all()  
+        return lookup_cache.get_or_load(f"customer:{user_id}", lambda: self._user_flights(user_id))  
+  
+    def _user_flights(self, user_id: str) -> str:  
+        with database.session() as session:  
+            flights = session.query(Flight).filter_by(customer_id=user_id, status="open").all()  
         if not flights:  
             return "Sorry, we cannot find any flight information for you."  
         return json.dumps([  
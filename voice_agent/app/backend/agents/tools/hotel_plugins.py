@@ -1,31 +1,33 @@
 from typing import Annotated, Any  
 from semantic_kernel.functions import kernel_function  
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey  
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index  
 from sqlalchemy.ext.declarative import declarative_base  
-from sqlalchemy.orm import sessionmaker, relationship  
+from sqlalchemy.orm import relationship  
+from sqlalchemy.exc import SQLAlchemyError  
 from datetime import datetime  
 import random  
 import os  
 import json  
 from dotenv import load_dotenv  
 from pathlib import Path  
-from scipy import spatial  
-from openai import AzureOpenAI  
+from agents.tools.cache import create_lookup_cache  
+from agents.tools.db import Database  
+from agents.tools.executor import on_db_thread, run_blocking  
+from agents.tools.embeddings import aget_embeddings, get_embeddings
+from agents.tools.knowledge_base import SearchClient  
   
   
 # Constants for Azure OpenAI  
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")  
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")  
-AZURE_OPENAI_EMB_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMB_DEPLOYMENT")
-AZURE_OPENAI_EMB_ENDPOINT = os.getenv("AZURE_OPENAI_EMB_ENDPOINT", AZURE_OPENAI_ENDPOINT)
-AZURE_OPENAI_EMB_API_KEY = os.getenv("AZURE_OPENAI_EMB_API_KEY", AZURE_OPENAI_API_KEY)  
 AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")  
   
 # SQLAlchemy setup  
 Base = declarative_base()  
-engine = create_engine('sqlite:///./data/hotel.db')  
-Session = sessionmaker(bind=engine)  
-session = Session()  
+hotel_db_path = os.environ.get("HOTEL_SQLITE_DB_PATH", "./data/hotel.db")  
+# Each tool call gets its own session from the connection pool (see db.py)  
+database = Database(f'sqlite:///{hotel_db_path}')  
+engine = database.engine  
   
 # Database models  
 class Customer(Base):  
@@ -44,40 +46,20 @@ class Reservation(Base):
     check_out_date = Column(DateTime)  
     status = Column(String)  
   
-Base.metadata.create_all(engine)  
-  
-# Azure OpenAI client setup  
-embedding_client = AzureOpenAI(  
-    api_key=AZURE_OPENAI_EMB_API_KEY,  
-    azure_endpoint=AZURE_OPENAI_EMB_ENDPOINT,  
-    api_version="2023-12-01-preview"  
-)  
-  
-def get_embedding(text: str, model: str = AZURE_OPENAI_EMB_DEPLOYMENT) -> list[float]:  
-    """Generate text embeddings using Azure OpenAI."""  
-    text = text.replace("\n", " ")  
-    return embedding_client.embeddings.create(input=[text], model=model).data[0].embedding  
-  
-class SearchClient:  
-    """Client for performing semantic search on a knowledge base."""  
-    def __init__(self, emb_map_file_path: str):  
-        with open(emb_map_file_path) as file:  
-            self.chunks_emb = json.load(file)  
+    # Lookups by id use the primary key; lookups by customer use this index  
+    __table_args__ = (  
+        Index('ix_reservations_customer_status', 'customer_id', 'status'),  
+    )  
   
-    def find_article(self, question: str, topk: int = 3) -> str:  
-        """Find relevant articles based on cosine similarity."""  
-        input_vector = get_embedding(question)  
-        cosine_list = [  
-            (item['id'], item['policy_text'], 1 - spatial.distance.cosine(input_vector, item['policy_text_embedding']))  
-            for item in self.chunks_emb  
-        ]  
-        cosine_list.sort(key=lambda x: x[2], reverse=True)  
-        cosine_list = cosine_list[:topk]  
+# Also builds indexes missing from databases created before they were declared  
+database.create_schema(Base.metadata)  
   
-        return "\n".join(f"{chunk_id}\n{content}" for chunk_id, content, _ in cosine_list)  
-search_client =SearchClient("./data/hotel_policy.json")
+# Either the JSON knowledge base or a binary store converted from it (see knowledge_base.py)  
+search_client = SearchClient(os.environ.get("HOTEL_POLICY_PATH", "./data/hotel_policy.json"), get_embeddings, aget_embeddings)
+# Lookup tool results by customer and by reservation, invalidated by confirm_reservation_change  
+lookup_cache = create_lookup_cache("hotel")  
 # Utility function for querying reservations  
-def query_reservation_by_id(reservation_id: str):  
+def query_reservation_by_id(session, reservation_id: str):  
     return session.query(Reservation).filter_by(id=reservation_id, status="booked").first()  
   
 # Kernel functions  
@@ -92,7 +74,7 @@ class Hotel_Tools:
     async def search_hotel_knowledgebase(self, 
         search_query: Annotated[str, "The search query to use to search the knowledge base."]  
     ) -> str:  
-        return search_client.find_article(search_query)  
+        return await search_client.afind_article(search_query)  
     
     @kernel_function(  
         name="query_rooms",  
@@ -113,10 +95,15 @@ class Hotel_Tools:
         name="check_reservation_status",  
         description="Checks the reservation status for a booking."  
     )  
-    async def check_reservation_status(self,  
+    @on_db_thread  
+    def check_reservation_status(self,  
         reservation_id: Annotated[str, "The reservation id."]  
     ) -> str:  
-        reservation = query_reservation_by_id(reservation_id)  
+        return lookup_cache.get_or_load(f"reservation:{reservation_id}", lambda: self._reservation_status(reservation_id))  
+  
+    def _reservation_status(self, reservation_id: str) -> str:  
+        with database.session() as session:  
+            reservation = query_reservation_by_id(session, reservation_id)  
         if reservation:  
             return json.dumps({  
                 'reservation_id': reservation.id,  
@@ -140,12 +127,23 @@ class Hotel_Tools:
         new_check_out_date: Annotated[str, "The new check-out date."]  
     ) -> str:  
         charge = 50  
-        old_reservation = query_reservation_by_id(current_reservation_id)  
+        # One atomic transaction on the database's writer thread (see db.py)  
+        try:  
+            message, stale_keys = await database.write(lambda session: self._change_reservation(  
+                session, charge, current_reservation_id, new_room_type, new_check_in_date, new_check_out_date))  
+        except SQLAlchemyError as e:  
+            return f"Failed to change the reservation due to an error: {str(e)}"  
+        await run_blocking(lookup_cache.invalidate, stale_keys)  
+        return message  
+  
+    def _change_reservation(self, session, charge, current_reservation_id, new_room_type, new_check_in_date, new_check_out_date) -> tuple[str, list[str]]:  
+        old_reservation = query_reservation_by_id(session, current_reservation_id)  
         if old_reservation:  
             old_reservation.status = "cancelled"  
-            session.commit()  
-    
-            new_reservation_id = str(random.randint(100000, 999999))  
+            # Changes run one at a time on the writer thread, so a free id stays free until commit  
+            new_reservation_id = random.randint(100000, 999999)  
+            while session.get(Reservation, new_reservation_id) is not None:  
+                new_reservation_id = random.randint(100000, 999999)  
             new_reservation = Reservation(  
                 id=new_reservation_id,  
                 customer_id=old_reservation.customer_id,  
@@ -156,14 +154,18 @@ class Hotel_Tools:
                 status="booked"  
             )  
             session.add(new_reservation)  
-            session.commit()  
+            stale_keys = [  
+                f"customer:{old_reservation.customer_id}",  
+                f"reservation:{current_reservation_id}",  
+                f"reservation:{new_reservation_id}",  
+            ]  
     
             return (  
                 f"Your new reservation for a {new_room_type} room is confirmed. "  
                 f"Check-in date: {new_check_in_date}, Check-out date: {new_check_out_date}. "  
                 f"New reservation ID: {new_reservation_id}. A charge of ${charge} has been applied."  
-            )  
-        return "Could not find the current reservation to change."  
+            ), stale_keys  
+        return "Could not find the current reservation to change.", []  
     
     @kernel_function(  
         name="check_change_reservation",  
@@ -181,10 +183,15 @@ class Hotel_Tools:
         name="load_user_reservation_info",  
         description="Loads the hotel reservation for a user."  
     )  
-    async def load_user_reservation_info(self,  
+    @on_db_thread  
+    def load_user_reservation_info(self,  
         user_id: Annotated[str, "The user id."]  
     ) -> str:  
-        reservations = session.query(Reservation).filter_by(customer_id=user_id, status="booked").all()  
+        return lookup_cache.get_or_load(f"customer:{user_id}", lambda: self._user_reservations(user_id))  
+  
+    def _user_reservations(self, user_id: str) -> str:  
+        with database.session() as session:  
+            reservations = session.query(Reservation).filter_by(customer_id=user_id, status="booked").all()  
         if not reservations:  
             return "Sorry, we cannot find any reservation information for you."  
         return json.dumps([  
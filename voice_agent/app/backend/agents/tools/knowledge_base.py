@@ -0,0 +1,363 @@
+"""
+Semantic search over the policy knowledge bases used by the agent tools.
+
+Embeddings are kept in a row-normalized float32 (or float16) matrix so that a query
+is scored with a single matrix-vector product, and the top-k results are picked
+with a partial selection instead of sorting the whole corpus.
+
+A knowledge base can be loaded from the original JSON file (a list of objects with
+`id`, `policy_text` and `policy_text_embedding`) or from a binary store directory:
+
+    <name>.kb/
+        manifest.json   count, dim and dtype of the store
+        embeddings.npy  normalized embedding matrix, memory-mapped read-only
+        records.jsonl   one {"id", "policy_text"} object per line
+        offsets.npy     byte offset of every line in records.jsonl
+
+Binary stores are opened with mmap, so worker processes on the same node share the
+page cache and start up in constant time regardless of corpus size. Convert an
+existing JSON file with:
+
+    python -m agents.tools.knowledge_base convert ./data/flight_policy.json ./data/flight_policy.kb
+
+A store can also carry an approximate nearest neighbour index (index.faiss), built
+offline with:
+
+    python -m agents.tools.knowledge_base build-index ./data/flight_policy.kb --kind hnsw
+
+Search mode and recall/latency trade-off are configured through environment variables:
+    KB_SEARCH_MODE    "exact" (default) or "ann"
+    KB_ANN_NPROBE     IVF lists probed per query (default 16)
+    KB_ANN_EF_SEARCH  HNSW candidate list size per query (default 64)
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+from typing import Awaitable, Callable, Optional, Sequence
+
+import numpy as np
+
+from agents.tools.executor import run_blocking
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+# Embeds a batch of texts and returns one vector per text, in order.
+EmbeddingFn = Callable[[list[str]], Sequence[Sequence[float]]]
+AsyncEmbeddingFn = Callable[[list[str]], Awaitable[Sequence[Sequence[float]]]]
+
+STORE_FORMAT_VERSION = 1
+STORE_DTYPES = ("float32", "float16")
+# Rows scored per step when the matrix has to be up-cast (float16 stores).
+SCORE_BLOCK_ROWS = 65536
+ANN_INDEX_FILE = "index.faiss"
+ANN_INDEX_KINDS = ("hnsw", "ivf")
+# Training points FAISS wants per IVF list; a corpus too small for one list gets a flat index.
+IVF_MIN_POINTS_PER_LIST = 39
+
+KB_SEARCH_MODE = os.environ.get("KB_SEARCH_MODE", "exact")
+KB_ANN_NPROBE = int(os.environ.get("KB_ANN_NPROBE", 16))
+KB_ANN_EF_SEARCH = int(os.environ.get("KB_ANN_EF_SEARCH", 64))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale every row to unit length (all-zero rows are left as zeros)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores along the last axis, best first."""
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class MappedRecords:
+    """Read-only (id, text) sequence backed by a memory-mapped JSON lines file."""
+
+    def __init__(self, records_path: str, offsets: np.ndarray):
+        self.offsets = offsets
+        with open(records_path, "rb") as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(records_path) else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> tuple[str, str]:
+        record = json.loads(self._buffer[int(self.offsets[index]):int(self.offsets[index + 1])])
+        return record["id"], record["policy_text"]
+
+
+class VectorSearchEngine:
+    """Exact cosine top-k search over a normalized embedding matrix."""
+
+    def __init__(self, records: Sequence[tuple[str, str]], matrix: np.ndarray):
+        if len(records) != len(matrix):
+            raise ValueError("records and matrix must have the same length")
+        self.records = records
+        self.matrix = matrix
+
+    @classmethod
+    def from_embeddings(cls, ids: Sequence[str], texts: Sequence[str], embeddings) -> "VectorSearchEngine":
+        """Build an in-memory engine, normalizing the embeddings once up front."""
+        if len(ids) != len(texts):
+            raise ValueError("ids and texts must have the same length")
+        return cls(list(zip(ids, texts)), normalize_rows(embeddings))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine scores of shape (len(queries), len(self)) for normalized queries."""
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        scores = np.empty((len(queries), len(self.matrix)), dtype=np.float32)
+        for start in range(0, len(self.matrix), SCORE_BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def _results(self, indices: np.ndarray, scores: np.ndarray) -> list[tuple[str, str, float]]:
+        return [(*self.records[i], float(scores[i])) for i in indices]
+
+    def search(self, query_vector, topk: int = 3) -> list[tuple[str, str, float]]:
+        """Return (id, text, score) for the topk chunks closest to the query."""
+        return self.search_batch([query_vector], topk)[0]
+
+    def search_batch(self, query_vectors, topk: int = 3) -> list[list[tuple[str, str, float]]]:
+        """Score several queries at once with a single matrix-matrix product."""
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+        scores = self._scores(queries)
+        indices = top_k(scores, topk)
+        return [self._results(row_indices, row_scores) for row_indices, row_scores in zip(indices, scores)]
+
+
+class AnnSearchEngine:
+    """Approximate inner-product top-k search through a FAISS index over normalized vectors."""
+
+    def __init__(self, records: Sequence[tuple[str, str]], index, nprobe: int = KB_ANN_NPROBE,
+                 ef_search: int = KB_ANN_EF_SEARCH):
+        if len(records) != index.ntotal:
+            raise ValueError("records and index must have the same length")
+        self.records = records
+        self.index = index
+        self.set_search_params(nprobe=nprobe, ef_search=ef_search)
+
+    def set_search_params(self, nprobe: int | None = None, ef_search: int | None = None) -> None:
+        """Tune recall against latency; parameters that do not apply to the index kind are ignored."""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None and nprobe is not None:
+            ivf.nprobe = nprobe
+        if hasattr(self.index, "hnsw") and ef_search is not None:
+            self.index.hnsw.efSearch = ef_search
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def search(self, query_vector, topk: int = 3) -> list[tuple[str, str, float]]:
+        """Return (id, text, score) for the (approximately) topk closest chunks."""
+        return self.search_batch([query_vector], topk)[0]
+
+    def search_batch(self, query_vectors, topk: int = 3) -> list[list[tuple[str, str, float]]]:
+        queries = np.ascontiguousarray(normalize_rows(np.asarray(query_vectors, dtype=np.float32)))
+        scores, indices = self.index.search(queries, min(topk, len(self)))
+        return [
+            [(*self.records[i], float(score)) for i, score in zip(row_indices, row_scores) if i >= 0]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+
+def build_ann_index(store_path: str, kind: str = "hnsw", hnsw_m: int = 32, ef_construction: int = 200,
+                    nlist: int | None = None, train_size: int = 100_000) -> None:
+    """Build an ANN index for a binary store and save it next to the embeddings."""
+    if faiss is None:
+        raise ImportError("faiss-cpu is not installed. Please install it.")
+    if kind not in ANN_INDEX_KINDS:
+        raise ValueError(f"kind must be one of {ANN_INDEX_KINDS}, got {kind}")
+    matrix = np.load(os.path.join(store_path, "embeddings.npy"), mmap_mode="r")
+    count, dim = matrix.shape
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    elif count < IVF_MIN_POINTS_PER_LIST:
+        logger.warning("%d chunks are too few to train an IVF index; building a flat (exact) index", count)
+        index = faiss.IndexFlatIP(dim)
+    else:
+        max_lists = count // IVF_MIN_POINTS_PER_LIST
+        if nlist is not None and nlist > max_lists:
+            logger.warning("Reducing nlist from %d to %d for %d chunks", nlist, max_lists, count)
+        nlist = min(nlist or max(1, int(4 * np.sqrt(count))), max_lists)
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample = np.random.default_rng(0).choice(count, size=min(count, max(train_size, nlist)), replace=False)
+        index.train(np.ascontiguousarray(matrix[np.sort(sample)], dtype=np.float32))
+
+    for start in range(0, count, SCORE_BLOCK_ROWS):
+        index.add(np.ascontiguousarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32))
+    faiss.write_index(index, os.path.join(store_path, ANN_INDEX_FILE))
+
+
+def open_ann_store(path: str, nprobe: int = KB_ANN_NPROBE, ef_search: int = KB_ANN_EF_SEARCH) -> AnnSearchEngine:
+    """Open a binary store through its prebuilt ANN index."""
+    if faiss is None:
+        raise ImportError("faiss-cpu is not installed. Please install it.")
+    exact = open_store(path)
+    index = faiss.read_index(os.path.join(path, ANN_INDEX_FILE))
+    return AnnSearchEngine(exact.records, index, nprobe=nprobe, ef_search=ef_search)
+
+
+def save_store(path: str, ids: Sequence[str], texts: Sequence[str], embeddings, dtype: str = "float32") -> None:
+    """Write a binary knowledge-base store directory."""
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"dtype must be one of {STORE_DTYPES}, got {dtype}")
+    matrix = normalize_rows(embeddings)
+    if len(ids) != len(texts) or len(ids) != len(matrix):
+        raise ValueError("ids, texts and embeddings must have the same length")
+    os.makedirs(path, exist_ok=True)
+
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(os.path.join(path, "records.jsonl"), "wb") as file:
+        for i, (chunk_id, text) in enumerate(zip(ids, texts)):
+            line = json.dumps({"id": chunk_id, "policy_text": text}, ensure_ascii=False).encode("utf-8") + b"\n"
+            file.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+    np.save(os.path.join(path, "embeddings.npy"), matrix.astype(dtype))
+    with open(os.path.join(path, "manifest.json"), "w") as file:
+        json.dump({
+            "format_version": STORE_FORMAT_VERSION,
+            "count": len(ids),
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "dtype": dtype,
+        }, file, indent=2)
+
+
+def open_store(path: str) -> VectorSearchEngine:
+    """Open a binary store with its matrix and records memory-mapped read-only."""
+    with open(os.path.join(path, "manifest.json")) as file:
+        manifest = json.load(file)
+    if manifest.get("format_version") != STORE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported knowledge base format version in {path}: {manifest.get('format_version')}")
+    matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+    return VectorSearchEngine(MappedRecords(os.path.join(path, "records.jsonl"), offsets), matrix)
+
+
+def load_json(path: str) -> VectorSearchEngine:
+    """Load the original JSON knowledge base into memory."""
+    with open(path) as file:
+        chunks = json.load(file)
+    return VectorSearchEngine.from_embeddings(
+        [item['id'] for item in chunks],
+        [item['policy_text'] for item in chunks],
+        [item['policy_text_embedding'] for item in chunks],
+    )
+
+
+def convert_json(json_path: str, store_path: str, dtype: str = "float32") -> None:
+    """Convert a JSON knowledge base to a binary store."""
+    with open(json_path) as file:
+        chunks = json.load(file)
+    save_store(
+        store_path,
+        [item['id'] for item in chunks],
+        [item['policy_text'] for item in chunks],
+        [item['policy_text_embedding'] for item in chunks],
+        dtype=dtype,
+    )
+
+
+def load_engine(path: str, search_mode: str = KB_SEARCH_MODE) -> VectorSearchEngine | AnnSearchEngine:
+    """Load a knowledge base from either a binary store directory or a JSON file.
+
+    With search_mode "ann" the store's prebuilt FAISS index is used; if it is not
+    available the exact scorer is used instead.
+    """
+    if search_mode not in ("exact", "ann"):
+        raise ValueError(f"Invalid knowledge base search mode: {search_mode}")
+    if search_mode == "ann":
+        if faiss is not None and os.path.isfile(os.path.join(path, ANN_INDEX_FILE)):
+            return open_ann_store(path)
+        logger.warning("No ANN index available for %s, falling back to exact search", path)
+    if os.path.isdir(path):
+        return open_store(path)
+    return load_json(path)
+
+
+def format_articles(results: list[tuple[str, str, float]]) -> str:
+    return "\n".join(f"{chunk_id}\n{content}" for chunk_id, content, _ in results)
+
+
+class SearchClient:
+    """Client for performing semantic search on a knowledge base."""
+
+    def __init__(self, emb_map_file_path: str, embedding_fn: EmbeddingFn,
+                 async_embedding_fn: Optional[AsyncEmbeddingFn] = None, search_mode: str = KB_SEARCH_MODE):
+        self.embedding_fn = embedding_fn
+        self.async_embedding_fn = async_embedding_fn
+        self.engine = load_engine(emb_map_file_path, search_mode)
+
+    def find_article(self, question: str, topk: int = 3) -> str:
+        """Find relevant articles based on cosine similarity."""
+        input_vector = self.embedding_fn([question])[0]
+        return format_articles(self.engine.search(input_vector, topk))
+
+    def find_articles(self, questions: list[str], topk: int = 3) -> list[str]:
+        """Batched find_article: one embedding request and one scoring pass for all questions."""
+        if not questions:
+            return []
+        input_vectors = self.embedding_fn(list(questions))
+        return [format_articles(results) for results in self.engine.search_batch(input_vectors, topk)]
+
+    async def afind_article(self, question: str, topk: int = 3) -> str:
+        """find_article for async callers; neither the embedding request nor scoring blocks the event loop."""
+        if self.async_embedding_fn is None:
+            raise ValueError("SearchClient was created without an async embedding function")
+        input_vector = (await self.async_embedding_fn([question]))[0]
+        return format_articles(await run_blocking(self.engine.search, input_vector, topk))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Knowledge base store tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser("convert", help="Convert a JSON knowledge base to a binary store.")
+    convert.add_argument("json_path")
+    convert.add_argument("store_path")
+    convert.add_argument("--dtype", choices=STORE_DTYPES, default="float32")
+    build_index = subparsers.add_parser("build-index", help="Build an ANN index for a binary store.")
+    build_index.add_argument("store_path")
+    build_index.add_argument("--kind", choices=ANN_INDEX_KINDS, default="hnsw")
+    build_index.add_argument("--hnsw-m", type=int, default=32)
+    build_index.add_argument("--ef-construction", type=int, default=200)
+    build_index.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(count), at most count/39)")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert_json(args.json_path, args.store_path, args.dtype)
+        print(f"Wrote {args.store_path}")
+    elif args.command == "build-index":
+        build_ann_index(args.store_path, args.kind, hnsw_m=args.hnsw_m,
+                        ef_construction=args.ef_construction, nlist=args.nlist)
+        print(f"Wrote {os.path.join(args.store_path, ANN_INDEX_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
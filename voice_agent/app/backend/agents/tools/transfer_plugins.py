@@ -0,0 +1,52 @@
+"""
+Agent handoff tool, generated for each agent from the other agents' profiles.
+
+Every agent's kernel gets a "transfer_tools" plugin with a single transfer_conversation
+function whose description lists the agents it can hand off to, as the personas
+instruct. The plugin and function names are the same in every kernel: RTMiddleTier
+switches the session to the requested agent when the model calls the function, before
+it runs, so it is invoked from the new agent's kernel and the reply that follows comes
+from the new agent. RTMiddleTier sets transferred_to to the agent it switched to, or
+None when it refused the transfer, so that the function can tell a handoff (it runs in
+the new agent's kernel) from a request to transfer to the agent already speaking.
+"""
+
+from contextvars import ContextVar
+from typing import Annotated, Optional
+
+from semantic_kernel.functions import KernelPlugin, kernel_function
+
+from intent import agent_domain
+
+TRANSFER_PLUGIN_NAME = "transfer_tools"
+TRANSFER_FUNCTION_NAME = "transfer_conversation"
+
+# The agent the session was switched to for the transfer being invoked, set in the task
+# relaying the session's events, which is the one that invokes the function.
+transferred_to: ContextVar[Optional[str]] = ContextVar("transferred_to", default=None)
+
+
+def create_transfer_plugin(agents: list[dict], owner: str) -> KernelPlugin:
+    """The transfer_tools plugin for the owner agent's kernel, handing off to any of the other agents."""
+    targets = [agent for agent in agents if agent["name"] != owner]
+    names = [agent["name"] for agent in targets]
+    domains = "\n".join(f"- {agent['name']}: {agent_domain(agent)}" for agent in targets)
+
+    @kernel_function(
+        name=TRANSFER_FUNCTION_NAME,
+        description="Silently transfer the conversation to another agent when the customer asks for services or "
+                    f"information beyond your responsibility. The other agents are:\n{domains}"
+    )
+    async def transfer_conversation(
+        agent_name: Annotated[str, f"The agent to transfer the conversation to, one of: {', '.join(names)}"]
+    ) -> str:
+        # Runs after the switch, from the kernel of the agent transferred to.
+        if agent_name is not None and agent_name == transferred_to.get():
+            return f"The conversation has been transferred to {agent_name}; continue helping the customer."
+        if agent_name == owner:
+            return (f"You are {owner} already, so nothing was transferred; continue helping the customer, or "
+                    f"transfer to one of: {', '.join(names)}.")
+        return f"There is no agent named {agent_name}; transfer to one of: {', '.join(names)}."
+
+    return KernelPlugin(name=TRANSFER_PLUGIN_NAME, description="transfer the conversation to another agent",
+                        functions=[transfer_conversation])
@@ -0,0 +1,152 @@
+"""
+Time to first audio per user turn for each way of routing turns to agents, through
+RTMiddleTier's own event handling:
+  serial       classifier (detect_intent) before every reply
+  speculative  classifier alongside the reply (SPECULATIVE_RESPONSE=true)
+  tool         no classifier; the agent calls transfer_conversation (USE_CLASSIFICATION_MODEL=false)
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_agent_routing --classifier-ms 300 --first-audio-ms 400
+
+The realtime service is a local fake (benchmarks/fakes.py) whose audio is tagged with
+the agent that produced it; in tool mode it answers a turn meant for another agent with
+a transfer_conversation call. Intent detection goes through detect_intent to a local
+stub of the intent-shift endpoint that answers with the agent each turn was scripted
+for. A turn's time to first audio runs from its transcript to the first audio of the
+right agent. "wrong audio" counts chunks the client got from the previous agent before
+a speculative switch cancelled them (it is told to stop playing them).
+"""
+
+import argparse
+import asyncio
+import base64
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fakes import (FakeClientSocket, FakeIntentServer, FakeRealtimeClient, import_tool_plugins,
+                              serve_in_thread)
+
+
+def scripted_intent(conversation: str) -> str:
+    # Turns are written as "[agent_name] text"; the classifier sees the whole history.
+    last_turn = conversation.splitlines()[-1]
+    return last_turn[last_turn.index("[") + 1:last_turn.index("]")]
+
+
+async def run_session(tier, n: int, args, rng: random.Random, results: dict) -> None:
+    from semantic_kernel.contents import ChatHistoryTruncationReducer
+
+    session = tier._new_session(ChatHistoryTruncationReducer(target_count=tier.max_history_length), "Bench", str(n))
+    agent = session.agent.name
+    realtime = FakeRealtimeClient(tier.kernels, agent, args.first_audio_ms,
+                                  transfers=not tier.use_classification_model)
+    ws = FakeClientSocket()
+
+    async def pump():
+        async for event in realtime.receive():
+            await tier._handle_realtime_event(f"bench-{n}", session, ws, realtime, event)
+
+    pump_task = asyncio.create_task(pump())
+    await asyncio.sleep(rng.uniform(0, args.think_ms / 1000))
+    for turn in range(args.turns):
+        switch = rng.random() < args.switch_rate
+        if switch:
+            agent = rng.choice([name for name in tier.agent_names if name != agent])
+        start = time.perf_counter()
+        sent_before = len(ws.sent)
+        realtime.user_turn(f"[{agent}] turn {turn}", agent)
+        first_audio = wrong = None
+        while first_audio is None:
+            await asyncio.sleep(0.005)
+            audio = [(t, m) for t, m in ws.sent[sent_before:] if m["type"] == "response.audio.delta"]
+            heard = [t for t, m in audio if m["delta"] == _tag(agent)]
+            if heard:
+                first_audio = heard[0]
+                wrong = sum(1 for t, m in audio if t < first_audio and m["delta"] != _tag(agent))
+        while realtime.active or session.response_requested or session.active_response:
+            await asyncio.sleep(0.005)
+        results["switch" if switch else "same"].append((first_audio - start) * 1000)
+        results["wrong_audio"] += wrong
+        await asyncio.sleep(args.think_ms / 1000)
+    pump_task.cancel()
+    results["responses"] += realtime.responses
+    results["cancelled"] += realtime.cancelled
+    results["conflicts"] += realtime.conflicts
+    results["failed_transfers"] += sum(1 for r in realtime.function_results if "has been transferred" not in r)
+
+
+def _tag(agent: str) -> str:
+    return base64.b64encode(agent.encode()).decode("ascii")
+
+
+async def measure(tier, args) -> dict:
+    from utility import intent_shift_client
+
+    results = {"same": [], "switch": [], "wrong_audio": 0, "responses": 0, "cancelled": 0, "conflicts": 0,
+               "failed_transfers": 0}
+    rngs = [random.Random(args.seed + n) for n in range(args.sessions)]
+    try:
+        await asyncio.gather(*(run_session(tier, n, args, rngs[n], results) for n in range(args.sessions)))
+    finally:
+        await intent_shift_client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=20, help="user turns per session")
+    parser.add_argument("--switch-rate", type=float, default=0.1, help="share of turns that change agent")
+    parser.add_argument("--classifier-ms", type=float, default=300.0, help="intent endpoint latency")
+    parser.add_argument("--first-audio-ms", type=float, default=400.0, help="realtime model latency to first audio")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="pause between a reply and the next turn")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve_in_thread(FakeIntentServer(args.classifier_ms, classify=scripted_intent))
+    os.environ.update({
+        "INTENT_SHIFT_API_URL": f"http://127.0.0.1:{server.port}/score",
+        "INTENT_SHIFT_API_KEY": "fake",
+        "INTENT_SHIFT_API_DEPLOYMENT": "fake",
+        "INTENT_ROUTER_ENABLED": "false",
+        "TELEMETRY_SCENARIO": "none",
+    })
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+    workdir = tempfile.mkdtemp()
+    try:
+        import_tool_plugins(workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        from azure.core.credentials import AzureKeyCredential
+        from rtmt import RTMiddleTier
+        logging.getLogger().setLevel(logging.WARNING)
+        tier = RTMiddleTier("http://127.0.0.1", "fake", AzureKeyCredential("fake"))
+
+        print(f"{'mode':<12} {'turns':>6} {'same p50':>9} {'same p99':>9} {'switch n':>9} {'switch p50':>11} "
+              f"{'switch p99':>11} {'classified':>11} {'wrong audio':>12} {'responses':>10} {'cancelled':>10} "
+              f"{'conflicts':>10} {'bad xfers':>10}")
+        modes = {"serial": (True, False), "speculative": (True, True), "tool": (False, False)}
+        for name, (classify, speculative) in modes.items():
+            tier.use_classification_model, tier.speculative_response = classify, speculative
+            tier._register_transfer_plugins()
+            classified = server.requests
+            if tier.intent_gate:
+                # Every mode replays the same turns; start each without the previous mode's answers.
+                tier.intent_gate.memo.clear()
+            r = asyncio.run(measure(tier, args))
+            switch = r["switch"] or [0.0]
+            print(f"{name:<12} {len(r['same']) + len(r['switch']):>6} "
+                  f"{np.percentile(r['same'], 50):9.0f} {np.percentile(r['same'], 99):9.0f} {len(r['switch']):>9} "
+                  f"{np.percentile(switch, 50):11.0f} {np.percentile(switch, 99):11.0f} "
+                  f"{server.requests - classified:>11} {r['wrong_audio']:>12} {r['responses']:>10} "
+                  f"{r['cancelled']:>10} {r['conflicts']:>10} {r['failed_transfers']:>10}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Recall@k and latency of the FAISS ANN backends against the exact scorer.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_ann --size 1000000 --dim 1536 --kinds hnsw,ivf
+
+A synthetic clustered corpus is written to a temporary binary store, an index of
+each kind is built with build_ann_index, and queries (noisy copies of corpus
+vectors) are answered by the exact engine and by each ANN engine over a sweep of
+nprobe / efSearch values.
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from agents.tools.knowledge_base import build_ann_index, open_ann_store, open_store, save_store
+
+
+def clustered_corpus(rng, size, dim, clusters):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    matrix = centers[rng.integers(0, clusters, size)]
+    matrix += 0.5 * rng.standard_normal((size, dim), dtype=np.float32)
+    return matrix
+
+
+def latencies_ms(engine, queries, topk):
+    results, samples = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([chunk_id for chunk_id, _, _ in engine.search(query, topk)])
+        samples.append((time.perf_counter() - start) * 1000)
+    return results, np.percentile(samples, 50), np.percentile(samples, 95)
+
+
+def recall(expected, actual):
+    hits = sum(len(set(e) & set(a)) for e, a in zip(expected, actual))
+    return hits / sum(len(e) for e in expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topk", type=int, default=3)
+    parser.add_argument("--kinds", default="hnsw,ivf")
+    parser.add_argument("--nprobe", default="1,4,16,64")
+    parser.add_argument("--ef-search", default="16,32,64,128")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = clustered_corpus(rng, args.size, args.dim, args.clusters)
+    queries = matrix[rng.integers(0, args.size, args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32)
+    ids = [str(i) for i in range(args.size)]
+
+    with tempfile.TemporaryDirectory() as store_path:
+        save_store(store_path, ids, ids, matrix)
+        del matrix
+        exact, exact_p50, exact_p95 = latencies_ms(open_store(store_path), queries, args.topk)
+        print(f"{'backend':<8} {'param':>12} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+        print(f"{'exact':<8} {'-':>12} {1.0:9.3f} {exact_p50:8.3f} {exact_p95:8.3f} {'-':>8}")
+
+        for kind in args.kinds.split(","):
+            start = time.perf_counter()
+            build_ann_index(store_path, kind)
+            build_s = time.perf_counter() - start
+            engine = open_ann_store(store_path)
+            name, values = ("nprobe", args.nprobe) if kind == "ivf" else ("efSearch", args.ef_search)
+            for value in (int(v) for v in values.split(",")):
+                if kind == "ivf":
+                    engine.set_search_params(nprobe=value)
+                else:
+                    engine.set_search_params(ef_search=value)
+                actual, p50, p95 = latencies_ms(engine, queries, args.topk)
+                print(f"{kind:<8} {f'{name}={value}':>12} {recall(exact, actual):9.3f} {p50:8.3f} {p95:8.3f} {build_s:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
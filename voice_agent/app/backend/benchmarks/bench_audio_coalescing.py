@@ -0,0 +1,146 @@
+"""
+Outbound audio coalescing (relay.AudioCoalescer) at several windows: messages sent to
+clients, relay CPU and the latency it adds to audio.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_audio_coalescing --sessions 200 --windows 0 20/20 40/40 100/40 200/100
+
+A window is TARGET_MS/MAX_DELAY_MS (AUDIO_COALESCE_MS/AUDIO_COALESCE_MAX_DELAY_MS), or 0
+to send every delta as before. RTMiddleTier serves /realtime in this process with the
+realtime service replaced by a local fake (benchmarks/fakes.py) that speaks --responses
+replies per session in --delta-ms deltas, --speed times faster than real time, with
+transcript deltas in between. --sessions clients in a separate process read them.
+Reported: messages per second per session, the server's CPU time per second of reply
+audio, and how long deltas took from the fake service to the client (each delta is
+stamped when produced), p50/p99 and the p99 added over window 0.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from benchmarks.fakes import SpeakingRealtimeWebsocket, import_tool_plugins
+
+BYTES_PER_MS = 48
+
+
+async def client_session(http: aiohttp.ClientSession, port: int, n: int, args, totals: dict) -> None:
+    delta_bytes = args.delta_ms * BYTES_PER_MS
+    url = f"http://127.0.0.1:{port}/realtime?session_state_key=coalesce-{n}&protocol={args.protocol}"
+    await asyncio.sleep(random.uniform(0, 1))
+    async with http.ws_connect(url, max_msg_size=0) as ws:
+        start = time.perf_counter()
+        done = 0
+        async for msg in ws:
+            arrived = time.monotonic()
+            totals["messages"] += 1
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                audio = msg.data
+            else:
+                message = json.loads(msg.data)
+                if message.get("type") == "response.audio.done":
+                    done += 1
+                    if done == args.responses:
+                        break
+                    continue
+                if message.get("type") != "response.audio.delta":
+                    continue
+                audio = base64.b64decode(message["delta"])
+            totals["audio_messages"] += 1
+            for offset in range(0, len(audio), delta_bytes):
+                produced, = struct.unpack_from("<d", audio, offset)
+                totals["latency_ms"].append((arrived - produced) * 1000)
+        totals["seconds"] += time.perf_counter() - start
+
+
+async def run_clients(port: int, args) -> dict:
+    totals = {"messages": 0, "audio_messages": 0, "seconds": 0.0, "latency_ms": []}
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*(client_session(http, port, n, args, totals) for n in range(args.sessions)))
+    return totals
+
+
+async def run_server(args) -> None:
+    import rtmt
+    from azure.core.credentials import AzureKeyCredential
+
+    rtmt.AzureRealtimeWebsocket = lambda: SpeakingRealtimeWebsocket(
+        args.responses, args.response_ms, args.delta_ms, args.speed, args.pause_ms)
+    logging.getLogger().setLevel(logging.WARNING)
+    tier = rtmt.RTMiddleTier("http://127.0.0.1", "fake", AzureKeyCredential("fake"))
+    app = web.Application()
+    tier.attach_to_app(app, "/realtime")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    audio_seconds = args.sessions * args.responses * args.response_ms / 1000
+    print(f"{args.sessions} sessions x {args.responses} replies of {args.response_ms} ms in {args.delta_ms} ms deltas, "
+          f"{args.protocol} protocol")
+    print(f"{'window':<8} {'msgs/s':>7} {'audio msgs':>10} {'cpu ms/s':>9} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'added p99':>9}")
+    baseline = None
+    for window in args.windows:
+        target, _, delay = window.partition("/")
+        tier.audio_coalesce_ms = float(target)
+        tier.audio_coalesce_max_delay_ms = float(delay or target)
+        cpu = time.process_time()
+        client = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "benchmarks.bench_audio_coalescing", "--client-port", str(port),
+            *sys.argv[1:], stdout=asyncio.subprocess.PIPE)
+        out, _ = await client.communicate()
+        cpu = time.process_time() - cpu
+        totals = json.loads(out)
+        p50, p99 = np.percentile(totals["latency_ms"], [50, 99])
+        if baseline is None:
+            baseline = p99
+        print(f"{window:<8} {totals['messages'] / totals['seconds']:7.1f} {totals['audio_messages']:10d} "
+              f"{cpu * 1000 / audio_seconds:9.2f} {p50:7.1f} {p99:7.1f} {p99 - baseline:9.1f}")
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--windows", nargs="+", default=["0", "20/20", "40/40", "100/40", "200/100"],
+                        help="TARGET_MS/MAX_DELAY_MS; the first is the baseline for added latency")
+    parser.add_argument("--responses", type=int, default=3, help="replies per session")
+    parser.add_argument("--response-ms", type=int, default=3000, help="audio per reply")
+    parser.add_argument("--delta-ms", type=int, default=20, help="audio per delta from the service")
+    parser.add_argument("--speed", type=float, default=4.0, help="how much faster than real time replies stream")
+    parser.add_argument("--pause-ms", type=float, default=500, help="between replies")
+    parser.add_argument("--protocol", choices=["json", "binary"], default="json")
+    parser.add_argument("--client-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client_port:
+        print(json.dumps(asyncio.run(run_clients(args.client_port, args))))
+        return
+
+    os.environ.update({"INTENT_ROUTER_ENABLED": "false", "TELEMETRY_SCENARIO": "none"})
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+    workdir = tempfile.mkdtemp()
+    try:
+        import_tool_plugins(workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        asyncio.run(run_server(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+CPU and bandwidth of audio on the /realtime endpoint: base64 in JSON text frames (the
+default protocol) against raw PCM16 in binary websocket frames (?protocol=binary).
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_audio_protocol --sessions 50 --seconds 10
+
+RTMiddleTier serves /realtime in this process with the realtime service replaced by a
+local echo (benchmarks/fakes.py), which encodes audio for the service and returns it as
+response.audio.delta events the way the Semantic Kernel client does. --sessions clients
+in a separate process each stream --seconds of 24 kHz PCM16 microphone audio in
+--chunk-ms chunks at real-time pace and read the echoed audio back. Reported per session:
+the server's CPU time per second of audio (process time of this process while the
+clients run, so also the share of a core one call takes), and websocket payload bytes
+per second of audio in each direction.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.fakes import EchoRealtimeWebsocket, import_tool_plugins
+
+SAMPLE_RATE = 24000
+PROTOCOLS = ["json", "binary"]
+
+
+async def client_session(http: aiohttp.ClientSession, port: int, n: int, protocol: str, args, totals: dict) -> None:
+    chunk = os.urandom(SAMPLE_RATE * 2 * args.chunk_ms // 1000)
+    chunks = args.seconds * 1000 // args.chunk_ms
+    expected = chunks * len(chunk)
+    url = f"http://127.0.0.1:{port}/realtime?session_state_key=audio-{protocol}-{n}&protocol={protocol}"
+    await asyncio.sleep(random.uniform(0, args.chunk_ms / 1000))
+    async with http.ws_connect(url, max_msg_size=0) as ws:
+        async def read():
+            received = 0
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.BINARY:
+                    totals["rx"] += len(msg.data)
+                    received += len(msg.data)
+                elif msg.type == aiohttp.WSMsgType.TEXT:
+                    totals["rx"] += len(msg.data)
+                    message = json.loads(msg.data)
+                    if message.get("type") == "response.audio.delta":
+                        received += len(base64.b64decode(message["delta"]))
+                if received >= expected:
+                    return
+
+        reader = asyncio.create_task(read())
+        start = time.perf_counter()
+        for i in range(chunks):
+            await asyncio.sleep(max(0.0, start + i * args.chunk_ms / 1000 - time.perf_counter()))
+            if protocol == "binary":
+                await ws.send_bytes(chunk)
+                totals["tx"] += len(chunk)
+            else:
+                text = json.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(chunk).decode()})
+                await ws.send_str(text)
+                totals["tx"] += len(text)
+        await asyncio.wait_for(reader, timeout=30)
+
+
+async def run_clients(port: int, protocol: str, args) -> dict:
+    totals = {"tx": 0, "rx": 0}
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*(client_session(http, port, n, protocol, args, totals) for n in range(args.sessions)))
+    return totals
+
+
+async def run_server(args) -> None:
+    import rtmt
+    from azure.core.credentials import AzureKeyCredential
+
+    rtmt.AzureRealtimeWebsocket = EchoRealtimeWebsocket
+    logging.getLogger().setLevel(logging.WARNING)
+    tier = rtmt.RTMiddleTier("http://127.0.0.1", "fake", AzureKeyCredential("fake"))
+    app = web.Application()
+    tier.attach_to_app(app, "/realtime")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    audio_seconds = args.sessions * args.seconds
+    print(f"{args.sessions} sessions x {args.seconds} s of audio in {args.chunk_ms} ms chunks")
+    print(f"{'protocol':<8} {'cpu ms/s':>9} {'core %':>7} {'up B/s':>8} {'down B/s':>9}")
+    for protocol in args.protocols:
+        cpu = time.process_time()
+        client = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "benchmarks.bench_audio_protocol", "--client-port", str(port),
+            "--protocols", protocol, "--sessions", str(args.sessions), "--seconds", str(args.seconds),
+            "--chunk-ms", str(args.chunk_ms), stdout=asyncio.subprocess.PIPE)
+        out, _ = await client.communicate()
+        cpu = time.process_time() - cpu
+        totals = json.loads(out)
+        print(f"{protocol:<8} {cpu * 1000 / audio_seconds:9.2f} {cpu * 100 / audio_seconds:7.2f} "
+              f"{totals['tx'] / audio_seconds:8.0f} {totals['rx'] / audio_seconds:9.0f}")
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=int, default=10, help="seconds of audio each session streams")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="audio per frame (the web client sends 100 ms)")
+    parser.add_argument("--protocols", nargs="+", choices=PROTOCOLS, default=PROTOCOLS)
+    parser.add_argument("--client-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client_port:
+        print(json.dumps(asyncio.run(run_clients(args.client_port, args.protocols[0], args))))
+        return
+
+    os.environ.update({"INTENT_ROUTER_ENABLED": "false", "TELEMETRY_SCENARIO": "none"})
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+    workdir = tempfile.mkdtemp()
+    try:
+        import_tool_plugins(workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        asyncio.run(run_server(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Booking throughput and confirm latency at increasing concurrency: the previous write
+path (a pooled session per change, rollback journal, one commit per statement) against
+the writer thread (WAL, one atomic transaction per change, group commit).
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_booking_writes --concurrency 1,10,50,200
+
+Each run changes distinct reservations in a copy of data/hotel.db while four readers
+look up reservations every 10 ms, and reports successful bookings/s, p50/p99 confirm
+latency and errors (typically "database is locked").
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from agents.tools.db import Database
+from agents.tools.executor import run_db
+from benchmarks.fakes import import_tool_plugins
+
+
+def seed(database: Database, reservation_model, count: int) -> None:
+    with database.session() as session:
+        for n in range(count):
+            session.add(reservation_model(
+                id=900_000_000 + n, customer_id=f"bench{n % 1000}", hotel_id="H100", room_type="Standard",
+                check_in_date=datetime(2030, 1, 1), check_out_date=datetime(2030, 1, 3), status="booked",
+            ))
+        session.commit()
+
+
+def two_commit_change(database: Database, reservation_model, reservation_id: int) -> None:
+    # The previous confirm_reservation_change: cancel, commit, insert, commit.
+    with database.session() as session:
+        old = session.query(reservation_model).filter_by(id=reservation_id, status="booked").first()
+        old.status = "cancelled"
+        session.commit()
+        session.add(reservation_model(
+            id=random.randint(1_000_000_000, 9_999_999_999), customer_id=old.customer_id, hotel_id=old.hotel_id,
+            room_type="Suite", check_in_date=datetime(2030, 1, 2), check_out_date=datetime(2030, 1, 4),
+            status="booked",
+        ))
+        session.commit()
+
+
+async def run(concurrency: int, per_caller: int, first_id: int, change, lookup) -> tuple[list[float], int, float]:
+    latencies: list[float] = []
+    errors = 0
+    done = asyncio.Event()
+
+    async def booker(n):
+        nonlocal errors
+        for i in range(per_caller):
+            start = time.perf_counter()
+            try:
+                result = await change(first_id + n * per_caller + i)
+                if isinstance(result, str) and not result.startswith("Your new reservation"):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async def reader():
+        while not done.is_set():
+            await lookup(f"bench{random.randrange(1000)}")
+            await asyncio.sleep(0.01)
+
+    readers = [asyncio.create_task(reader()) for _ in range(4)]
+    start = time.perf_counter()
+    await asyncio.gather(*(booker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await asyncio.gather(*readers)
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,10,50,200")
+    parser.add_argument("--bookings", type=int, default=2000, help="bookings per concurrency level")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    workdir = tempfile.mkdtemp()
+    try:
+        legacy_path = os.path.join(workdir, "hotel_legacy.db")
+        shutil.copy("data/hotel.db", legacy_path)
+        shutil.copy("data/hotel.db", os.path.join(workdir, "hotel.db"))
+        _, hotel_plugins = import_tool_plugins(
+            workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        Reservation = hotel_plugins.Reservation
+        legacy = Database(f"sqlite:///{legacy_path}", journal_mode="DELETE", synchronous="FULL")
+        legacy.create_schema(hotel_plugins.Base.metadata)
+        total = sum(args.bookings - args.bookings % c for c in levels)
+        seed(legacy, Reservation, total)
+        seed(hotel_plugins.database, Reservation, total)
+        hotels = hotel_plugins.Hotel_Tools()
+
+        def legacy_lookup(user_id):
+            with legacy.session() as session:
+                return session.query(Reservation).filter_by(customer_id=user_id, status="booked").all()
+
+        modes = {
+            "two-commit": (lambda rid: run_db(two_commit_change, legacy, Reservation, rid),
+                           lambda user_id: run_db(legacy_lookup, user_id)),
+            "writer": (lambda rid: hotels.confirm_reservation_change(str(rid), "Suite", "2030-01-02", "2030-01-04"),
+                       hotels.load_user_reservation_info),
+        }
+        print(f"{'mode':<11} {'callers':>8} {'bookings/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, (change, lookup) in modes.items():
+            first_id = 900_000_000
+            for concurrency in levels:
+                per_caller = args.bookings // concurrency
+                latencies, errors, elapsed = asyncio.run(run(concurrency, per_caller, first_id, change, lookup))
+                first_id += concurrency * per_caller
+                print(f"{name:<11} {concurrency:>8} {(len(latencies) - errors) / elapsed:11.0f} "
+                      f"{np.percentile(latencies, 50):8.1f} {np.percentile(latencies, 99):8.1f} {errors:>7}")
+        print(f"writer: {hotel_plugins.database.writer.stats()}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
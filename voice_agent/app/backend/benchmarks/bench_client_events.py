@@ -0,0 +1,243 @@
+"""
+Outbound messages and relay CPU per call with the client event allowlist
+(REALTIME_CLIENT_EVENTS, ?events=) against relaying every service event (events=*).
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_client_events --sessions 200 --turns 8
+
+Each session replays a typical call: the realtime service's events as JSON frames, with
+the types, fields and rates of a voice conversation (session events; per turn the user's
+speech and transcription events; a spoken reply of 3-8 s in --audio-delta-ms audio
+deltas with transcript deltas in between, content part, output item and response events
+and rate limit updates; every fourth turn a tool call streamed as function call argument
+deltas first). The frames go through openai's AsyncRealtimeConnection and the Semantic
+Kernel client's event parsing, untimed, and then through RTMiddleTier's event handling
+to a socket that counts what is sent, timed. Also reported: the cost of serializing each
+relayed event the previous way (dict(), then json.dumps) and now (model_dump_json).
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+import warnings
+
+from benchmarks.fakes import RecordedWebsocket, import_tool_plugins
+
+WORDS = ("flight", "hotel", "booking", "confirmation", "change", "date", "seat", "room", "tomorrow", "refund",
+         "policy", "baggage", "upgrade", "please", "your", "the", "for", "to", "I", "can", "help")
+
+
+def typical_call(turns: int, audio_delta_ms: int, rng: random.Random) -> list[str]:
+    frames = []
+    n = [0]
+
+    def event(type_: str, **fields) -> None:
+        n[0] += 1
+        frames.append(json.dumps({"type": type_, "event_id": f"event_{n[0]:08d}", **fields}))
+
+    def rate_limits() -> None:
+        event("rate_limits.updated", rate_limits=[
+            {"name": "requests", "limit": 1000, "remaining": 999 - n[0] % 900, "reset_seconds": 0.06},
+            {"name": "tokens", "limit": 200000, "remaining": 190000 - n[0], "reset_seconds": 1.2}])
+
+    def response(response_id: str, item: dict, stream) -> None:
+        event("response.created", response={"id": response_id, "object": "realtime.response", "status": "in_progress",
+                                             "status_details": None, "output": [], "usage": None})
+        event("response.output_item.added", response_id=response_id, output_index=0, item=item)
+        event("conversation.item.created", previous_item_id=None, item=item)
+        stream()
+        event("response.output_item.done", response_id=response_id, output_index=0,
+              item={**item, "status": "completed"})
+        event("response.done", response={
+            "id": response_id, "object": "realtime.response", "status": "completed", "status_details": None,
+            "output": [{**item, "status": "completed"}],
+            "usage": {"total_tokens": 1450, "input_tokens": 1200, "output_tokens": 250,
+                      "input_token_details": {"cached_tokens": 1024, "text_tokens": 900, "audio_tokens": 300},
+                      "output_token_details": {"text_tokens": 60, "audio_tokens": 190}}})
+        rate_limits()
+
+    session = {"id": "sess_001", "object": "realtime.session", "model": "gpt-4o-realtime-preview",
+               "modalities": ["text", "audio"], "voice": "shimmer", "input_audio_format": "pcm16",
+               "output_audio_format": "pcm16", "turn_detection": {"type": "server_vad", "threshold": 0.5,
+                                                                  "prefix_padding_ms": 300, "silence_duration_ms": 200}}
+    event("session.created", session=session)
+    event("session.updated", session=session)
+    for turn in range(turns):
+        user_item = f"item_user_{turn}"
+        event("input_audio_buffer.speech_started", audio_start_ms=turn * 10000, item_id=user_item)
+        event("input_audio_buffer.speech_stopped", audio_end_ms=turn * 10000 + 2500, item_id=user_item)
+        event("input_audio_buffer.committed", previous_item_id=None, item_id=user_item)
+        event("conversation.item.created", previous_item_id=None, item={
+            "id": user_item, "object": "realtime.item", "type": "message", "status": "completed", "role": "user",
+            "content": [{"type": "input_audio", "transcript": None}]})
+        event("conversation.item.input_audio_transcription.completed", item_id=user_item, content_index=0,
+              transcript=" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))) + ".")
+
+        if turn % 4 == 1:
+            call_item = {"id": f"item_call_{turn}", "object": "realtime.item", "type": "function_call",
+                         "status": "in_progress", "name": "search_flights", "call_id": f"call_{turn}",
+                         "arguments": ""}
+
+            def arguments(call_item=call_item, response_id=f"resp_call_{turn}"):
+                text = json.dumps({"booking_reference": "ABC123", "date": "2025-06-01", "passenger": "John Doe"})
+                for i in range(0, len(text), 3):
+                    event("response.function_call_arguments.delta", response_id=response_id,
+                          item_id=call_item["id"], output_index=0, call_id=call_item["call_id"], delta=text[i:i + 3])
+
+            response(f"resp_call_{turn}", call_item, arguments)
+
+        reply_item = {"id": f"item_reply_{turn}", "object": "realtime.item", "type": "message",
+                      "status": "in_progress", "role": "assistant", "content": []}
+
+        def speak(reply_item=reply_item, response_id=f"resp_{turn}"):
+            ids = {"response_id": response_id, "item_id": reply_item["id"], "output_index": 0, "content_index": 0}
+            event("response.content_part.added", part={"type": "audio", "transcript": ""}, **ids)
+            reply_ms = rng.randint(3000, 8000)
+            # About three transcript tokens a second of speech.
+            words = []
+            for ms in range(0, reply_ms, audio_delta_ms):
+                event("response.audio.delta", delta=base64.b64encode(
+                    os.urandom(48 * audio_delta_ms)).decode(), **ids)
+                while len(words) < (ms + audio_delta_ms) * 3 // 1000:
+                    words.append(rng.choice(WORDS))
+                    event("response.audio_transcript.delta", delta=" " + words[-1], **ids)
+            event("response.audio.done", **ids)
+            event("response.audio_transcript.done", transcript=" ".join(words), **ids)
+            event("response.content_part.done", part={"type": "audio", "transcript": " ".join(words)}, **ids)
+
+        response(f"resp_{turn}", reply_item, speak)
+    return frames
+
+
+async def parse(frames: list[str]) -> list:
+    """The Semantic Kernel events the realtime client yields for these service frames."""
+    from openai.resources.beta.realtime.realtime import AsyncRealtimeConnection
+    from semantic_kernel.connectors.ai.open_ai import AzureRealtimeWebsocket
+
+    client = AzureRealtimeWebsocket(endpoint="https://fake.openai.azure.com", api_key="fake",
+                                    deployment_name="fake", api_version="2024-10-01-preview")
+    client.connection = AsyncRealtimeConnection(RecordedWebsocket(frames))
+    client.connected.set()
+    return [event async for event in client.receive()]
+
+
+class CountingSocket:
+    """Stand-in for the client websocket: counts messages and payload bytes."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    async def send_json(self, data, dumps=json.dumps) -> None:
+        await self.send_str(dumps(data))
+
+    async def send_str(self, data: str) -> None:
+        self.messages += 1
+        self.bytes += len(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.messages += 1
+        self.bytes += len(data)
+
+
+class NullRealtimeClient:
+    async def send(self, event) -> None:
+        pass
+
+    async def update_session(self, **kwargs) -> None:
+        pass
+
+
+async def run(tier, calls: list[list], client_events) -> dict:
+    from semantic_kernel.contents import ChatHistoryTruncationReducer
+
+    ws = CountingSocket()
+    realtime = NullRealtimeClient()
+    cpu = 0.0
+    for n, events in enumerate(calls):
+        session = tier._new_session(ChatHistoryTruncationReducer(target_count=tier.max_history_length), "Bench", str(n))
+        start = time.process_time()
+        for event in events:
+            await tier._handle_realtime_event(f"events-{n}", session, ws, realtime, event, False, client_events)
+        cpu += time.process_time() - start
+    return {"messages": ws.messages / len(calls), "bytes": ws.bytes / len(calls), "cpu_ms": cpu * 1000 / len(calls)}
+
+
+def serialization(calls: list[list], relayed) -> tuple[float, float]:
+    from semantic_kernel.contents import RealtimeAudioEvent
+
+    payloads = [event.service_event for events in calls[:10] for event in events
+                if not isinstance(event, RealtimeAudioEvent) and event.service_type in relayed]
+    start = time.process_time()
+    for payload in payloads:
+        json.dumps(payload.dict())
+    previous = time.process_time() - start
+    start = time.process_time()
+    for payload in payloads:
+        payload.model_dump_json(exclude_unset=True)
+    now = time.process_time() - start
+    return previous * 1e6 / len(payloads), now * 1e6 / len(payloads)
+
+
+async def main_async(args) -> None:
+    import rtmt
+    from azure.core.credentials import AzureKeyCredential
+
+    logging.getLogger().setLevel(logging.WARNING)
+    tier = rtmt.RTMiddleTier("http://127.0.0.1", "fake", AzureKeyCredential("fake"))
+    # Agents hand off themselves: a user turn only requests a reply, with no classifier.
+    tier.use_classification_model = False
+    rng = random.Random(args.seed)
+    calls = [await parse(typical_call(args.turns, args.audio_delta_ms, rng)) for _ in range(args.sessions)]
+    events = sum(len(c) for c in calls) / len(calls)
+    print(f"{args.sessions} calls of {args.turns} turns, {events:.0f} service events per call; "
+          f"default allowlist: {','.join(sorted(rtmt.CLIENT_EVENTS or ['*']))}")
+    print(f"{'relayed':<10} {'msgs/call':>10} {'KB/call':>8} {'cpu ms/call':>12}")
+    modes = {"all": None, "allowlist": rtmt.CLIENT_EVENTS}
+    results = {}
+    # Alternated and repeated, keeping each mode's fastest run: the first is also a warm-up.
+    for _ in range(args.repeat):
+        for name, client_events in modes.items():
+            r = await run(tier, calls, client_events)
+            if name not in results or r["cpu_ms"] < results[name]["cpu_ms"]:
+                results[name] = r
+    for name, r in results.items():
+        print(f"{name:<10} {r['messages']:10.0f} {r['bytes'] / 1024:8.0f} {r['cpu_ms']:12.1f}")
+    print(f"messages -{1 - results['allowlist']['messages'] / results['all']['messages']:.0%}, "
+          f"cpu -{1 - results['allowlist']['cpu_ms'] / results['all']['cpu_ms']:.0%}")
+    relayed = {event.service_type for event in calls[0]}
+    previous, now = serialization(calls, relayed)
+    print(f"serializing a relayed event: dict() + json.dumps {previous:.1f} us, model_dump_json {now:.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=8, help="user turns per call")
+    parser.add_argument("--audio-delta-ms", type=int, default=100, help="audio per response.audio.delta")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update({"INTENT_ROUTER_ENABLED": "false", "TELEMETRY_SCENARIO": "none"})
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+    workdir = tempfile.mkdtemp()
+    try:
+        import_tool_plugins(workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        with warnings.catch_warnings():
+            # dict() is deprecated in pydantic 2; the previous relay called it all the same.
+            warnings.simplefilter("ignore", DeprecationWarning)
+            asyncio.run(main_async(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
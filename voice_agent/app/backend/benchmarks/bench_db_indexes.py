@@ -0,0 +1,104 @@
+"""
+Tool-level query latency on large flight and hotel databases, before and after the
+secondary indexes declared on the plugin models.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_db_indexes --customers 1000000
+
+Generates synthetic data (see generate_tool_data.py) into a temporary directory,
+drops the declared indexes to get the old schema, times each lookup, then applies the
+migration (Database.create_schema) and times them again.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.fakes import import_tool_plugins
+from benchmarks.generate_tool_data import AIRPORTS, FLIGHT_NUMS, generate
+
+
+def lookups(flight_plugins, hotel_plugins, customers: int, tickets: int, reservations: int):
+    flights, hotels = flight_plugins.Flight_Tools(), hotel_plugins.Hotel_Tools()
+    # The kernel functions are coroutine wrappers; time the blocking bodies directly.
+    load_flights = flight_plugins.Flight_Tools.load_user_flight_info.__wrapped__
+    flight_status = flight_plugins.Flight_Tools.check_flight_status.__wrapped__
+    load_reservations = hotel_plugins.Hotel_Tools.load_user_reservation_info.__wrapped__
+    reservation_status = hotel_plugins.Hotel_Tools.check_reservation_status.__wrapped__
+
+    def ticket_lookup(ticket_num):
+        with flight_plugins.database.session() as session:
+            return flight_plugins.query_flight_by_ticket(session, ticket_num)
+
+    return {
+        "load_user_flight_info": lambda rng: load_flights(flights, f"c{rng.randrange(customers)}"),
+        "check_flight_status": lambda rng: flight_status(flights, rng.choice(FLIGHT_NUMS), rng.choice(AIRPORTS)),
+        "ticket lookup (confirm)": lambda rng: ticket_lookup(f"t{rng.randrange(1, tickets + 1):010d}"),
+        "load_user_reservation_info": lambda rng: load_reservations(hotels, f"c{rng.randrange(customers)}"),
+        "check_reservation_status": lambda rng: reservation_status(hotels, str(rng.randrange(1, reservations + 1))),
+    }
+
+
+def measure(calls: dict, iterations: int, seed: int) -> dict[str, list[float]]:
+    results = {}
+    for name, call in calls.items():
+        rng = random.Random(seed)
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            call(rng)
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = samples
+    return results
+
+
+def drop_indexes(flight_plugins, hotel_plugins) -> None:
+    for module in (flight_plugins, hotel_plugins):
+        with module.engine.begin() as connection:
+            for table in module.Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--flights-per-customer", type=int, default=3)
+    parser.add_argument("--reservations-per-customer", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=50, help="lookups per tool and schema")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        flight_plugins, hotel_plugins = import_tool_plugins(
+            workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        generate(flight_plugins, hotel_plugins, args.customers, args.flights_per_customer,
+                 args.reservations_per_customer, args.seed)
+        calls = lookups(flight_plugins, hotel_plugins, args.customers,
+                        args.customers * args.flights_per_customer, args.customers * args.reservations_per_customer)
+
+        drop_indexes(flight_plugins, hotel_plugins)
+        before = measure(calls, args.iterations, args.seed)
+        start = time.perf_counter()
+        created = flight_plugins.database.create_schema(flight_plugins.Base.metadata)
+        created += hotel_plugins.database.create_schema(hotel_plugins.Base.metadata)
+        print(f"migration built {len(created)} indexes in {time.perf_counter() - start:.1f}s")
+        after = measure(calls, args.iterations, args.seed)
+
+        print(f"{'tool':<28} {'before p50':>11} {'before p99':>11} {'after p50':>10} {'after p99':>10}")
+        for name in calls:
+            print(f"{name:<28} {np.percentile(before[name], 50):11.2f} {np.percentile(before[name], 99):11.2f} "
+                  f"{np.percentile(after[name], 50):10.3f} {np.percentile(after[name], 99):10.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
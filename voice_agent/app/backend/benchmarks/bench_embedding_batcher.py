@@ -0,0 +1,79 @@
+"""
+Throughput of EmbeddingBatcher against one request per query, using a local fake
+Azure OpenAI embeddings endpoint.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_embedding_batcher --concurrency 1,10,100
+
+The fake endpoint answers POST /openai/deployments/{deployment}/embeddings after a
+fixed per-request latency plus a small per-input cost, and only serves
+--server-concurrency requests at a time (a stand-in for rate limits).
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from openai import AsyncAzureOpenAI
+
+from benchmarks.fakes import FakeEmbeddingsServer
+
+
+async def run(concurrency: int, calls_per_caller: int, embed) -> float:
+    async def caller(n):
+        for i in range(calls_per_caller):
+            await embed(f"caller {n} question {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller(n) for n in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,10,100")
+    parser.add_argument("--calls", type=int, default=20, help="sequential calls per concurrent caller")
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--per-input-ms", type=float, default=0.2)
+    parser.add_argument("--server-concurrency", type=int, default=16)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--dim", type=int, default=64, help="vector size returned by the fake endpoint")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1")
+    from agents.tools.embeddings import EmbeddingBatcher
+
+    server = FakeEmbeddingsServer(args.latency_ms, args.per_input_ms, args.server_concurrency, args.dim)
+    await server.start()
+    client = AsyncAzureOpenAI(api_key="fake", azure_endpoint=f"http://127.0.0.1:{server.port}",
+                              api_version="2023-12-01-preview", max_retries=0)
+
+    async def unbatched(text):
+        response = await client.embeddings.create(input=[text], model="fake")
+        return response.data[0].embedding
+
+    print(f"{'callers':>8} {'mode':>10} {'emb/s':>10} {'requests':>9} {'mean batch':>11} {'ms/call':>9}")
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            total = concurrency * args.calls
+            for mode in ("unbatched", "batched"):
+                server.requests = 0
+                if mode == "batched":
+                    batcher = EmbeddingBatcher(client, args.max_batch_size, args.max_wait_ms)
+                    elapsed = await run(concurrency, args.calls, lambda text: batcher.embed(text, "fake"))
+                    mean_batch = batcher.stats()["mean_batch_size"]
+                else:
+                    elapsed = await run(concurrency, args.calls, unbatched)
+                    mean_batch = 1.0
+                print(f"{concurrency:>8} {mode:>10} {total / elapsed:10.1f} {server.requests:>9} "
+                      f"{mean_batch:11.1f} {elapsed * 1000 / args.calls:9.1f}")
+    finally:
+        await client.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
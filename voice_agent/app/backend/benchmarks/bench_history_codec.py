@@ -0,0 +1,103 @@
+"""
+Size and cost of persisting conversation history: the pickled, base64 encoded
+ChatHistoryTruncationReducer rewritten on every message (utility.SessionState) against
+the compact records appended by session_state.AsyncSessionState.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_history_codec --sessions 200 --turns 20 --redis-ms 0.5
+
+Each session adds --turns user/assistant message pairs of realistic length and persists
+after every message, awaiting each write so its latency can be timed, to a local Redis
+stand-in. Reported per message: encoding time, bytes sent and the time to persist;
+per session: bytes stored and the time to load the history back into a reducer. The
+codec is msgpack when it is installed, JSON otherwise.
+"""
+
+import argparse
+import asyncio
+import base64
+import pickle
+import random
+import time
+
+import numpy as np
+import redis.asyncio as aioredis
+from semantic_kernel.contents import ChatHistoryTruncationReducer
+
+from benchmarks.fakes import FakeRedisServer, serve_in_thread
+from session_state import HISTORY_KEY_PREFIX, AsyncSessionState, encode_message
+
+HISTORY_WINDOW = 3
+WORDS = ("flight", "hotel", "booking", "confirmation", "change", "date", "seat", "room", "tomorrow", "refund",
+         "policy", "baggage", "check-in", "upgrade", "please", "could", "you", "the", "my", "for", "to")
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+async def run(args, path: str, port: int) -> dict:
+    rng = random.Random(args.seed)
+    client = aioredis.Redis(host="127.0.0.1", port=port)
+    store = AsyncSessionState(HISTORY_WINDOW, client)
+    encode_us, sent, persist_ms, load_ms = [], [], [], []
+    for n in range(args.sessions):
+        key = f"{path}-{n}"
+        history = ChatHistoryTruncationReducer(target_count=HISTORY_WINDOW)
+        for turn in range(args.turns):
+            for role, words in (("user", rng.randint(5, 20)), ("assistant", rng.randint(15, 60))):
+                text = sentence(rng, words)
+                start = time.perf_counter()
+                if path == "pickle":
+                    history.add_user_message(text) if role == "user" else history.add_assistant_message(text)
+                    await history.reduce()
+                    data = base64.b64encode(pickle.dumps(history))
+                    encoded = time.perf_counter()
+                    await client.set(key, data)
+                    sent.append(len(key) + len(data))
+                else:
+                    data = encode_message(role, text, time.time())
+                    encoded = time.perf_counter()
+                    async with client.pipeline(transaction=False) as pipe:
+                        pipe.rpush(HISTORY_KEY_PREFIX + key, data)
+                        pipe.ltrim(HISTORY_KEY_PREFIX + key, -HISTORY_WINDOW, -1)
+                        await pipe.execute()
+                    sent.append(2 * len(HISTORY_KEY_PREFIX + key) + len(data))
+                encode_us.append((encoded - start) * 1e6)
+                persist_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        loaded = await store.get(key)
+        load_ms.append((time.perf_counter() - start) * 1000)
+        assert len(loaded.messages) >= HISTORY_WINDOW
+    await client.aclose()
+    return {"encode_us": encode_us, "sent": sent, "persist_ms": persist_ms, "load_ms": load_ms}
+
+
+def stored_bytes(server: FakeRedisServer, path: str) -> float:
+    sizes = []
+    for key, value in server.data.items():
+        if path.encode() in key:
+            sizes.append(len(key) + (sum(len(v) for v in value) if isinstance(value, list) else len(value)))
+    return float(np.mean(sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20, help="user/assistant message pairs per session")
+    parser.add_argument("--redis-ms", type=float, default=0.5, help="Redis round trip latency")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve_in_thread(FakeRedisServer(args.redis_ms))
+    print(f"{'path':<8} {'encode us':>10} {'sent B/msg':>11} {'persist p50':>12} {'persist p99':>12} "
+          f"{'stored B/session':>17} {'load ms':>8}")
+    for path in ["pickle", "compact"]:
+        r = asyncio.run(run(args, path, server.port))
+        print(f"{path:<8} {np.mean(r['encode_us']):10.1f} {np.mean(r['sent']):11.0f} "
+              f"{np.percentile(r['persist_ms'], 50):12.2f} {np.percentile(r['persist_ms'], 99):12.2f} "
+              f"{stored_bytes(server, path):17.0f} {np.mean(r['load_ms']):8.2f}")
+
+
+if __name__ == "__main__":
+    main()
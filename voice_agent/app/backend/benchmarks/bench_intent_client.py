@@ -0,0 +1,94 @@
+"""
+Audio relay stalls caused by intent classification: the previous urllib call inside
+detect_intent against IntentShiftClient, both hitting a local stub of the
+intent-shift scoring endpoint.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_intent_client --sessions 50 --latency-ms 150
+
+Every session relays one audio frame every 20 ms and records how late the loop woke
+it up; each also classifies a "user turn" every --turn-interval seconds. The stub
+runs on its own thread and also counts the TCP connections it was sent.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.request
+
+import numpy as np
+
+from benchmarks.bench_tool_loop_latency import relay
+from benchmarks.fakes import FakeIntentServer, serve_in_thread
+from intent import IntentShiftClient
+
+
+def urllib_classify(url: str, conversation: str) -> str:
+    # The previous detect_intent body: a new connection and a blocking round trip per call.
+    data = {"input_data": {"columns": ["input_string"], "index": [0], "data": [[conversation]]}, "params": {}}
+    req = urllib.request.Request(url, json.dumps(data).encode("utf-8"), headers={
+        "Content-Type": "application/json", "Authorization": "Bearer fake", "azureml-model-deployment": "fake"})
+    return json.loads(urllib.request.urlopen(req).read())[0]["0"].strip()
+
+
+async def measure(args, classify) -> tuple[list[float], list[float]]:
+    lateness_ms: list[float] = []
+    classify_ms: list[float] = []
+
+    async def turns():
+        await asyncio.sleep(random.uniform(0, args.turn_interval))
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            await classify("user: I need to change my flight")
+            classify_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(args.turn_interval)
+
+    tasks = [relay(args.duration, lateness_ms) for _ in range(args.sessions)]
+    if classify:
+        tasks += [turns() for _ in range(args.sessions)]
+    await asyncio.gather(*tasks)
+    return lateness_ms, classify_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="stub endpoint latency")
+    parser.add_argument("--turn-interval", type=float, default=2.0, help="seconds between user turns per session")
+    parser.add_argument("--duration", type=float, default=6.0)
+    args = parser.parse_args()
+
+    server = serve_in_thread(FakeIntentServer(args.latency_ms))
+    url = f"http://127.0.0.1:{server.port}/score"
+
+    async def blocking(conversation):
+        return urllib_classify(url, conversation)
+
+    client = IntentShiftClient(url, "fake", "fake")
+
+    async def pooled(conversation):
+        return await client.classify(conversation)
+
+    print(f"{'client':<8} {'frames':>7} {'late p50':>9} {'late p99':>9} {'late max':>9} "
+          f"{'calls':>6} {'call p50':>9} {'call p99':>9} {'conns':>6}")
+    for name, classify in [("idle", None), ("urllib", blocking), ("aiohttp", pooled)]:
+        server.requests, server.connections = 0, set()
+
+        async def run():
+            try:
+                return await measure(args, classify)
+            finally:
+                await client.close()
+
+        lateness, calls = asyncio.run(run())
+        call_p50, call_p99 = (np.percentile(calls, 50), np.percentile(calls, 99)) if calls else (0.0, 0.0)
+        print(f"{name:<8} {len(lateness):>7} {np.percentile(lateness, 50):9.1f} {np.percentile(lateness, 99):9.1f} "
+              f"{max(lateness):9.1f} {len(calls):>6} {call_p50:9.1f} {call_p99:9.1f} {len(server.connections):>6}")
+    print(f"aiohttp client: {client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
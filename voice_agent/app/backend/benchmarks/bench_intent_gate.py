@@ -0,0 +1,130 @@
+"""
+Intent detection work saved by intent.IntentGate: classifier calls and time per user
+turn with every turn classified (as before) and with the gate, and the cost of building
+the classifier input from the history against the incremental window.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_intent_gate --ack-rate 0.4 --reconnect-rate 0.05
+
+Conversations draw user turns from benchmarks/data/intent_eval.jsonl: with probability
+--ack-rate a turn without intent ("Okay.", "Thank you so much."), otherwise a labelled
+one. With probability --reconnect-rate a turn is replayed after a simulated reconnect,
+so the classifier input window repeats. The classifier is a stub with --classifier-ms
+latency. "missed" counts labelled turns the gate skipped, which would have needed a
+classification; it should stay 0.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+from semantic_kernel.contents import ChatHistoryTruncationReducer
+
+from intent import IntentGate
+
+MAX_HISTORY_LENGTH = 3
+REPLY = "Sure, let me look into that for you."
+
+
+def conversations(args, rows: list[dict]) -> list[list[dict]]:
+    rng = random.Random(args.seed)
+    acks = [row for row in rows if row["agent"] is None]
+    labelled = [row for row in rows if row["agent"]]
+    sessions = []
+    for _ in range(args.sessions):
+        turns = []
+        for _ in range(args.turns):
+            turns.append(rng.choice(acks if rng.random() < args.ack_rate else labelled))
+            if rng.random() < args.reconnect_rate:
+                turns.append(dict(turns[-1], replay=True))
+        sessions.append(turns)
+    return sessions
+
+
+async def measure(args, sessions: list[list[dict]], gate) -> dict:
+    calls = 0
+    missed = 0
+    per_turn_ms = []
+
+    async def classify(window: str):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(args.classifier_ms / 1000)
+        return "flight_agent"
+
+    async def run(turns: list[dict]):
+        nonlocal missed
+        window = []
+        for row in turns:
+            if not row.get("replay"):
+                window = (window + [f"user: {row['turn']}"])[-(MAX_HISTORY_LENGTH + 1):]
+            start = time.perf_counter()
+            conversation = "\n".join(window)
+            if gate is None:
+                await classify(conversation)
+            elif gate.should_classify(row["turn"]):
+                await gate.classify(conversation, classify)
+            elif row["agent"]:
+                missed += 1
+            per_turn_ms.append((time.perf_counter() - start) * 1000)
+            if not row.get("replay"):
+                window = (window + [f"assistant: {REPLY}"])[-(MAX_HISTORY_LENGTH + 1):]
+
+    await asyncio.gather(*(run(turns) for turns in sessions))
+    return {"turns": len(per_turn_ms), "calls": calls, "missed": missed, "per_turn_ms": per_turn_ms}
+
+
+def window_cost(iterations: int) -> tuple[float, float]:
+    # Per-turn cost of formatting the classifier input: from the history, as before, and
+    # from the window kept alongside it.
+    from collections import deque
+
+    history = ChatHistoryTruncationReducer(target_count=MAX_HISTORY_LENGTH)
+    window = deque(maxlen=MAX_HISTORY_LENGTH + 1)
+    for n in range(MAX_HISTORY_LENGTH):
+        history.add_user_message(f"turn {n}")
+        window.append(f"user: turn {n}")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        "\n".join([f"{item.role.value}: {item.items[0].text}" for item in history])
+    rebuilt = (time.perf_counter() - start) / iterations * 1e6
+    start = time.perf_counter()
+    for n in range(iterations):
+        window.append("user: next turn")
+        "\n".join(window)
+    incremental = (time.perf_counter() - start) / iterations * 1e6
+    return rebuilt, incremental
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="benchmarks/data/intent_eval.jsonl")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10, help="user turns per session")
+    parser.add_argument("--ack-rate", type=float, default=0.4)
+    parser.add_argument("--reconnect-rate", type=float, default=0.05)
+    parser.add_argument("--classifier-ms", type=float, default=150.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.dataset) as file:
+        rows = [json.loads(line) for line in file if line.strip()]
+    sessions = conversations(args, rows)
+
+    print(f"{'policy':<8} {'turns':>6} {'calls':>6} {'skip rate':>10} {'missed':>7} {'mean ms':>8} {'p50 ms':>7}")
+    for name, gate in [("all", None), ("gated", IntentGate())]:
+        r = asyncio.run(measure(args, sessions, gate))
+        print(f"{name:<8} {r['turns']:>6} {r['calls']:>6} {1 - r['calls'] / r['turns']:10.1%} {r['missed']:>7} "
+              f"{np.mean(r['per_turn_ms']):8.1f} {np.percentile(r['per_turn_ms'], 50):7.1f}")
+        if gate:
+            print(f"gate: {gate.stats()}")
+
+    rebuilt, incremental = window_cost(100_000)
+    print(f"classifier input per turn: rebuilt from history {rebuilt:.2f} us, incremental window {incremental:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Intent classification latency under backend slowdowns and outages: the AML endpoint on
+its own (the previous detect_intent), against intent.HedgedIntentClassifier hedging it
+with gpt-4o-mini inside a per-turn budget.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_intent_hedging
+    python -m benchmarks.bench_intent_hedging --spike-rate 0.1 --outage 3,6 --budget-ms 1000
+
+Both backends are local fakes with lognormal latency. The AML fake also has
+--spike-rate latency spikes of --spike-ms, and during the --outage window (seconds into
+the run) every call hangs until the endpoint's own timeout and then fails. Sessions
+classify a turn every --turn-interval seconds. "stay" is the share of turns that got no
+answer and stayed on the current agent.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import numpy as np
+
+from intent import INTENT_SHIFT_TIMEOUT_SECONDS, CircuitBreaker, ClassifierBackend, HedgedIntentClassifier
+
+
+def fake_backend(median_ms: float, sigma: float, rng: random.Random, spike_rate: float = 0.0,
+                 spike_ms: float = 0.0, outage: tuple[float, float] = None, started: list[float] = None):
+    async def classify(conversation, agents=None):
+        if outage and outage[0] <= time.monotonic() - started[0] < outage[1]:
+            await asyncio.sleep(INTENT_SHIFT_TIMEOUT_SECONDS)
+            return None
+        latency_ms = median_ms * rng.lognormvariate(0, sigma)
+        if rng.random() < spike_rate:
+            latency_ms += spike_ms
+        await asyncio.sleep(latency_ms / 1000)
+        return "flight_agent"
+    return classify
+
+
+async def measure(args, hedged: bool) -> tuple[list[float], HedgedIntentClassifier]:
+    rng = random.Random(args.seed)
+    started = [time.monotonic()]
+    outage = tuple(float(s) for s in args.outage.split(",")) if args.outage else None
+    backends = [ClassifierBackend(
+        "aml", fake_backend(args.aml_ms, args.sigma, rng, args.spike_rate, args.spike_ms, outage, started),
+        CircuitBreaker(args.breaker_failures, args.breaker_reset))]
+    if hedged:
+        backends.append(ClassifierBackend(
+            "gpt-4o-mini", fake_backend(args.mini_ms, args.sigma, rng),
+            CircuitBreaker(args.breaker_failures, args.breaker_reset)))
+        classifier = HedgedIntentClassifier(backends, args.budget_ms)
+    else:
+        # No budget: wait for the endpoint until its own timeout, as detect_intent did.
+        classifier = HedgedIntentClassifier(backends, INTENT_SHIFT_TIMEOUT_SECONDS * 1000 + 100)
+        backends[0].breaker.failure_threshold = float("inf")
+    latencies: list[float] = []
+
+    async def session():
+        await asyncio.sleep(rng.uniform(0, args.turn_interval))
+        while time.monotonic() - started[0] < args.duration:
+            start = time.perf_counter()
+            await classifier.classify("user: I need to change my flight")
+            latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(args.turn_interval)
+
+    await asyncio.gather(*(session() for _ in range(args.sessions)))
+    return latencies, classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--turn-interval", type=float, default=0.25)
+    parser.add_argument("--aml-ms", type=float, default=80.0, help="AML endpoint median latency")
+    parser.add_argument("--mini-ms", type=float, default=300.0, help="gpt-4o-mini median latency")
+    parser.add_argument("--sigma", type=float, default=0.3, help="lognormal spread of both backends")
+    parser.add_argument("--spike-rate", type=float, default=0.05)
+    parser.add_argument("--spike-ms", type=float, default=1500.0)
+    parser.add_argument("--outage", default="3,6", help="start,end seconds of an AML outage; empty for none")
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    parser.add_argument("--breaker-reset", type=float, default=1.0, help="seconds before an open breaker probes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger("intent").setLevel(logging.ERROR)
+
+    print(f"{'policy':<8} {'turns':>6} {'p50':>7} {'p99':>7} {'max':>7} {'stay':>6} {'hedged':>7} "
+          f"{'aml wins':>9} {'mini wins':>10} {'aml opened':>11}")
+    for name, hedged in [("aml", False), ("hedged", True)]:
+        latencies, classifier = asyncio.run(measure(args, hedged))
+        stats = classifier.stats()
+        backends = stats["backends"]
+        stay = (stats["budget_exhausted"] + stats["unavailable"]) / max(1, stats["turns"])
+        print(f"{name:<8} {len(latencies):>6} {np.percentile(latencies, 50):7.0f} {np.percentile(latencies, 99):7.0f} "
+              f"{max(latencies):7.0f} {stay:6.1%} {stats['hedged']:>7} {backends['aml']['wins']:>9} "
+              f"{backends.get('gpt-4o-mini', {}).get('wins', 0):>10} {backends['aml']['breaker_opened']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Per-frame cost of the relay's JSON work with each json_codec backend (JSON_CODEC=json
+and orjson).
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_json_codec --repeat 20000
+
+The payloads have the shape and size of what the relay and the ACS bridge handle on
+every call, with random audio: the web client's 100 ms input_audio_buffer.append (decoded
+by rtmt), the service's 20 ms response.audio.delta and a transcript delta (encoded by
+rtmt, decoded by the bridge), a response.done, and ACS's 20 ms AudioData frames (decoded
+and encoded by the bridge). Each is encoded or decoded --repeat times; reported are
+microseconds per frame and the saving per second of call audio, for a call streaming
+audio both ways through the relay and the bridge.
+"""
+
+import argparse
+import base64
+import importlib
+import os
+import timeit
+
+SAMPLE_RATE = 24000
+
+
+def audio(ms: int) -> str:
+    return base64.b64encode(os.urandom(SAMPLE_RATE * 2 * ms // 1000)).decode()
+
+
+def payloads() -> dict:
+    ids = {"event_id": "event_AbC123xYz", "response_id": "resp_AbC123xYz", "item_id": "item_AbC123xYz",
+           "output_index": 0, "content_index": 0}
+    response_done = {
+        "type": "response.done", "event_id": "event_AbC123xYz",
+        "response": {
+            "id": "resp_AbC123xYz", "object": "realtime.response", "status": "completed", "status_details": None,
+            "output": [{
+                "id": "item_AbC123xYz", "object": "realtime.item", "type": "message", "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "audio", "transcript": "Sure, I have found your booking for the flight to "
+                                                            "Seattle tomorrow morning. Which date would you prefer?"}],
+            }],
+            "usage": {"total_tokens": 1450, "input_tokens": 1200, "output_tokens": 250,
+                      "input_token_details": {"cached_tokens": 1024, "text_tokens": 900, "audio_tokens": 300},
+                      "output_token_details": {"text_tokens": 60, "audio_tokens": 190}},
+        },
+    }
+    return {
+        # (what, frames per second of call audio, encode?, payload)
+        "client append 100 ms (rtmt loads)": (10, False, {"type": "input_audio_buffer.append", "audio": audio(100)}),
+        "audio delta 20 ms (rtmt dumps)": (50, True, {"type": "response.audio.delta", "delta": audio(20)}),
+        "audio delta 20 ms (bridge loads)": (50, False, {"type": "response.audio.delta", "delta": audio(20)}),
+        "transcript delta (rtmt dumps)": (3, True, {"type": "response.audio_transcript.delta", "delta": " booking",
+                                                    **ids}),
+        "response.done (rtmt dumps)": (0.2, True, response_done),
+        "ACS AudioData 20 ms (bridge loads)": (50, False, {
+            "kind": "AudioData", "audioData": {"timestamp": "2025-01-01T00:00:00.000Z",
+                                               "participantRawID": "4:+15555550100", "data": audio(20),
+                                               "silent": False}}),
+        "ACS AudioData 20 ms (bridge dumps)": (50, True, {"kind": "AudioData", "audioData": {"data": audio(20)}}),
+        "append 20 ms (bridge dumps)": (50, True, {"type": "input_audio_buffer.append", "audio": audio(20)}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    codecs = {}
+    for name in ["json", "orjson"]:
+        os.environ["JSON_CODEC"] = name
+        import json_codec
+        codec = importlib.reload(json_codec)
+        if codec.JSON_CODEC == name:
+            codecs[name] = (codec.dumps, codec.loads)
+    if "orjson" not in codecs:
+        print("orjson is not installed; only json is measured")
+
+    results = {name: {} for name in codecs}
+    print(f"{'frame':<36} {'bytes':>6}" + "".join(f" {name + ' us':>10}" for name in codecs))
+    for what, (per_second, encode, payload) in payloads().items():
+        text = codecs["json"][0](payload)
+        row = f"{what:<36} {len(text):6d}"
+        for name, (dumps, loads) in codecs.items():
+            call = (lambda: dumps(payload)) if encode else (lambda: loads(text))
+            us = min(timeit.repeat(call, number=args.repeat, repeat=3)) / args.repeat * 1e6
+            results[name][what] = (us, per_second)
+            row += f" {us:10.2f}"
+        print(row)
+    for name, frames in results.items():
+        per_second = sum(us * rate for us, rate in frames.values())
+        print(f"{name}: {per_second:.0f} us of JSON work per second of call audio")
+
+
+if __name__ == "__main__":
+    main()
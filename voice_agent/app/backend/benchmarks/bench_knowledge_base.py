@@ -0,0 +1,95 @@
+"""
+Benchmark knowledge-base search: the original per-chunk scipy cosine loop vs VectorSearchEngine.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_knowledge_base --sizes 1000,100000,1000000 --dim 1536
+
+The original implementation keeps every embedding as a list of Python floats, so it
+is only measured up to --legacy-max chunks and extrapolated linearly beyond that.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy import spatial
+
+from agents.tools.knowledge_base import VectorSearchEngine
+
+
+def legacy_find(chunks_emb, input_vector, topk):
+    cosine_list = [
+        (item['id'], item['policy_text'], 1 - spatial.distance.cosine(input_vector, item['policy_text_embedding']))
+        for item in chunks_emb
+    ]
+    cosine_list.sort(key=lambda x: x[2], reverse=True)
+    return cosine_list[:topk]
+
+
+def random_matrix(rng, rows, dim, block=50_000):
+    matrix = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, block):
+        stop = min(start + block, rows)
+        matrix[start:stop] = rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return matrix
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--topk", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=16, help="queries per find_articles-style batch")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy-max", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.batch, args.dim), dtype=np.float32)
+    legacy_ms_per_chunk = None
+
+    print(f"{'chunks':>10} {'legacy ms':>12} {'engine ms':>10} {'speedup':>9} {'batch ms/query':>15} {'build s':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        matrix = random_matrix(rng, size, args.dim)
+        ids = [str(i) for i in range(size)]
+
+        start = time.perf_counter()
+        engine = VectorSearchEngine.from_embeddings(ids, ids, matrix)
+        build_s = time.perf_counter() - start
+        del matrix
+
+        engine_ms = timed(lambda: engine.search(queries[0], args.topk), args.repeat)
+        batch_ms = timed(lambda: engine.search_batch(queries, args.topk), args.repeat) / len(queries)
+
+        if size <= args.legacy_max:
+            chunks_emb = [
+                {'id': ids[i], 'policy_text': ids[i], 'policy_text_embedding': engine.matrix[i].tolist()}
+                for i in range(size)
+            ]
+            query = queries[0].tolist()
+            expected = [chunk_id for chunk_id, _, _ in legacy_find(chunks_emb, query, args.topk)]
+            actual = [chunk_id for chunk_id, _, _ in engine.search(queries[0], args.topk)]
+            assert expected == actual, (expected, actual)
+            legacy_ms = timed(lambda: legacy_find(chunks_emb, query, args.topk), max(1, args.repeat // 2))
+            legacy_ms_per_chunk = legacy_ms / size
+            legacy_label = f"{legacy_ms:12.2f}"
+            del chunks_emb
+        else:
+            legacy_ms = legacy_ms_per_chunk * size if legacy_ms_per_chunk else float("nan")
+            legacy_label = f"~{legacy_ms:.0f}".rjust(12)
+
+        print(f"{size:>10} {legacy_label} {engine_ms:10.2f} {legacy_ms / engine_ms:8.0f}x {batch_ms:15.3f} {build_s:8.2f}")
+        del engine
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+One relay direction with a slow peer, sent inline as before and through relay's bounded
+queues: how long the relay's read loop is held up, how old the audio is when the peer
+gets it, and how much of a reply the client still gets after the user barged in.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_relay_queues --sessions 200 --seconds 6 --stall-ms 800 --stall-every-ms 2000
+
+Each session's relay reads --chunk-ms audio chunks in real time from its side (the
+client's microphone inbound, the service's reply outbound) and relays them to a peer
+that stalls for --stall-ms every --stall-every-ms (a client on a congested network, or
+a busy realtime service); --slow is the fraction of sessions with such a peer, the rest
+take every message right away. Inline, the read loop awaits each send, as
+_forward_messages did. Queued, it puts each chunk in a RelayQueue (inbound) or a
+ClientQueue (outbound) with the default bounds, sent by a task of its own. Outbound,
+the user barges in at --barge-in-ms, after which the relay drops the queued reply
+audio; whatever of the reply reaches the client after it is stale.
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from relay import (ClientQueue, RelayQueue, RELAY_INBOUND_MAX_AUDIO_AGE_MS, RELAY_INBOUND_MAX_ITEMS,
+                   RELAY_OUTBOUND_MAX_AUDIO_AGE_MS, RELAY_OUTBOUND_MAX_ITEMS)
+
+
+class StallingPeer:
+    """Takes messages right away except for a stall of stall_ms every stall_every_ms."""
+
+    def __init__(self, stall_ms: float, stall_every_ms: float, start: float):
+        self.stall = stall_ms / 1000
+        self.every = stall_every_ms / 1000
+        self.start = start
+        self.received: list[tuple[float, float]] = []  # (when produced, when received)
+
+    async def send(self, message) -> None:
+        if self.stall:
+            # Inside a stall window, the send returns only when it ends.
+            phase = (time.perf_counter() - self.start) % self.every
+            if phase < self.stall:
+                await asyncio.sleep(self.stall - phase)
+        self.received.append((message[0], time.perf_counter()))
+
+    async def send_bytes(self, frame: bytes) -> None:
+        await self.send((float(frame.split(b":", 1)[0]),))
+
+
+async def session(args, slow: bool, mode: str, direction: str) -> dict:
+    start = time.perf_counter()
+    peer = StallingPeer(args.stall_ms if slow else 0, args.stall_every_ms, start + args.stall_every_ms / 2000)
+    queue = None
+    if mode == "queued":
+        if direction == "inbound":
+            queue = RelayQueue("inbound", peer.send, RELAY_INBOUND_MAX_ITEMS, RELAY_INBOUND_MAX_AUDIO_AGE_MS)
+        else:
+            queue = ClientQueue(peer, RELAY_OUTBOUND_MAX_ITEMS, RELAY_OUTBOUND_MAX_AUDIO_AGE_MS)
+        sender = asyncio.create_task(queue.run())
+    chunk = args.chunk_ms / 1000
+    barge_in = start + args.barge_in_ms / 1000
+    payload = b"\0" * (48 * args.chunk_ms)
+    lags = []
+    barged = False
+    for i in range(int(args.seconds / chunk)):
+        due = start + i * chunk
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        now = time.perf_counter()
+        lags.append(now - due)
+        if direction == "outbound" and not barged and due >= barge_in:
+            # speech_started comes after the reply audio before it, in the service's stream.
+            barged = True
+            if queue is not None:
+                queue.discard_audio()
+        if direction == "outbound" and barged:
+            break
+        if queue is None:
+            await peer.send((due,))
+        elif direction == "inbound":
+            queue.put((due,), audio=True)
+        else:
+            await queue.send_bytes(b"%f:" % due + payload)
+    if queue is not None:
+        # Let the peer take what is still queued.
+        while queue.items:
+            await asyncio.sleep(chunk)
+        sender.cancel()
+    ages = [received - produced for produced, received in peer.received]
+    return {
+        "lags": lags,
+        "ages": ages,
+        "stale": sum(1 for produced, received in peer.received if received > barge_in) * args.chunk_ms,
+        "dropped": sum(queue.dropped.values()) if queue is not None else 0,
+    }
+
+
+async def run(args, mode: str, direction: str) -> dict:
+    n_slow = int(args.sessions * args.slow)
+    results = await asyncio.gather(*(session(args, n < n_slow, mode, direction) for n in range(args.sessions)))
+    slow = results[:n_slow] or results
+    lags = np.array([lag for r in results for lag in r["lags"]]) * 1000
+    ages = np.array([age for r in slow for age in r["ages"]]) * 1000
+    return {
+        "loop_lag_max": max(max(r["lags"]) for r in results) * 1000,
+        "loop_lag_p99": np.percentile(lags, 99),
+        "age_p50": np.percentile(ages, 50),
+        "age_p99": np.percentile(ages, 99),
+        "stale_ms": np.mean([r["stale"] for r in slow]),
+        "dropped": np.mean([r["dropped"] for r in slow]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--slow", type=float, default=0.1, help="fraction of sessions with a stalling peer")
+    parser.add_argument("--seconds", type=float, default=6)
+    parser.add_argument("--chunk-ms", type=int, default=20)
+    parser.add_argument("--stall-ms", type=float, default=800)
+    parser.add_argument("--stall-every-ms", type=float, default=2000)
+    parser.add_argument("--barge-in-ms", type=float, default=3500)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions, {args.slow:.0%} with a peer stalling {args.stall_ms:.0f} ms "
+          f"every {args.stall_every_ms:.0f} ms; ages and drops are of the slow sessions")
+    print(f"{'direction':<9} {'mode':<7} {'loop lag p99/max ms':>20} {'age p50/p99 ms':>15} "
+          f"{'after barge-in ms':>18} {'dropped':>8}")
+    for direction in ("inbound", "outbound"):
+        for mode in ("inline", "queued"):
+            r = asyncio.run(run(args, mode, direction))
+            stale = f"{r['stale_ms']:.0f}" if direction == "outbound" else "-"
+            print(f"{direction:<9} {mode:<7} {r['loop_lag_p99']:9.1f}/{r['loop_lag_max']:<10.1f} "
+                  f"{r['age_p50']:6.1f}/{r['age_p99']:<8.1f} {stale:>18} {r['dropped']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Memory per session, to size workers for concurrent calls: the previous per-session dict,
+which kept its own AzureRealtimeExecutionSettings with formatted instructions, against
+session.Session referencing shared AgentTemplates.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_session_memory --sessions 10000
+
+Each session holds a history of --messages messages, as after a few turns. "idle" is a
+session with no client connected; "active" adds what a connected call holds on top:
+the realtime settings the connection was opened with (for Session, the per-connection
+copy) and a pending intent detection task set. Bytes come from tracemalloc over
+--sessions sessions; "estimate" is Session.memory_bytes() for comparison. The realtime
+websocket and audio buffers, the same either way, are not included.
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from benchmarks.fakes import import_tool_plugins
+
+
+def old_session(tier, history, n: int, active: bool) -> dict:
+    # The dict _new_session returned, with the settings _forward_messages stored in it.
+    agent = tier.default_agent
+    settings = tier._realtime_settings()
+    settings.instructions = agent.get("persona", "").format(customer_name=f"Customer {n}", customer_id=str(n))
+    return {
+        "current_agent": agent,
+        "current_agent_kernel": tier.default_agent_kernel,
+        "history": history,
+        "intent_window": tier._intent_window(history),
+        "target_agent_name": None,
+        "transfer_conversation": False,
+        "active_response": False,
+        "realtime_settings": settings,
+        "response_requested": False,
+        "response_id": None,
+        "stale_response_id": None,
+        "turn_started_at": None,
+        "first_audio_at": None,
+        "agent_switched": False,
+        "intent_tasks": set(),
+        "customer_name": f"Customer {n}",
+        "customer_id": str(n),
+    }
+
+
+def new_session(tier, history, n: int, active: bool):
+    session = tier._new_session(history, f"Customer {n}", str(n))
+    if active:
+        session.intent_tasks
+        # Held by the realtime client for as long as the call is connected.
+        return session, session.agent.settings_for(session)
+    return session
+
+
+def history_for(n: int, messages: int):
+    from semantic_kernel.contents import ChatHistoryTruncationReducer
+
+    history = ChatHistoryTruncationReducer(target_count=messages)
+    for i in range(messages):
+        if i % 2:
+            history.add_assistant_message(f"Sure, I have found booking {n}. Which date would you prefer?")
+        else:
+            history.add_user_message(f"I would like to change my booking number {n}.")
+    return history
+
+
+def measure(make, tier, args, active: bool) -> float:
+    # Histories are created first and kept out of neither side's count: both hold the same.
+    histories = [history_for(n, args.messages) for n in range(args.sessions)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = [make(tier, histories[n], n, active) for n in range(args.sessions)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del sessions
+    return size / args.sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=3, help="history messages per session")
+    args = parser.parse_args()
+
+    os.environ.update({"INTENT_ROUTER_ENABLED": "false", "TELEMETRY_SCENARIO": "none"})
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+    workdir = tempfile.mkdtemp()
+    try:
+        import_tool_plugins(workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        from azure.core.credentials import AzureKeyCredential
+        from rtmt import RTMiddleTier
+        logging.getLogger().setLevel(logging.WARNING)
+        tier = RTMiddleTier("http://127.0.0.1", "fake", AzureKeyCredential("fake"))
+
+        history = history_for(0, args.messages)
+        history_bytes = measure(lambda tier, h, n, active: history_for(n, args.messages), tier, args, False)
+        estimate = new_session(tier, history, 0, False).memory_bytes()
+        print(f"history of {args.messages} messages: {history_bytes:.0f} B (not counted below); "
+              f"Session.memory_bytes() with it: {estimate} B")
+        print(f"{'session':<8} {'idle B':>8} {'active B':>9} {'idle per GB':>12}")
+        for name, make in [("dict", old_session), ("Session", new_session)]:
+            idle = measure(make, tier, args, False)
+            active = measure(make, tier, args, True)
+            print(f"{name:<8} {idle:8.0f} {active:9.0f} {2**30 / (idle + history_bytes):12.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    main()
@@ -0,0 +1,130 @@
+"""
+Audio relay stalls caused by saving conversation history: utility.SessionState (the
+blocking redis client, pickling the whole history, used before) against
+session_state.AsyncSessionState, both talking to a local Redis stand-in with
+--redis-ms per round trip.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_session_state --sessions 100 --redis-ms 2
+
+Every session relays one audio frame every 20 ms and records how late the loop woke it
+up. Each also completes a turn every --turn-interval seconds, saving its history twice
+as RTMiddleTier does (the user transcript, then the reply), and reconnects once,
+reading its history back. At the end every session's stored history is read back and
+checked against the last one it saved.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+import numpy as np
+import redis
+import redis.asyncio as aioredis
+from semantic_kernel.contents import AuthorRole, ChatHistoryTruncationReducer, ChatMessageContent
+
+from benchmarks.bench_tool_loop_latency import relay
+from benchmarks.fakes import FakeRedisServer, serve_in_thread
+from session_state import AsyncSessionState
+
+HISTORY_WINDOW = 3
+
+
+class BlockingStore:
+    # utility.SessionState behind the interface rtmt now uses, saving the whole history per message.
+    def __init__(self, port: int):
+        from utility import SessionState
+
+        self.state = SessionState()
+        self.state.redis_client = redis.StrictRedis(host="127.0.0.1", port=port)
+        self.histories = {}
+
+    async def get(self, key):
+        return self.state.get(key)
+
+    def append(self, key, role, text):
+        history = self.histories.setdefault(key, ChatHistoryTruncationReducer(target_count=HISTORY_WINDOW))
+        history.add_message(ChatMessageContent(role=AuthorRole(role), content=text))
+        self.state.set(key, history)
+
+    async def close(self):
+        self.state.redis_client.close()
+
+
+async def measure(args, store) -> dict:
+    lateness_ms: list[float] = []
+    save_ms: list[float] = []
+    histories = {}
+
+    async def turns(n: int):
+        key = f"bench-{n}"
+        await asyncio.sleep(random.uniform(0, args.turn_interval))
+        deadline = time.monotonic() + args.duration
+        turn = 0
+        while time.monotonic() < deadline:
+            for role in ("user", "assistant"):
+                start = time.perf_counter()
+                store.append(key, role, f"session {n} {role} turn {turn}")
+                save_ms.append((time.perf_counter() - start) * 1000)
+            turn += 1
+            if turn == 2:
+                restored = await store.get(key)
+                assert restored.messages[-1].content == f"session {n} assistant turn 1"
+            await asyncio.sleep(args.turn_interval)
+        histories[key] = f"session {n} assistant turn {turn - 1}"
+
+    await asyncio.gather(*(relay(args.duration, lateness_ms) for _ in range(args.sessions)),
+                         *(turns(n) for n in range(args.sessions)))
+    await store.close()
+    return {"lateness": lateness_ms, "save": save_ms, "histories": histories}
+
+
+async def check(port: int, histories: dict) -> int:
+    # Sessions whose stored history does not end with the last message they saved; a new
+    # store reads both formats.
+    store = AsyncSessionState(HISTORY_WINDOW, aioredis.Redis(host="127.0.0.1", port=port))
+    stale = 0
+    for key, last in histories.items():
+        stored = await store.get(key)
+        stale += stored.messages[-1].content != last
+    await store.close()
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--redis-ms", type=float, default=2.0, help="Redis round trip latency")
+    parser.add_argument("--turn-interval", type=float, default=1.0, help="seconds between turns per session")
+    parser.add_argument("--duration", type=float, default=6.0)
+    args = parser.parse_args()
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1")
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+    os.environ["TELEMETRY_SCENARIO"] = "none"
+
+    print(f"{'store':<8} {'frames':>7} {'late p50':>9} {'late p99':>9} {'late max':>9} {'saves':>6} "
+          f"{'save p99':>9} {'round trips':>12} {'stale':>6}")
+    for name in ["blocking", "async"]:
+        server = serve_in_thread(FakeRedisServer(args.redis_ms))
+        if name == "blocking":
+            store = BlockingStore(server.port)
+        else:
+            pool = aioredis.BlockingConnectionPool(host="127.0.0.1", port=server.port, max_connections=16)
+            store = AsyncSessionState(HISTORY_WINDOW, aioredis.Redis(connection_pool=pool))
+        logging.getLogger().setLevel(logging.WARNING)
+        r = asyncio.run(measure(args, store))
+        stale = asyncio.run(check(server.port, r["histories"]))
+        lateness = r["lateness"]
+        print(f"{name:<8} {len(lateness):>7} {np.percentile(lateness, 50):9.1f} {np.percentile(lateness, 99):9.1f} "
+              f"{max(lateness):9.1f} {len(r['save']):>6} {np.percentile(r['save'], 99):9.3f} "
+              f"{server.round_trips:>12} {stale:>6}")
+        if name == "async":
+            print(f"async store: {store.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Event loop jitter seen by concurrent audio relays while knowledge base and database
+tools run, comparing the old inline (blocking) tool bodies with the current ones.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.bench_tool_loop_latency --chunks 200000 --sessions 50
+
+Each simulated session relays one audio frame every 20 ms and records how late the
+loop woke it up. Tool calls hit a synthetic knowledge base, a copy of
+data/flight_db.db and a local fake embeddings endpoint running on its own thread.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fakes import FakeEmbeddingsServer, serve_in_thread
+
+FRAME_MS = 20
+
+
+async def relay(duration_s: float, lateness_ms: list[float]) -> None:
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    frame = 0
+    while loop.time() - start < duration_s:
+        frame += 1
+        due = start + frame * FRAME_MS / 1000
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        lateness_ms.append((loop.time() - due) * 1000)
+
+
+async def measure(args, tool_call) -> list[float]:
+    lateness_ms: list[float] = []
+    stop = time.monotonic() + args.duration
+
+    async def tool_caller(n):
+        i = 0
+        while time.monotonic() < stop:
+            await tool_call(f"caller {n} question {i}")
+            i += 1
+
+    callers = [tool_caller(n) for n in range(args.tool_callers)] if tool_call else []
+    await asyncio.gather(*(relay(args.duration, lateness_ms) for _ in range(args.sessions)), *callers)
+    return lateness_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--tool-callers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    server = serve_in_thread(FakeEmbeddingsServer(latency_ms=30, per_input_ms=0.2, concurrency=64, dim=args.dim))
+    from agents.tools.knowledge_base import save_store
+    rng = np.random.default_rng(0)
+    ids = [str(i) for i in range(args.chunks)]
+    save_store(os.path.join(workdir, "kb"), ids, ids, rng.standard_normal((args.chunks, args.dim), dtype=np.float32))
+    shutil.copy("data/flight_db.db", os.path.join(workdir, "flight_db.db"))
+    os.environ.update({
+        "FLIGHT_POLICY_PATH": os.path.join(workdir, "kb"),
+        "SQLITE_DB_PATH": os.path.join(workdir, "flight_db.db"),
+        "AZURE_OPENAI_EMB_ENDPOINT": f"http://127.0.0.1:{server.port}",
+        "AZURE_OPENAI_EMB_API_KEY": "fake",
+        "AZURE_OPENAI_EMB_DEPLOYMENT": "fake",
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{server.port}",
+    })
+    from agents.tools import flight_plugins
+    tools = flight_plugins.Flight_Tools()
+
+    async def blocking_tools(question):
+        # The previous tool bodies: synchronous embedding call, scoring and query on the loop.
+        flight_plugins.search_client.find_article(question)
+        with flight_plugins.database.session() as session:
+            session.query(flight_plugins.Flight).filter_by(customer_id="12345", status="open").all()
+        await asyncio.sleep(0)
+
+    async def non_blocking_tools(question):
+        await tools.search_airline_knowledgebase(question)
+        await tools.load_user_flight_info("12345")
+
+    print(f"{'workload':<14} {'frames':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    try:
+        for name, tool_call in [("idle", None), ("blocking", blocking_tools), ("non-blocking", non_blocking_tools)]:
+            lateness = asyncio.run(measure(args, tool_call))
+            print(f"{name:<14} {len(lateness):>7} {np.percentile(lateness, 50):8.2f} "
+                  f"{np.percentile(lateness, 99):8.2f} {max(lateness):8.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Offline evaluation of the centroid intent router (intent.CentroidRouter) on labelled
+user turns: accuracy of the turns it routes, fallback rate and per-turn routing latency.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.eval_intent_router                        # Azure OpenAI embeddings from .env
+    python -m benchmarks.eval_intent_router --embeddings lexical   # offline hashed bag-of-words stand-in
+    python -m benchmarks.eval_intent_router --extra-agents 48      # scoring cost with 50 agents
+
+The dataset (benchmarks/data/intent_eval.jsonl) has one {"turn", "agent"} per line;
+"agent" is null for turns that carry no intent ("yes please"), which the router should
+leave to the classifier. Besides the configured thresholds, sweeps over --margins and
+--scores show the accuracy / fallback trade-off, and the best scores of the turns with
+no intent show where the score floor has to sit for the embeddings used. The lexical embedder only exists so
+the harness runs without credentials; tune thresholds with the real deployment.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+import yaml
+
+from intent import INTENT_ROUTER_MIN_MARGIN, INTENT_ROUTER_MIN_SCORE, CentroidRouter
+
+STOPWORDS = {"a", "an", "the", "to", "my", "i", "is", "of", "can", "you", "me", "do", "does", "what", "at", "on",
+             "in", "for", "and", "it", "be", "with", "please", "would", "could", "there", "are", "am", "any"}
+
+
+def lexical_embedder(dim: int = 1024):
+    def embed_one(text: str) -> np.ndarray:
+        words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS]
+        vector = np.zeros(dim, dtype=np.float32)
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            vector[zlib.crc32(token.encode()) % dim] += 1.0
+        return vector
+
+    async def embed(texts: list[str]) -> list[np.ndarray]:
+        return [embed_one(text) for text in texts]
+    return embed
+
+
+def load_agents(base_path: str = "agents/agent_profiles") -> list[dict]:
+    agents = []
+    for profile in sorted(os.listdir(base_path)):
+        if profile.endswith("_profile.yaml"):
+            with open(os.path.join(base_path, profile)) as file:
+                agents.append(yaml.safe_load(file))
+    return agents
+
+
+def add_extra_agents(router: CentroidRouter, count: int, seed: int) -> None:
+    # Random directions are near-orthogonal to real turns: they add scoring work and
+    # only occasionally shift a margin, enough to see how routing scales with agents.
+    rng = np.random.default_rng(seed)
+    extra = router._normalize(rng.standard_normal((count, router.centroids.shape[1])).astype(np.float32))
+    router.centroids = np.vstack([router.centroids, extra])
+    router.agent_names += [f"extra_agent_{i}" for i in range(count)]
+
+
+def summarize(rows: list[dict], min_score: float, min_margin: float) -> dict:
+    routed = [r for r in rows if r["score"] >= min_score and r["margin"] >= min_margin]
+    labelled = [r for r in rows if r["agent"]]
+    routed_labelled = [r for r in routed if r["agent"]]
+    return {
+        "routed_accuracy": sum(r["best"] == r["agent"] for r in routed_labelled) / max(1, len(routed_labelled)),
+        "fallback_rate": 1 - len(routed) / len(rows),
+        "labelled_fallback_rate": 1 - len(routed_labelled) / max(1, len(labelled)),
+        "ambiguous_routed": len(routed) - len(routed_labelled),
+    }
+
+
+async def evaluate(args) -> None:
+    if args.embeddings == "lexical":
+        embed = lexical_embedder()
+    else:
+        from agents.tools.embeddings import aget_embeddings
+        embed = aget_embeddings
+    with open(args.dataset) as file:
+        rows = [json.loads(line) for line in file if line.strip()]
+
+    router = CentroidRouter(load_agents(), embed, args.min_score, args.min_margin)
+    start = time.perf_counter()
+    await router.build()
+    print(f"built {len(router.agent_names)} centroids in {(time.perf_counter() - start) * 1000:.0f} ms")
+    if args.extra_agents:
+        add_extra_agents(router, args.extra_agents, args.seed)
+
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        row["routed"] = await router.route(row["turn"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        # Scores for the threshold sweep; embeddings are cached, so this is not a second remote call.
+        ranked = router.score((await embed([row["turn"]]))[0])
+        row["best"], row["score"] = ranked[0]
+        row["margin"] = ranked[0][1] - ranked[1][1]
+
+    labelled = [r for r in rows if r["agent"]]
+    wrong = [r for r in labelled if r["routed"] and r["routed"] != r["agent"]]
+    summary = summarize(rows, args.min_score, args.min_margin)
+    print(f"{len(rows)} turns ({len(labelled)} labelled), {len(router.agent_names)} agents, "
+          f"min_score {args.min_score}, min_margin {args.min_margin}")
+    print(f"routed accuracy {summary['routed_accuracy']:.1%}, fallback rate {summary['fallback_rate']:.1%} "
+          f"(labelled {summary['labelled_fallback_rate']:.1%}), ambiguous turns routed {summary['ambiguous_routed']}")
+    print(f"routing latency p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms")
+    for row in wrong:
+        print(f"  misrouted to {row['routed']} ({row['score']:.3f}, margin {row['margin']:.3f}): {row['turn']}")
+
+    print(f"\n{'min_margin':>10} {'routed acc':>11} {'fallback':>9} {'labelled fb':>12} {'ambiguous':>10}")
+    for margin in [float(m) for m in args.margins.split(",")]:
+        s = summarize(rows, args.min_score, margin)
+        print(f"{margin:10.3f} {s['routed_accuracy']:11.1%} {s['fallback_rate']:9.1%} "
+              f"{s['labelled_fallback_rate']:12.1%} {s['ambiguous_routed']:>10}")
+
+    print(f"\n{'min_score':>10} {'routed acc':>11} {'fallback':>9} {'labelled fb':>12} {'ambiguous':>10}")
+    for score in [float(m) for m in args.scores.split(",")]:
+        s = summarize(rows, score, args.min_margin)
+        print(f"{score:10.3f} {s['routed_accuracy']:11.1%} {s['fallback_rate']:9.1%} "
+              f"{s['labelled_fallback_rate']:12.1%} {s['ambiguous_routed']:>10}")
+    for name, group in (("labelled", labelled), ("no intent", [r for r in rows if not r["agent"]])):
+        if group:
+            scores = [r["score"] for r in group]
+            print(f"best score of {name} turns: min {min(scores):.3f}, p50 {np.percentile(scores, 50):.3f}, "
+                  f"max {max(scores):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="benchmarks/data/intent_eval.jsonl")
+    parser.add_argument("--embeddings", choices=["azure", "lexical"], default="azure")
+    parser.add_argument("--min-score", type=float, default=INTENT_ROUTER_MIN_SCORE)
+    parser.add_argument("--min-margin", type=float, default=INTENT_ROUTER_MIN_MARGIN)
+    parser.add_argument("--margins", default="0,0.01,0.02,0.03,0.05,0.08,0.1")
+    parser.add_argument("--scores", default="0,0.7,0.75,0.8,0.82,0.85,0.9")
+    parser.add_argument("--extra-agents", type=int, default=0, help="random extra centroids, to time scoring")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(evaluate(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
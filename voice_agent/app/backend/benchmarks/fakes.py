@@ -0,0 +1,486 @@
+"""Local stand-ins for remote services and configuration, used by the benchmarks."""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+from aiohttp import web
+
+
+class FakeEmbeddingsServer:
+    def __init__(self, latency_ms: float, per_input_ms: float, concurrency: int, dim: int):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.per_input_ms = per_input_ms
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.requests = 0
+        self.runner = None
+        self.port = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        inputs = body["input"]
+        async with self.semaphore:
+            self.requests += 1
+            await asyncio.sleep((self.latency_ms + self.per_input_ms * len(inputs)) / 1000)
+        return web.json_response({
+            "object": "list",
+            "model": request.match_info["deployment"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": [float(len(text))] + [0.0] * (self.dim - 1)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        })
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/openai/deployments/{deployment}/embeddings", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        await self.runner.cleanup()
+
+
+class FakeIntentServer:
+    """Stand-in for the intent-shift scoring endpoint: answers every POST with a fixed agent."""
+
+    def __init__(self, latency_ms: float, intent: str = "flight_agent", classify=None):
+        self.latency_ms = latency_ms
+        self.intent = intent
+        self.classify = classify
+        self.requests = 0
+        self.connections: set[int] = set()
+        self.runner = None
+        self.port = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        self.connections.add(id(request.transport))
+        await asyncio.sleep(self.latency_ms / 1000)
+        intent = self.classify(body["input_data"]["data"][0][0]) if self.classify else self.intent
+        return web.json_response([{"0": f" {intent}"}])
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/score", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+
+class FakeRealtimeClient:
+    """Stand-in for AzureRealtimeWebsocket as seen by RTMiddleTier._handle_realtime_event.
+
+    Each response.create starts a reply whose audio begins after first_audio_ms; every
+    audio chunk holds the name of the agent whose kernel was current when the reply was
+    created, so a client can tell which agent it heard. Client events are handled in
+    order, like the service: response.cancel ends the active reply, and a response.create
+    while one is active is rejected (counted in conflicts).
+
+    With transfers=True the model hands off itself: a reply to a user turn meant for
+    another agent is a transfer_conversation call instead of audio, after which the
+    function is invoked from the then-current kernel and a new reply is requested, as
+    the Semantic Kernel client does.
+    """
+
+    def __init__(self, kernels: dict, agent: str, first_audio_ms: float, chunks: int = 10, chunk_ms: float = 20,
+                 update_ms: float = 5, transfers: bool = False, function_call_ms: Optional[float] = None):
+        self.kernels = kernels
+        self.agent_by_kernel = {id(kernel): name for name, kernel in kernels.items()}
+        self.agent = agent
+        self.transfers = transfers
+        self.function_call_ms = first_audio_ms if function_call_ms is None else function_call_ms
+        self.wanted_agent = None
+        self.function_results: list[str] = []
+        self.first_audio_ms = first_audio_ms
+        self.chunks = chunks
+        self.chunk_ms = chunk_ms
+        self.update_ms = update_ms
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.active = None
+        self.responses = 0
+        self.cancelled = 0
+        self.conflicts = 0
+
+    async def send(self, event) -> None:
+        if event.service_type == "response.create":
+            if self.active:
+                self.conflicts += 1
+                return
+            self.responses += 1
+            response_id = f"resp_{self.responses}"
+            self.events.put_nowait(_service_event("response.created", response=SimpleNamespace(id=response_id)))
+            self.active = (response_id, asyncio.get_running_loop().create_task(self._reply(response_id, self.agent)))
+        elif event.service_type == "response.cancel":
+            if not self.active:
+                self.events.put_nowait(_service_event("error", error=SimpleNamespace(code="response_cancel_not_active")))
+                return
+            response_id, task = self.active
+            task.cancel()
+            self.cancelled += 1
+            self._done(response_id, "cancelled")
+
+    async def update_session(self, settings=None, kernel=None, **kwargs) -> None:
+        await asyncio.sleep(self.update_ms / 1000)
+        if kernel is not None:
+            self.agent = self.agent_by_kernel[id(kernel)]
+
+    async def _reply(self, response_id: str, agent: str) -> None:
+        from semantic_kernel.contents import (AudioContent, FunctionCallContent, RealtimeAudioEvent,
+                                              RealtimeFunctionCallEvent)
+        from agents.tools.transfer_plugins import TRANSFER_FUNCTION_NAME, TRANSFER_PLUGIN_NAME
+
+        if self.transfers and self.wanted_agent not in (None, agent):
+            await asyncio.sleep(self.function_call_ms / 1000)
+            self.events.put_nowait(RealtimeFunctionCallEvent(
+                service_type="response.function_call_arguments.done",
+                function_call=FunctionCallContent(
+                    id=f"{response_id}_call", plugin_name=TRANSFER_PLUGIN_NAME, function_name=TRANSFER_FUNCTION_NAME,
+                    arguments=json.dumps({"agent_name": self.wanted_agent})),
+                service_event=SimpleNamespace(response_id=response_id)))
+            self._done(response_id, "completed")
+            self.events.put_nowait(_INVOKE_TRANSFER)
+            return
+        await asyncio.sleep(self.first_audio_ms / 1000)
+        for _ in range(self.chunks):
+            self.events.put_nowait(RealtimeAudioEvent(
+                audio=AudioContent(data=agent.encode()), service_type="response.audio.delta",
+                service_event=SimpleNamespace(response_id=response_id)))
+            await asyncio.sleep(self.chunk_ms / 1000)
+        self.events.put_nowait(_service_event(
+            "response.audio_transcript.done", response_id=response_id, transcript=f"{agent} reply"))
+        self._done(response_id, "completed")
+
+    def _done(self, response_id: str, status: str) -> None:
+        self.active = None
+        self.events.put_nowait(_service_event("response.done", response=SimpleNamespace(
+            id=response_id, status=status, status_details=SimpleNamespace(reason=f"client_{status}"))))
+
+    def user_turn(self, transcript: str, agent: Optional[str] = None) -> None:
+        self.wanted_agent = agent
+        self.events.put_nowait(_service_event(
+            "conversation.item.input_audio_transcription.completed", transcript=transcript))
+
+    async def receive(self):
+        from semantic_kernel.contents import RealtimeEvent
+        from agents.tools.transfer_plugins import TRANSFER_FUNCTION_NAME, TRANSFER_PLUGIN_NAME
+
+        while True:
+            event = await self.events.get()
+            if event is _INVOKE_TRANSFER:
+                # Resumed after the function call event was handled, like the SK generator.
+                kernel = self.kernels[self.agent]
+                result = await kernel.invoke(plugin_name=TRANSFER_PLUGIN_NAME, function_name=TRANSFER_FUNCTION_NAME,
+                                             agent_name=self.wanted_agent)
+                self.function_results.append(str(result))
+                await self.send(RealtimeEvent(service_type="response.create"))
+                continue
+            yield event
+
+
+_INVOKE_TRANSFER = object()
+
+
+class EchoRealtimeWebsocket:
+    """Stand-in for AzureRealtimeWebsocket in RTMiddleTier._forward_messages: echoes audio.
+
+    Used in place of the class itself (RTMiddleTier calls it, then uses the instance as an
+    async context manager with the session's settings). Every input audio event is
+    encoded as the Semantic Kernel client encodes it for the service (base64), and comes
+    back as a response.audio.delta holding that base64 string, as received from the
+    service, so both ends of the relay do the work they do against Azure OpenAI.
+    """
+
+    def __init__(self):
+        self.events: asyncio.Queue = asyncio.Queue()
+
+    def __call__(self, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def send(self, event) -> None:
+        from semantic_kernel.contents import AudioContent, RealtimeAudioEvent
+
+        if isinstance(event, RealtimeAudioEvent):
+            self.events.put_nowait(RealtimeAudioEvent(
+                audio=AudioContent(data=event.audio.data_string, data_format="base64"),
+                service_type="response.audio.delta",
+                service_event=SimpleNamespace(type="response.audio.delta", response_id="resp_echo")))
+
+    async def update_session(self, **kwargs) -> None:
+        pass
+
+    async def receive(self):
+        while True:
+            yield await self.events.get()
+
+
+class SpeakingRealtimeWebsocket:
+    """Stand-in for AzureRealtimeWebsocket in RTMiddleTier._forward_messages: speaks replies.
+
+    Used in place of the class itself. Once connected it streams `responses` replies of
+    response_ms of audio each, in delta_ms audio deltas produced `speed` times faster than
+    real time, with a transcript delta (a word) per 400 ms of audio in between. Each
+    reply ends with response.audio.done, and replies are pause_ms apart. Every delta
+    starts with the time.monotonic() it was produced at (a little-endian double), so a
+    client in another process can tell how long each took to reach it.
+    """
+
+    def __init__(self, responses: int = 3, response_ms: int = 3000, delta_ms: int = 20, speed: float = 4.0,
+                 pause_ms: float = 500):
+        self.responses = responses
+        self.response_ms = response_ms
+        self.delta_ms = delta_ms
+        self.speed = speed
+        self.pause_ms = pause_ms
+
+    def __call__(self, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def send(self, event) -> None:
+        pass
+
+    async def update_session(self, **kwargs) -> None:
+        pass
+
+    async def receive(self):
+        import base64
+        import struct
+
+        from openai.types.beta.realtime import ResponseAudioDoneEvent, ResponseAudioTranscriptDeltaEvent
+        from semantic_kernel.contents import AudioContent, RealtimeAudioEvent, RealtimeEvent
+
+        padding = bytes(self.delta_ms * 48 - 8)
+        ids = {"item_id": "item", "output_index": 0, "content_index": 0}
+        for n in range(self.responses):
+            response_id = f"resp_{n}"
+            start = time.perf_counter()
+            for i in range(self.response_ms // self.delta_ms):
+                await asyncio.sleep(max(0.0, start + i * self.delta_ms / self.speed / 1000 - time.perf_counter()))
+                audio = base64.b64encode(struct.pack("<d", time.monotonic()) + padding).decode()
+                yield RealtimeAudioEvent(
+                    audio=AudioContent(data=audio, data_format="base64"), service_type="response.audio.delta",
+                    service_event=SimpleNamespace(type="response.audio.delta", response_id=response_id))
+                if (i + 1) * self.delta_ms % 400 < self.delta_ms:
+                    yield RealtimeEvent(
+                        service_type="response.audio_transcript.delta",
+                        service_event=ResponseAudioTranscriptDeltaEvent(
+                            type="response.audio_transcript.delta", event_id=f"{response_id}_{i}",
+                            response_id=response_id, delta=" word", **ids))
+            yield RealtimeEvent(
+                service_type="response.audio.done",
+                service_event=ResponseAudioDoneEvent(
+                    type="response.audio.done", event_id=f"{response_id}_done", response_id=response_id, **ids))
+            await asyncio.sleep(self.pause_ms / 1000)
+        await asyncio.Event().wait()
+
+
+class RecordedWebsocket:
+    """Stand-in for the websocket under openai's AsyncRealtimeConnection: replays frames.
+
+    recv returns the given JSON frames in order, then reports the connection closed, so
+    AsyncRealtimeConnection(RecordedWebsocket(frames)) parses them into events exactly as
+    it parses the service's, and the Semantic Kernel client built on it turns those into
+    its own events.
+    """
+
+    def __init__(self, frames: list[str]):
+        self.frames = iter(frames)
+
+    async def recv(self, decode: bool = True):
+        from websockets.exceptions import ConnectionClosedOK
+
+        frame = next(self.frames, None)
+        if frame is None:
+            raise ConnectionClosedOK(None, None)
+        return frame if decode else frame.encode()
+
+    async def send(self, data) -> None:
+        pass
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        pass
+
+
+class FakeRedisServer:
+    """Stand-in for Redis speaking enough RESP for the session store: strings and lists.
+
+    Every read from a connection waits latency_ms first, like a network round trip, so a
+    pipeline of commands costs one wait and separate commands one each.
+    """
+
+    def __init__(self, latency_ms: float = 1.0):
+        self.latency_ms = latency_ms
+        self.data: dict[bytes, object] = {}
+        self.commands = 0
+        self.round_trips = 0
+        self.connections = 0
+        self.port = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        connection = {"resp3": False}
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                self.round_trips += 1
+                await asyncio.sleep(self.latency_ms / 1000)
+                replies = [self._execute(command, connection)]
+                # Everything already buffered arrived with this round trip (a pipeline).
+                while reader._buffer:
+                    replies.append(self._execute(await self._read_command(reader), connection))
+                writer.write(b"".join(replies))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[list[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _execute(self, args: list[bytes], connection: dict) -> bytes:
+        self.commands += 1
+        name, args = args[0].upper().decode(), args[1:]
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name == "HELLO":
+            connection["resp3"] = args[0] == b"3"
+            return b"%%1\r\n$5\r\nproto\r\n:%s\r\n" % args[0]
+        if name in ("AUTH", "CLIENT", "SELECT", "EXPIRE"):
+            return b"+OK\r\n" if name != "EXPIRE" else b":1\r\n"
+        if name == "SET":
+            self.data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if name == "GET":
+            value = self.data.get(args[0])
+            if value is None:
+                return b"_\r\n" if connection["resp3"] else b"$-1\r\n"
+            return self._bulk(value)
+        if name == "DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args)
+        if name == "RPUSH":
+            items = self.data.setdefault(args[0], [])
+            items.extend(args[1:])
+            return b":%d\r\n" % len(items)
+        if name == "LTRIM":
+            items = self.data.get(args[0], [])
+            start, stop = int(args[1]), int(args[2])
+            stop = len(items) + stop if stop < 0 else stop
+            start = max(0, len(items) + start if start < 0 else start)
+            self.data[args[0]] = items[start:stop + 1]
+            return b"+OK\r\n"
+        if name == "LRANGE":
+            items = self.data.get(args[0], [])
+            start, stop = int(args[1]), int(args[2])
+            stop = len(items) + stop if stop < 0 else stop
+            start = max(0, len(items) + start if start < 0 else start)
+            selected = items[start:stop + 1]
+            return b"*%d\r\n" % len(selected) + b"".join(self._bulk(item) for item in selected)
+        if name == "LLEN":
+            return b":%d\r\n" % len(self.data.get(args[0], []))
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    @staticmethod
+    def _bulk(value: bytes) -> bytes:
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def start(self) -> None:
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+
+
+def _service_event(service_type: str, **fields):
+    from semantic_kernel.contents import RealtimeEvent
+
+    return RealtimeEvent(service_type=service_type, service_event=SimpleNamespace(type=service_type, **fields))
+
+
+class FakeClientSocket:
+    """Stand-in for the client websocket: records (time, message) for everything sent to it.
+
+    Text frames are recorded decoded, binary frames as bytes.
+    """
+
+    def __init__(self):
+        self.sent: list[tuple[float, dict]] = []
+
+    async def send_json(self, data: dict, dumps=None) -> None:
+        self.sent.append((time.perf_counter(), data))
+
+    async def send_str(self, data: str) -> None:
+        self.sent.append((time.perf_counter(), json.loads(data)))
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.sent.append((time.perf_counter(), data))
+
+
+def serve_in_thread(server):
+    """Start a fake server on its own event loop thread, so blocking clients can't stall it."""
+    started = threading.Event()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait()
+    return server
+
+
+def import_tool_plugins(workdir: str, flight_db: str, hotel_db: str):
+    """Import the flight and hotel plugin modules against the given databases.
+
+    The plugins read their configuration at import time, so this points them at a tiny
+    knowledge base in workdir and at placeholder Azure OpenAI settings first.
+    """
+    import numpy as np
+    from agents.tools.knowledge_base import save_store
+
+    kb_path = os.path.join(workdir, "kb")
+    if not os.path.exists(kb_path):
+        save_store(kb_path, ["0"], ["policy"], np.ones((1, 8), dtype=np.float32))
+    os.environ.update({
+        "FLIGHT_POLICY_PATH": kb_path,
+        "HOTEL_POLICY_PATH": kb_path,
+        "SQLITE_DB_PATH": flight_db,
+        "HOTEL_SQLITE_DB_PATH": hotel_db,
+    })
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1")
+    from agents.tools import flight_plugins, hotel_plugins
+    return flight_plugins, hotel_plugins
@@ -0,0 +1,119 @@
+"""
+Fill flight and hotel databases with synthetic customers, flights and reservations
+at production volumes.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.generate_tool_data --customers 1000000 --flight-db /tmp/flight_db.db --hotel-db /tmp/hotel.db
+
+Uses the plugin models, so the generated files have the same schema (and indexes)
+as the ones the tools create. Customer ids are "c<n>", tickets "t<n>" and reservation
+ids are sequential; roughly a third of flights and reservations are still active.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import import_tool_plugins
+
+AIRPORTS = [f"A{n:02d}" for n in range(60)]
+FLIGHT_NUMS = [f"{airline}{n}" for airline in ("AA", "AB", "UA", "DL") for n in range(100, 600)]
+HOTELS = [f"H{n}" for n in range(100, 400)]
+ROOM_TYPES = ["Standard", "Deluxe", "Suite"]
+CHUNK_ROWS = 50_000
+
+
+def flight_rows(rng: random.Random, customers: int, per_customer: int):
+    start = datetime(2024, 1, 1)
+    ticket = 0
+    for customer in range(customers):
+        for _ in range(per_customer):
+            departure = start + timedelta(minutes=rng.randrange(0, 2 * 365 * 24 * 60, 5))
+            ticket += 1
+            yield {
+                "customer_id": f"c{customer}",
+                "ticket_num": f"t{ticket:010d}",
+                "flight_num": rng.choice(FLIGHT_NUMS),
+                "airline": "Airline A",
+                "seat_num": f"{rng.randint(1, 40)}{rng.choice('ABCDEF')}",
+                "departure_airport": rng.choice(AIRPORTS),
+                "arrival_airport": rng.choice(AIRPORTS),
+                "departure_time": departure,
+                "arrival_time": departure + timedelta(hours=rng.randint(1, 12)),
+                "ticket_class": rng.choice(["Economy", "Economy", "Business"]),
+                "gate": f"G{rng.randint(1, 40)}",
+                "status": "open" if rng.random() < 0.35 else "cancelled",
+            }
+
+
+def reservation_rows(rng: random.Random, customers: int, per_customer: int):
+    start = datetime(2024, 1, 1)
+    for customer in range(customers):
+        for _ in range(per_customer):
+            check_in = start + timedelta(days=rng.randrange(0, 2 * 365))
+            yield {
+                "customer_id": f"c{customer}",
+                "hotel_id": rng.choice(HOTELS),
+                "room_type": rng.choice(ROOM_TYPES),
+                "check_in_date": check_in,
+                "check_out_date": check_in + timedelta(days=rng.randint(1, 14)),
+                "status": "booked" if rng.random() < 0.35 else "cancelled",
+            }
+
+
+def customer_rows(customers: int):
+    for customer in range(customers):
+        yield {"id": f"c{customer}", "name": f"Customer {customer}"}
+
+
+def insert(engine, table, rows) -> int:
+    count = 0
+    chunk = []
+    with engine.begin() as connection:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == CHUNK_ROWS:
+                connection.execute(table.insert(), chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            connection.execute(table.insert(), chunk)
+            count += len(chunk)
+    return count
+
+
+def generate(flight_plugins, hotel_plugins, customers: int, flights_per_customer: int,
+             reservations_per_customer: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    for name, engine, table, rows in [
+        ("flight customers", flight_plugins.engine, flight_plugins.Customer.__table__, customer_rows(customers)),
+        ("flights", flight_plugins.engine, flight_plugins.Flight.__table__,
+         flight_rows(rng, customers, flights_per_customer)),
+        ("hotel customers", hotel_plugins.engine, hotel_plugins.Customer.__table__, customer_rows(customers)),
+        ("reservations", hotel_plugins.engine, hotel_plugins.Reservation.__table__,
+         reservation_rows(rng, customers, reservations_per_customer)),
+    ]:
+        start = time.perf_counter()
+        count = insert(engine, table, rows)
+        print(f"{name:<17} {count:>10} rows in {time.perf_counter() - start:6.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--flights-per-customer", type=int, default=3)
+    parser.add_argument("--reservations-per-customer", type=int, default=2)
+    parser.add_argument("--flight-db", required=True, help="created if missing; rows are appended")
+    parser.add_argument("--hotel-db", required=True, help="created if missing; rows are appended")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    flight_plugins, hotel_plugins = import_tool_plugins(tempfile.mkdtemp(), args.flight_db, args.hotel_db)
+    generate(flight_plugins, hotel_plugins, args.customers, args.flights_per_customer,
+             args.reservations_per_customer, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Soak test of RTMiddleTier's session memory: 100k simulated calls on one worker with the
+previous plain dict of sessions (and unbounded in-memory history store) against
+session_state.SessionTable (and the bounded store).
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.soak_session_table --sessions 100000 --calls-per-second 10
+
+Every call connects with a new session_state_key, creates its session as the websocket
+handler does, exchanges --turns user/assistant messages and disconnects. Time is
+simulated: calls arrive --calls-per-second apart on the table's clock, and the reaper
+runs every SESSION_REAP_INTERVAL_SECONDS of simulated time. Every --report calls the
+worker's resident memory, the live session count and the table's own size estimate are
+printed; with the table they should level off once idle sessions start being evicted.
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.fakes import import_tool_plugins
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+class UnboundedStore(dict):
+    # The previous in-memory session store: a dict that only grows.
+    def set(self, key, value):
+        self[key] = value
+
+
+async def soak(tier, args, bounded: bool) -> None:
+    from semantic_kernel.contents import ChatHistoryTruncationReducer
+
+    from agents.tools.cache import TTLLRUCache
+    from session_state import (SESSION_REAP_INTERVAL_SECONDS, SESSION_STORE_MAX_SESSIONS, SESSION_STORE_TTL_SECONDS,
+                               AsyncSessionState, SessionTable)
+
+    now = [0.0]
+    clock = lambda: now[0]
+    store = AsyncSessionState(history_window=tier.max_history_length)
+    if bounded:
+        store.session_store = TTLLRUCache(SESSION_STORE_MAX_SESSIONS, SESSION_STORE_TTL_SECONDS, clock=clock)
+        sessions = SessionTable(store, clock=clock)
+    else:
+        store.session_store = UnboundedStore()
+        sessions = {}
+    tier.session_state = store
+    next_reap = SESSION_REAP_INTERVAL_SECONDS
+    start = time.perf_counter()
+
+    for n in range(1, args.sessions + 1):
+        key = f"call-{n}"
+        history = await store.get(key) or ChatHistoryTruncationReducer(target_count=tier.max_history_length)
+        session = tier._new_session(history, "Soak", str(n))
+        sessions[key] = session
+        if bounded:
+            sessions.connect(key)
+        for turn in range(args.turns):
+            for role, text in (("user", f"I would like to change my booking number {n}, turn {turn}."),
+                               ("assistant", f"Sure, I have found booking {n}. Which date would you prefer?")):
+                if role == "user":
+                    history.add_user_message(text)
+                else:
+                    history.add_assistant_message(text)
+                session.intent_window.append(f"{role}: {text}")
+                store.append(key, role, text)
+                await history.reduce()
+        if bounded:
+            sessions.disconnect(key)
+        now[0] += 1 / args.calls_per_second
+        if bounded and now[0] >= next_reap:
+            await sessions.reap()
+            next_reap += SESSION_REAP_INTERVAL_SECONDS
+        if n % args.report == 0:
+            gc.collect()
+            table_mb = sessions.stats()["bytes"] / 2**20 if bounded else float("nan")
+            print(f"{'table' if bounded else 'dict':<6} {n:>8} {now[0] / 3600:8.2f} {len(sessions):>9} "
+                  f"{len(store.session_store):>8} {table_mb:9.1f} {rss_mb():8.1f} {time.perf_counter() - start:7.1f}")
+    if bounded:
+        print(f"table: {sessions.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=3, help="user/assistant message pairs per call")
+    parser.add_argument("--calls-per-second", type=float, default=10.0)
+    parser.add_argument("--report", type=int, default=10_000)
+    parser.add_argument("--mode", choices=["dict", "table", "both"], default="both")
+    args = parser.parse_args()
+
+    os.environ.update({"INTENT_ROUTER_ENABLED": "false", "TELEMETRY_SCENARIO": "none"})
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+    workdir = tempfile.mkdtemp()
+    try:
+        import_tool_plugins(workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+        from azure.core.credentials import AzureKeyCredential
+        from rtmt import RTMiddleTier
+        logging.getLogger().setLevel(logging.WARNING)
+        tier = RTMiddleTier("http://127.0.0.1", "fake", AzureKeyCredential("fake"))
+
+        print(f"{'mode':<6} {'calls':>8} {'hours':>8} {'sessions':>9} {'stored':>8} {'table MB':>9} "
+              f"{'rss MB':>8} {'secs':>7}")
+        # Each mode in its own process would be cleaner for RSS; run the bounded one first
+        # so the unbounded one's growth cannot be hidden by memory freed before it.
+        modes = {"dict": [False], "table": [True], "both": [True, False]}[args.mode]
+        for bounded in modes:
+            asyncio.run(soak(tier, args, bounded))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
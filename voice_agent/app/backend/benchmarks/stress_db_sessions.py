@@ -0,0 +1,154 @@
+"""
+Concurrency stress test for the flight and hotel tool databases: hundreds of
+simultaneous lookups and bookings through the kernel functions, each on its own
+pooled session.
+
+Run from voice_agent/app/backend:
+    python -m benchmarks.stress_db_sessions --callers 400 --bookings 0.25
+
+Works on copies of data/flight_db.db and data/hotel.db seeded with one open ticket
+and one booked reservation per caller. Afterwards it checks that every successful
+booking cancelled exactly its own ticket/reservation, in the database and in what the
+(cached) lookup tools return, and reports latency, errors, connection pool metrics
+and lookup cache stats.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.fakes import import_tool_plugins
+
+
+def seed(flight_plugins, hotel_plugins, callers: int) -> None:
+    with flight_plugins.database.session() as session:
+        for n in range(callers):
+            session.add(flight_plugins.Flight(
+                customer_id=f"stress{n}", ticket_num=f"s{n:06d}", flight_num=f"ST{n % 50}", airline="Airline A",
+                seat_num="1A", departure_airport="SEA", arrival_airport="SFO",
+                departure_time=datetime(2030, 1, 1, 8), arrival_time=datetime(2030, 1, 1, 10),
+                ticket_class="Economy", gate="G1", status="open",
+            ))
+        session.commit()
+    with hotel_plugins.database.session() as session:
+        for n in range(callers):
+            session.add(hotel_plugins.Reservation(
+                id=900_000_000 + n, customer_id=f"stress{n}", hotel_id="H100", room_type="Standard",
+                check_in_date=datetime(2030, 1, 1), check_out_date=datetime(2030, 1, 3), status="booked",
+            ))
+        session.commit()
+
+
+async def caller(n: int, flights, hotels, booking_ratio: float, latencies: dict, failures: list) -> None:
+    user_id = f"stress{n}"
+    calls = [
+        ("load_user_flight_info", lambda: flights.load_user_flight_info(user_id)),
+        ("check_flight_status", lambda: flights.check_flight_status(f"ST{n % 50}", "SEA")),
+        ("load_user_reservation_info", lambda: hotels.load_user_reservation_info(user_id)),
+        ("check_reservation_status", lambda: hotels.check_reservation_status(str(900_000_000 + n))),
+    ]
+    if random.random() < booking_ratio:
+        calls += [
+            ("confirm_flight_change", lambda: flights.confirm_flight_change(
+                f"s{n:06d}", "AA479", "2030-01-01 07:00", "2030-01-01 09:00")),
+            ("confirm_reservation_change", lambda: hotels.confirm_reservation_change(
+                str(900_000_000 + n), "Suite", "2030-01-02", "2030-01-04")),
+        ]
+    random.shuffle(calls)
+    for name, call in calls:
+        start = time.perf_counter()
+        try:
+            result = await call()
+            if name.startswith("confirm") and ("error" in result or "Could not find" in result):
+                failures.append((name, result))
+        except Exception as e:
+            failures.append((name, repr(e)))
+        latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+
+
+def check_consistency(flight_plugins, hotel_plugins, callers: int) -> list[str]:
+    problems = []
+    with flight_plugins.database.session() as session:
+        for n in range(callers):
+            flights = session.query(flight_plugins.Flight).filter_by(customer_id=f"stress{n}").all()
+            if sum(flight.status == "open" for flight in flights) != 1:
+                problems.append(f"stress{n} has {len(flights)} flights, not exactly one open")
+    with hotel_plugins.database.session() as session:
+        for n in range(callers):
+            reservations = session.query(hotel_plugins.Reservation).filter_by(customer_id=f"stress{n}").all()
+            if sum(reservation.status == "booked" for reservation in reservations) != 1:
+                problems.append(f"stress{n} has {len(reservations)} reservations, not exactly one booked")
+    return problems
+
+
+async def check_cached_lookups(flights, hotels, callers: int) -> list[str]:
+    problems = []
+    for n in range(callers):
+        flight_info = json.loads(await flights.load_user_flight_info(f"stress{n}"))
+        if len(flight_info) != 1 or flight_info[0]["status"] != "open":
+            problems.append(f"load_user_flight_info(stress{n}) returned {flight_info}")
+        reservation_info = json.loads(await hotels.load_user_reservation_info(f"stress{n}"))
+        if len(reservation_info) != 1 or reservation_info[0]["status"] != "booked":
+            problems.append(f"load_user_reservation_info(stress{n}) returned {reservation_info}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=400, help="simultaneous conversations")
+    parser.add_argument("--bookings", type=float, default=0.25, help="share of callers that also change bookings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp()
+    shutil.copy("data/flight_db.db", os.path.join(workdir, "flight_db.db"))
+    shutil.copy("data/hotel.db", os.path.join(workdir, "hotel.db"))
+    flight_plugins, hotel_plugins = import_tool_plugins(
+        workdir, os.path.join(workdir, "flight_db.db"), os.path.join(workdir, "hotel.db"))
+
+    try:
+        seed(flight_plugins, hotel_plugins, args.callers)
+        latencies: dict[str, list[float]] = {}
+        failures: list = []
+        flights, hotels = flight_plugins.Flight_Tools(), hotel_plugins.Hotel_Tools()
+
+        async def run():
+            await asyncio.gather(*(caller(n, flights, hotels, args.bookings, latencies, failures)
+                                   for n in range(args.callers)))
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+        problems = check_consistency(flight_plugins, hotel_plugins, args.callers)
+        problems += asyncio.run(check_cached_lookups(flights, hotels, args.callers))
+
+        total = sum(len(samples) for samples in latencies.values())
+        print(f"{args.callers} callers, {total} tool calls in {elapsed:.2f}s ({total / elapsed:.0f} calls/s)")
+        print(f"{'tool':<28} {'calls':>6} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, samples in sorted(latencies.items()):
+            print(f"{name:<28} {len(samples):>6} {np.percentile(samples, 50):8.1f} {np.percentile(samples, 99):8.1f}")
+        for name, module in (("flight pool", flight_plugins), ("hotel pool", hotel_plugins)):
+            print(f"{name}: {module.database.pool_stats()}")
+            print(f"{name.split()[0]} lookup cache: {module.lookup_cache.stats()}")
+        print(f"failures: {len(failures)}")
+        for name, error in failures[:10]:
+            print(f"  {name}: {error}")
+        print(f"consistency problems: {len(problems)}")
+        for problem in problems[:10]:
+            print(f"  {problem}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
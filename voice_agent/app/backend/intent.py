@@ -0,0 +1,610 @@
+"""
+Async client for the custom intent-shift classification endpoint (INTENT_SHIFT_API_URL).
+
+detect_intent runs on every user turn of every session, on the same event loop that
+relays their audio, so the endpoint is called with aiohttp: one keep-alive connection
+pool per worker, a per-request timeout and a cap on requests in flight. Latencies are
+kept in a small histogram (stats()) and recorded to the OpenTelemetry histogram
+"intent.shift.latency".
+
+CentroidRouter is the in-process fast path in front of detect_intent: the latest user
+turn is embedded and scored against one centroid per agent, built from the profile's
+domain_description and routing_examples. Only turns it cannot route confidently (top
+score below INTENT_ROUTER_MIN_SCORE, or within INTENT_ROUTER_MIN_MARGIN of the
+runner-up) go to the remote classifier. It is off unless INTENT_ROUTER_ENABLED is set:
+it adds an embeddings round trip to every classified turn, and its thresholds have to be
+checked against the embeddings deployment with benchmarks/eval_intent_router.py first.
+
+HedgedIntentClassifier is the policy over the remote classifiers (the AML endpoint and
+gpt-4o-mini). Each turn has a latency budget (INTENT_BUDGET_MS). The preferred backend
+is asked first; if it has not answered by its recent p95 latency, or fails, the next one
+is asked as well and the first valid answer wins. A circuit breaker per backend stops
+calling one that keeps failing or timing out, and probes it again after
+INTENT_BREAKER_RESET_SECONDS. When the budget runs out, or no backend is available, the
+answer is None and the session stays on its current agent.
+
+IntentGate sits in front of both: turns that cannot change the domain (acknowledgements
+such as "yes" or "thank you", or fewer than INTENT_GATE_MIN_CHARS word characters) are not
+classified at all, and classifier answers are memoized by a hash of the classifier input
+window, so a window seen before (after a reconnect, or the same short exchange in another
+session) is not sent again.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import re
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+import numpy as np
+from dotenv import load_dotenv
+from opentelemetry import metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+INTENT_SHIFT_TIMEOUT_SECONDS = float(os.getenv("INTENT_SHIFT_TIMEOUT_SECONDS", 3))
+INTENT_SHIFT_MAX_CONNECTIONS = int(os.getenv("INTENT_SHIFT_MAX_CONNECTIONS", 32))
+INTENT_SHIFT_MAX_CONCURRENCY = int(os.getenv("INTENT_SHIFT_MAX_CONCURRENCY", 64))
+INTENT_SHIFT_KEEPALIVE_SECONDS = float(os.getenv("INTENT_SHIFT_KEEPALIVE_SECONDS", 60))
+INTENT_BUDGET_MS = float(os.getenv("INTENT_BUDGET_MS", 1500))
+# Hedge delay until a backend has INTENT_HEDGE_MIN_SAMPLES latencies to take its percentile from.
+INTENT_HEDGE_DELAY_MS = float(os.getenv("INTENT_HEDGE_DELAY_MS", 400))
+INTENT_HEDGE_PERCENTILE = float(os.getenv("INTENT_HEDGE_PERCENTILE", 95))
+INTENT_HEDGE_MIN_SAMPLES = int(os.getenv("INTENT_HEDGE_MIN_SAMPLES", 20))
+INTENT_BREAKER_FAILURES = int(os.getenv("INTENT_BREAKER_FAILURES", 5))
+INTENT_BREAKER_RESET_SECONDS = float(os.getenv("INTENT_BREAKER_RESET_SECONDS", 30))
+INTENT_GATE_ENABLED = os.getenv("INTENT_GATE_ENABLED", "true").lower() == "true"
+INTENT_GATE_MIN_CHARS = int(os.getenv("INTENT_GATE_MIN_CHARS", 4))
+INTENT_MEMO_SIZE = int(os.getenv("INTENT_MEMO_SIZE", 4096))
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "false").lower() == "true"
+# Cosine similarity thresholds, not yet validated on labelled turns. text-embedding-ada-002
+# scores even unrelated texts around 0.7, so the score floor sits above that and the
+# margin does most of the work; check both with benchmarks/eval_intent_router.py.
+INTENT_ROUTER_MIN_SCORE = float(os.getenv("INTENT_ROUTER_MIN_SCORE", 0.80))
+INTENT_ROUTER_MIN_MARGIN = float(os.getenv("INTENT_ROUTER_MIN_MARGIN", 0.03))
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = (25, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 2000, 5000)
+
+meter = metrics.get_meter(__name__)
+latency_histogram = meter.create_histogram(
+    "intent.shift.latency", unit="ms", description="Latency of intent-shift endpoint calls")
+classifier_latency_histogram = meter.create_histogram(
+    "intent.classifier.latency", unit="ms", description="Latency of intent classifier backends, by backend")
+classifier_outcomes = meter.create_counter(
+    "intent.classifier.outcomes", description="Intent classifier calls by backend and outcome")
+classifier_turns = meter.create_counter(
+    "intent.classifier.turns", description="Classified turns by outcome (answered, budget_exhausted, unavailable)")
+gate_decisions = meter.create_counter(
+    "intent.gate.turns", description="User turns by intent gate outcome (skipped, memo_hit, classified)")
+gate_saved_latency = meter.create_counter(
+    "intent.gate.saved_latency", unit="ms",
+    description="Estimated classifier latency saved by skipped and memoized turns")
+router_decisions = meter.create_counter(
+    "intent.router.decisions", description="Turns routed by the centroid router, by outcome")
+router_latency_histogram = meter.create_histogram(
+    "intent.router.latency", unit="ms", description="Latency of centroid router decisions")
+
+
+def agent_domain(agent: dict) -> str:
+    """The profile's domain_description, without the block scalar's quotes and whitespace."""
+    return (agent.get("domain_description") or "").strip().strip('"')
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles."""
+
+    def __init__(self, buckets_ms: tuple = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def record(self, latency_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets_ms, latency_ms)] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile (inf for the open bucket)."""
+        if not self.total:
+            return None
+        rank = q / 100 * self.total
+        seen = 0
+        for bound, count in zip(self.buckets_ms + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def stats(self) -> dict:
+        return {
+            "count": self.total,
+            "mean_ms": self.sum_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip([f"<={b}" for b in self.buckets_ms] + [f">{self.buckets_ms[-1]}"], self.counts)),
+        }
+
+
+class IntentShiftClient:
+    """Calls the intent-shift scoring endpoint without blocking the event loop.
+
+    The aiohttp session (and its connection pool) is created on first use and bound to
+    that event loop; close() releases it. Certificates are not verified unless
+    PYTHONHTTPSVERIFY is set, as with the urllib client this replaces.
+    """
+
+    def __init__(self, url: str, api_key: Optional[str], deployment: Optional[str],
+                 timeout_seconds: float = INTENT_SHIFT_TIMEOUT_SECONDS,
+                 max_connections: int = INTENT_SHIFT_MAX_CONNECTIONS,
+                 max_concurrency: int = INTENT_SHIFT_MAX_CONCURRENCY,
+                 keepalive_seconds: float = INTENT_SHIFT_KEEPALIVE_SECONDS):
+        self.url = url
+        self.api_key = api_key
+        self.deployment = deployment
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.keepalive_seconds = keepalive_seconds
+        self.verify_ssl = bool(os.environ.get("PYTHONHTTPSVERIFY", ""))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.timeouts = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_seconds,
+                ssl=None if self.verify_ssl else False,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def classify(self, conversation: str) -> Optional[str]:
+        """The predicted agent name, or None if the endpoint failed or timed out."""
+        if not self.api_key:
+            raise Exception("A key should be provided to invoke the endpoint")
+        # Format the data according to the ServiceInput schema
+        data = {
+            "input_data": {
+                "columns": ["input_string"],
+                "index": [0],
+                "data": [[f"{conversation}"]]
+            },
+            "params": {}
+        }
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.api_key}',
+            'azureml-model-deployment': self.deployment
+        }
+        session = self._get_session()
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                async with session.post(self.url, data=json.dumps(data), headers=headers) as response:
+                    if response.status != 200:
+                        self.errors += 1
+                        logger.warning("Intent shift request failed with status code %s: %s",
+                                       response.status, await response.text())
+                        return None
+                    result = await response.json(content_type=None)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                logger.warning("Intent shift request timed out after %.1fs", self.timeout.total)
+                return None
+            except aiohttp.ClientError as e:
+                self.errors += 1
+                logger.warning("Intent shift request failed: %s", e)
+                return None
+            finally:
+                latency_ms = (time.perf_counter() - start) * 1000
+                self.latency.record(latency_ms)
+                latency_histogram.record(latency_ms)
+        return result[0]['0'].strip()
+
+    def stats(self) -> dict:
+        return {**self.latency.stats(), "errors": self.errors, "timeouts": self.timeouts}
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class CentroidRouter:
+    """Routes a user turn to the agent whose centroid embedding it is closest to.
+
+    embed is an async function from a list of texts to their embeddings (normally
+    agents.tools.embeddings.aget_embeddings). Centroids are built on the first route()
+    call; all agents are scored with one matrix-vector product, so the cost per turn is
+    one (usually cached) embedding regardless of the number of agents. If the centroids
+    cannot be built, the router stays out of the way and every turn falls back.
+    """
+
+    def __init__(self, agents: list[dict], embed: Callable[[list[str]], Awaitable[list[np.ndarray]]],
+                 min_score: float = INTENT_ROUTER_MIN_SCORE, min_margin: float = INTENT_ROUTER_MIN_MARGIN):
+        self.agents = agents
+        self.embed = embed
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.agent_names: list[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self._build_lock = asyncio.Lock()
+        self._build_failed = False
+        self.latency = LatencyHistogram()
+        self.routed = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    async def build(self) -> None:
+        names, texts, owners = [], [], []
+        for agent in self.agents:
+            examples = [agent_domain(agent)]
+            examples += agent.get("routing_examples") or []
+            examples = [example for example in examples if example]
+            if not examples:
+                continue
+            names.append(agent["name"])
+            texts += examples
+            owners += [len(names) - 1] * len(examples)
+        vectors = self._normalize(np.asarray(await self.embed(texts), dtype=np.float32))
+        owners = np.asarray(owners)
+        centroids = np.stack([vectors[owners == i].mean(axis=0) for i in range(len(names))])
+        self.agent_names, self.centroids = names, self._normalize(centroids)
+        logger.info("Intent router built centroids for %d agents from %d examples", len(names), len(texts))
+
+    async def _ensure_built(self) -> bool:
+        if self.centroids is None and not self._build_failed:
+            async with self._build_lock:
+                if self.centroids is None and not self._build_failed:
+                    try:
+                        await self.build()
+                    except Exception as e:
+                        self._build_failed = True
+                        logger.warning("Intent router disabled, could not build agent centroids: %s", e)
+        return self.centroids is not None
+
+    def score(self, vector: np.ndarray) -> list[tuple[str, float]]:
+        """Agents and their cosine similarity to vector, best first."""
+        scores = self.centroids @ self._normalize(np.asarray(vector, dtype=np.float32))
+        order = np.argsort(-scores)
+        return [(self.agent_names[i], float(scores[i])) for i in order]
+
+    async def route(self, turn: str) -> Optional[str]:
+        """The agent for this turn, or None if the remote classifier should decide."""
+        if not turn.strip() or not await self._ensure_built():
+            return None
+        start = time.perf_counter()
+        try:
+            vector = (await self.embed([turn]))[0]
+        except Exception as e:
+            logger.warning("Intent router could not embed the turn: %s", e)
+            return None
+        ranked = self.score(vector)
+        best, best_score = ranked[0]
+        margin = best_score - ranked[1][1] if len(ranked) > 1 else best_score
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.latency.record(latency_ms)
+        router_latency_histogram.record(latency_ms)
+        if best_score < self.min_score or margin < self.min_margin:
+            self.fallbacks += 1
+            router_decisions.add(1, {"outcome": "fallback"})
+            logger.debug("Intent router fell back (best %s %.3f, margin %.3f)", best, best_score, margin)
+            return None
+        self.routed += 1
+        router_decisions.add(1, {"outcome": "routed"})
+        return best
+
+    def stats(self) -> dict:
+        decided = self.routed + self.fallbacks
+        return {
+            **self.latency.stats(),
+            "routed": self.routed,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": self.fallbacks / decided if decided else 0.0,
+        }
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_seconds lets one probe through."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = INTENT_BREAKER_FAILURES,
+                 reset_seconds: float = INTENT_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            return True
+        return self.state == self.CLOSED
+
+    def release_probe(self) -> None:
+        """Give back a probe whose call ended without an outcome, to be taken by the next one."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ClassifierBackend:
+    """A remote intent classifier with its breaker and latency record.
+
+    classify(conversation, agents) returns the predicted agent name; None or an
+    exception counts as a failure.
+    """
+
+    def __init__(self, name: str, classify: Callable[[str, Optional[list[dict]]], Awaitable[Optional[str]]],
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.classify = classify
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self.recent_ms: deque = deque(maxlen=256)
+        self.calls = 0
+        self.wins = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    def hedge_delay_ms(self) -> float:
+        if len(self.recent_ms) < INTENT_HEDGE_MIN_SAMPLES:
+            return INTENT_HEDGE_DELAY_MS
+        return float(np.percentile(self.recent_ms, INTENT_HEDGE_PERCENTILE))
+
+    async def call(self, conversation: str, agents: Optional[list[dict]]) -> Optional[str]:
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            intent = await self.classify(conversation, agents)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Intent classifier %s failed: %s", self.name, e)
+            intent = None
+        latency_ms = (time.perf_counter() - start) * 1000
+        if intent is None:
+            self.failures += 1
+            self.breaker.record_failure()
+            classifier_outcomes.add(1, {"backend": self.name, "outcome": "failure"})
+            return None
+        self.breaker.record_success()
+        self.latency.record(latency_ms)
+        self.recent_ms.append(latency_ms)
+        classifier_latency_histogram.record(latency_ms, {"backend": self.name})
+        return intent
+
+    def stats(self) -> dict:
+        return {
+            **self.latency.stats(),
+            "calls": self.calls,
+            "wins": self.wins,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "hedge_delay_ms": self.hedge_delay_ms(),
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+        }
+
+
+class HedgedIntentClassifier:
+    """Classifies a turn within a latency budget across backends in order of preference."""
+
+    def __init__(self, backends: list[ClassifierBackend], budget_ms: float = INTENT_BUDGET_MS):
+        self.backends = backends
+        self.budget_ms = budget_ms
+        self.turns = 0
+        self.hedged = 0
+        self.budget_exhausted = 0
+        self.unavailable = 0
+        self.latency = LatencyHistogram()
+
+    async def classify(self, conversation: str, agents: Optional[list[dict]] = None) -> Optional[str]:
+        """The predicted agent name, or None to stay on the current agent."""
+        self.turns += 1
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        # Breakers are asked only as their backend is about to start: allow() takes the
+        # half-open probe, which the call's outcome must settle.
+        waiting = list(self.backends)
+        # Each running call with the time it became slower than its backend's hedge delay.
+        running: dict[asyncio.Task, tuple[ClassifierBackend, float]] = {}
+        hedge_at = start
+        intent = None
+        cancelled = False
+        try:
+            while True:
+                if waiting and (not running or time.perf_counter() >= hedge_at):
+                    backend = waiting.pop(0)
+                    if not backend.breaker.allow():
+                        continue
+                    if running:
+                        self.hedged += 1
+                    hedge_at = time.perf_counter() + backend.hedge_delay_ms() / 1000
+                    running[asyncio.create_task(backend.call(conversation, agents))] = (backend, hedge_at)
+                if not running or time.perf_counter() >= deadline:
+                    return None
+                wake = min(hedge_at, deadline) if waiting else deadline
+                done, _ = await asyncio.wait(running, timeout=max(wake - time.perf_counter(), 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend, _ = running.pop(task)
+                    if task.result() is not None:
+                        intent = task.result()
+                        backend.wins += 1
+                        classifier_outcomes.add(1, {"backend": backend.name, "outcome": "win"})
+                        return intent
+                    # A failed backend hands over to the next one straight away.
+                    hedge_at = time.perf_counter()
+        except asyncio.CancelledError:
+            # The caller gave up on the turn (the call ended, or the user spoke again): that
+            # says nothing about the backends or the budget, so it counts as neither.
+            for task, (backend, _) in running.items():
+                task.cancel()
+                backend.breaker.release_probe()
+            running.clear()
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                now = time.perf_counter()
+                for task, (backend, slow_at) in running.items():
+                    task.cancel()
+                    # Still running past the budget, or beaten by a hedge after going past its own
+                    # p95: either way slow enough to count against its breaker, so that a backend
+                    # that has started hanging stops being called first.
+                    if intent is None or now >= slow_at:
+                        backend.timeouts += 1
+                        backend.breaker.record_failure()
+                        classifier_outcomes.add(1, {"backend": backend.name, "outcome": "timeout"})
+                    else:
+                        backend.breaker.release_probe()
+                self.latency.record((time.perf_counter() - start) * 1000)
+                if intent is not None:
+                    outcome = "answered"
+                elif running or time.perf_counter() >= deadline:
+                    outcome = "budget_exhausted"
+                    self.budget_exhausted += 1
+                    logger.warning("Intent classification ran out of its %.0f ms budget; staying on the current agent",
+                                   self.budget_ms)
+                else:
+                    outcome = "unavailable"
+                    self.unavailable += 1
+                    logger.warning("No intent classifier answered; staying on the current agent")
+                classifier_turns.add(1, {"outcome": outcome})
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "hedged": self.hedged,
+            "budget_exhausted": self.budget_exhausted,
+            "unavailable": self.unavailable,
+            "latency": self.latency.stats(),
+            "backends": {backend.name: backend.stats() for backend in self.backends},
+        }
+
+
+# Acknowledgements and backchannels, of one word or a few: a turn made of nothing else
+# cannot move the conversation to another agent. Only whole phrases count, so that the
+# words of "got it" or "thank you" still carry a question such as "Is it all for me?".
+ACKNOWLEDGEMENTS = frozenset(phrase.strip() for phrase in """
+    yes, yeah, yep, yup, sure, ok, okay, alright, all right, right, correct, exactly, absolutely,
+    definitely, thanks, thank you, thanks a lot, thanks so much, thank you so much,
+    thank you very much, many thanks, cheers, great, perfect, fine, cool, nice, awesome,
+    wonderful, got it, sounds good, that works, thats right, thats great, no problem, go ahead,
+    one moment, one sec, let me think, please, yes please, no thanks, no thank you, thats all,
+    no thats all, that works for me, mhm, uh huh, uh, um, hmm, oh, ah, hello, hi, hey, bye, goodbye
+""".split(","))
+
+
+class IntentGate:
+    """Skips classification of turns that cannot change the domain and memoizes classifier answers."""
+
+    def __init__(self, min_chars: int = INTENT_GATE_MIN_CHARS, memo_size: int = INTENT_MEMO_SIZE,
+                 acknowledgements: frozenset = ACKNOWLEDGEMENTS):
+        self.min_chars = min_chars
+        self.memo_size = memo_size
+        self.acknowledgements = acknowledgements
+        self.acknowledgement_words = max(len(phrase.split()) for phrase in acknowledgements)
+        self.memo: OrderedDict[bytes, str] = OrderedDict()
+        self.skipped = 0
+        self.memo_hits = 0
+        self.classified = 0
+        self.saved_ms = 0.0
+        self.classifier_ms = 0.0
+
+    def should_classify(self, turn: str) -> bool:
+        """False for turns too short, or only made of acknowledgements, to carry an intent."""
+        # \w is Unicode-aware: a turn in any script is made of words too.
+        words = re.findall(r"\w+", turn.lower().replace("'", "").replace("\u2019", ""))
+        if sum(len(word) for word in words) >= self.min_chars and not self._acknowledges(words):
+            return True
+        self.skipped += 1
+        self._saved("skipped")
+        return False
+
+    def _acknowledges(self, words: list[str]) -> bool:
+        """Whether words are wholly made of acknowledgements, longest phrase first."""
+        i = 0
+        while i < len(words):
+            for n in range(min(self.acknowledgement_words, len(words) - i), 0, -1):
+                if " ".join(words[i:i + n]) in self.acknowledgements:
+                    i += n
+                    break
+            else:
+                return False
+        return True
+
+    async def classify(self, window: str,
+                       classify: Callable[[str], Awaitable[Optional[str]]]) -> Optional[str]:
+        """classify(window), or its previous answer for the same window."""
+        key = hashlib.blake2b(window.encode("utf-8"), digest_size=16).digest()
+        intent = self.memo.get(key)
+        if intent is not None:
+            self.memo.move_to_end(key)
+            self.memo_hits += 1
+            self._saved("memo_hit")
+            return intent
+        start = time.perf_counter()
+        intent = await classify(window)
+        self.classifier_ms += (time.perf_counter() - start) * 1000
+        self.classified += 1
+        gate_decisions.add(1, {"outcome": "classified"})
+        # No answer means the budget ran out or no classifier was available: worth retrying.
+        if intent is not None:
+            self.memo[key] = intent
+            if len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+        return intent
+
+    def _saved(self, outcome: str) -> None:
+        # The mean classifier latency so far stands in for the call that was not made.
+        saved_ms = self.classifier_ms / self.classified if self.classified else 0.0
+        self.saved_ms += saved_ms
+        gate_decisions.add(1, {"outcome": outcome})
+        gate_saved_latency.add(saved_ms)
+
+    def stats(self) -> dict:
+        turns = self.skipped + self.memo_hits + self.classified
+        return {
+            "turns": turns,
+            "skipped": self.skipped,
+            "memo_hits": self.memo_hits,
+            "classified": self.classified,
+            "skip_rate": (self.skipped + self.memo_hits) / turns if turns else 0.0,
+            "saved_ms": self.saved_ms,
+            "memo_size": len(self.memo),
+        }
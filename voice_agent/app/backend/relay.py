@@ -0,0 +1,284 @@
+"""
+Outbound audio of RTMiddleTier's relay to clients.
+
+The realtime service streams a reply as many response.audio.delta events, each often a
+few tens of milliseconds of audio, and relaying every one as its own websocket message
+costs a JSON encode (with the JSON protocol), a frame and a write per delta. An
+AudioCoalescer, one per connected session, merges consecutive deltas of a reply into
+one message, sent:
+
+- once it holds AUDIO_COALESCE_MS of audio (at most AUDIO_COALESCE_MAX_BYTES),
+- at the latest AUDIO_COALESCE_MAX_DELAY_MS after the first delta it holds arrived,
+  which bounds the latency it adds to any delta,
+- right away when a delta of another response arrives, and before RTMiddleTier relays
+  any other event, so audio never reaches the client after an event that followed it.
+
+A reply streamed faster than real time fills messages to the target; a slow one is
+sent as it trickles in, no later than the delay. AUDIO_COALESCE_MS=0 relays every
+delta as it arrives.
+
+Each direction of a session's relay also goes through a bounded RelayQueue drained by a
+task of its own, so a slow client or a slow realtime service only holds up its own
+direction, and the relay keeps reading from the other side. Audio is what piles up
+behind a slow peer, and late audio is worth less than none:
+
+- Inbound (client to service), a full queue drops its oldest microphone audio, and
+  audio that waited longer than RELAY_INBOUND_MAX_AUDIO_AGE_MS is dropped rather than
+  sent. A client's input_audio_buffer.clear drops the audio still queued.
+- Outbound (service to client, ClientQueue), a full queue drops its oldest reply audio,
+  and the audio still queued when the user barges in (speech_started) or a speculative
+  reply is cancelled is dropped: the client stops playing that reply anyway.
+  RELAY_OUTBOUND_MAX_AUDIO_AGE_MS, off by default, also drops audio that waited too long.
+
+Control messages are never dropped. Queue depth, time in queue and drops are exported
+as relay.queue.* metrics by direction, and each session's are logged when its client
+disconnects (RelayQueue.stats()).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from opentelemetry import metrics
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+AUDIO_COALESCE_MS = float(os.getenv("AUDIO_COALESCE_MS", 100))
+AUDIO_COALESCE_MAX_DELAY_MS = float(os.getenv("AUDIO_COALESCE_MAX_DELAY_MS", 40))
+AUDIO_COALESCE_MAX_BYTES = int(os.getenv("AUDIO_COALESCE_MAX_BYTES", 65536))
+RELAY_INBOUND_MAX_ITEMS = int(os.getenv("RELAY_INBOUND_MAX_ITEMS", 100))
+RELAY_INBOUND_MAX_AUDIO_AGE_MS = float(os.getenv("RELAY_INBOUND_MAX_AUDIO_AGE_MS", 2000))
+RELAY_OUTBOUND_MAX_ITEMS = int(os.getenv("RELAY_OUTBOUND_MAX_ITEMS", 256))
+RELAY_OUTBOUND_MAX_AUDIO_AGE_MS = float(os.getenv("RELAY_OUTBOUND_MAX_AUDIO_AGE_MS", 0))
+# PCM16 at 24 kHz, mono: the realtime API's audio format.
+AUDIO_BYTES_PER_MS = 48
+
+meter = metrics.get_meter(__name__)
+# One record per message sent, so its count is the message rate; deltas and messages per
+# session are in AudioCoalescer.stats(), logged when the client disconnects.
+audio_delay_histogram = meter.create_histogram(
+    "relay.audio.coalesce_delay", unit="ms",
+    description="How long the first delta of each coalesced audio message was held before it was sent")
+# By direction only: a session attribute would make a series per call.
+queue_depth_counter = meter.create_up_down_counter(
+    "relay.queue.depth", description="Messages waiting in the relay queues")
+queue_wait_histogram = meter.create_histogram(
+    "relay.queue.wait", unit="ms", description="How long each message relayed waited in its queue")
+queue_dropped_counter = meter.create_counter(
+    "relay.queue.dropped", description="Audio messages dropped from the relay queues, by reason")
+
+
+class AudioCoalescer:
+    """Merges one session's outbound audio deltas into fewer, larger messages."""
+
+    def __init__(self, send: Callable[[bytes], Awaitable[None]], target_ms: float = AUDIO_COALESCE_MS,
+                 max_delay_ms: float = AUDIO_COALESCE_MAX_DELAY_MS, max_bytes: int = AUDIO_COALESCE_MAX_BYTES):
+        self.send = send
+        self.target_bytes = max(1, min(max_bytes, int(target_ms * AUDIO_BYTES_PER_MS)))
+        self.max_delay = max_delay_ms / 1000
+        self.chunks: list[bytes] = []
+        self.size = 0
+        self.response_id = None
+        self.first_at = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.flushes: set[asyncio.Task] = set()
+        self.deltas = 0
+        self.messages = 0
+        self.max_held_ms = 0.0
+
+    async def add(self, audio: bytes, response_id=None) -> None:
+        """Hold a delta, sending what is held first if it belongs to another response."""
+        if self.chunks and response_id != self.response_id:
+            await self.flush()
+        self.chunks.append(audio)
+        self.size += len(audio)
+        self.deltas += 1
+        if len(self.chunks) == 1:
+            self.response_id = response_id
+            self.first_at = time.perf_counter()
+        if self.size >= self.target_bytes:
+            await self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_delay, self._on_timer)
+
+    async def flush(self) -> None:
+        """Send the held audio, if any, as one message."""
+        if not self.chunks:
+            return
+        # Taken and passed to send before anything is awaited, so messages keep their order
+        # even when a timer flush and the relay's own flush interleave.
+        audio = self.chunks[0] if len(self.chunks) == 1 else b"".join(self.chunks)
+        held_ms = (time.perf_counter() - self.first_at) * 1000
+        self._reset()
+        self.messages += 1
+        self.max_held_ms = max(self.max_held_ms, held_ms)
+        audio_delay_histogram.record(held_ms)
+        await self.send(audio)
+
+    def clear(self) -> None:
+        """Drop the held audio, of a reply the client is told to stop playing."""
+        self._reset()
+
+    def close(self) -> None:
+        self._reset()
+        for task in list(self.flushes):
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "deltas": self.deltas,
+            "messages": self.messages,
+            "max_held_ms": round(self.max_held_ms, 1),
+        }
+
+    def _reset(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.chunks = []
+        self.size = 0
+
+    def _on_timer(self) -> None:
+        self.timer = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self.flushes.add(task)
+        task.add_done_callback(self._flushed)
+
+    def _flushed(self, task: asyncio.Task) -> None:
+        self.flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # The client went away; the relay notices on its own side.
+            logger.warning("Failed to send coalesced audio: %s", task.exception())
+
+
+class RelayQueue:
+    """One direction of a session's relay: a bounded queue of messages sent in order by run().
+
+    put never waits. When the queue holds max_items, the oldest audio in it is dropped to
+    make room (overflow); control messages are always queued. run drops audio that waited
+    longer than max_audio_age_ms, if set (stale), and discard_audio drops all the audio
+    queued (superseded).
+    """
+
+    def __init__(self, direction: str, send: Callable[[Any], Awaitable[None]], max_items: int,
+                 max_audio_age_ms: float = 0):
+        self.direction = direction
+        self.send = send
+        self.max_items = max(1, max_items)
+        self.max_audio_age = max_audio_age_ms / 1000
+        # (message, is audio, time queued)
+        self.items: deque[tuple[Any, bool, float]] = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.attributes = {"direction": direction}
+        self.sent = 0
+        self.dropped = {"overflow": 0, "stale": 0, "superseded": 0}
+        self.max_depth = 0
+        self.max_wait_ms = 0.0
+
+    def put(self, message, audio: bool = False) -> None:
+        if self.closed:
+            return
+        if len(self.items) >= self.max_items:
+            self._drop_oldest_audio()
+        self.items.append((message, audio, time.perf_counter()))
+        queue_depth_counter.add(1, self.attributes)
+        self.max_depth = max(self.max_depth, len(self.items))
+        self.ready.set()
+
+    def discard_audio(self) -> int:
+        """Drop the audio queued, of a reply or an utterance that no longer matters."""
+        kept = deque(item for item in self.items if not item[1])
+        dropped = len(self.items) - len(kept)
+        if dropped:
+            self.items = kept
+            queue_depth_counter.add(-dropped, self.attributes)
+            self._count_drop("superseded", dropped)
+        return dropped
+
+    async def run(self) -> None:
+        """Send what is queued until closed, or until sending fails."""
+        while not self.closed:
+            if not self.items:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            message, audio, queued_at = self.items.popleft()
+            queue_depth_counter.add(-1, self.attributes)
+            wait = time.perf_counter() - queued_at
+            if audio and self.max_audio_age and wait > self.max_audio_age:
+                self._count_drop("stale")
+                continue
+            self.max_wait_ms = max(self.max_wait_ms, wait * 1000)
+            queue_wait_histogram.record(wait * 1000, self.attributes)
+            try:
+                await self.send(message)
+            except Exception as e:
+                # The peer went away; the relay notices on its own side.
+                logger.warning("Failed to relay %s message: %s", self.direction, e)
+                self.close()
+                return
+            self.sent += 1
+
+    def close(self) -> None:
+        """Stop run and drop what is still queued."""
+        self.closed = True
+        if self.items:
+            queue_depth_counter.add(-len(self.items), self.attributes)
+            self.items.clear()
+        self.ready.set()
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "dropped": dict(self.dropped),
+            "max_depth": self.max_depth,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
+
+    def _drop_oldest_audio(self) -> None:
+        for i, item in enumerate(self.items):
+            if item[1]:
+                del self.items[i]
+                queue_depth_counter.add(-1, self.attributes)
+                self._count_drop("overflow")
+                return
+
+    def _count_drop(self, reason: str, count: int = 1) -> None:
+        self.dropped[reason] += count
+        queue_dropped_counter.add(count, {**self.attributes, "reason": reason})
+
+
+class ClientQueue(RelayQueue):
+    """The outbound direction, in place of the client websocket: its send methods queue the frame.
+
+    Binary frames and response.audio.delta messages are audio; the JSON is encoded when
+    queued, by the relay rather than by the task sending to a slow client.
+    """
+
+    def __init__(self, ws, max_items: int = RELAY_OUTBOUND_MAX_ITEMS,
+                 max_audio_age_ms: float = RELAY_OUTBOUND_MAX_AUDIO_AGE_MS):
+        super().__init__("outbound", self._send_frame, max_items, max_audio_age_ms)
+        self.ws = ws
+
+    async def send_json(self, data: dict, dumps: Callable[[Any], str] = json_codec.dumps) -> None:
+        self.put(dumps(data), data.get("type") == "response.audio.delta")
+
+    async def send_str(self, data: str) -> None:
+        self.put(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.put(data, audio=True)
+
+    async def _send_frame(self, frame) -> None:
+        if isinstance(frame, bytes):
+            await self.ws.send_bytes(frame)
+        else:
+            await self.ws.send_str(frame)
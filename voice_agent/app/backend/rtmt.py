@@ -6,15 +6,26 @@ This version demonstrates how to use an external/distributed session state
 Make sure to install semantic-kernel[realtime] along with your other dependencies.
 """
 
-import os, asyncio, json, yaml, logging, base64
+import os, asyncio, yaml, logging, base64, time
+from collections import deque
 from enum import Enum
 from typing import Any, Callable, Optional, Dict
 from aiohttp import web
 from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 from azure.core.credentials import AzureKeyCredential
-from utility import detect_intent, SessionState, set_up_logging, set_up_tracing, set_up_metrics
-from agents.tools.hotel_plugins import Hotel_Tools
-from agents.tools.flight_plugins import Flight_Tools
+from utility import detect_intent, intent_classifier, intent_shift_client, set_up_logging, set_up_tracing, set_up_metrics
+import json_codec
+from session import AgentTemplate, Session
+from relay import (AudioCoalescer, ClientQueue, RelayQueue, AUDIO_COALESCE_MAX_DELAY_MS, AUDIO_COALESCE_MS,
+                   RELAY_INBOUND_MAX_AUDIO_AGE_MS, RELAY_INBOUND_MAX_ITEMS, RELAY_OUTBOUND_MAX_AUDIO_AGE_MS,
+                   RELAY_OUTBOUND_MAX_ITEMS)
+from session_state import AsyncSessionState, SessionTable
+from intent import CentroidRouter, IntentGate, INTENT_GATE_ENABLED, INTENT_ROUTER_ENABLED
+from agents.tools.embeddings import aget_embeddings
+from agents.tools.hotel_plugins import Hotel_Tools, database as hotel_database
+from agents.tools.flight_plugins import Flight_Tools, database as flight_database
+from agents.tools.transfer_plugins import (TRANSFER_FUNCTION_NAME, TRANSFER_PLUGIN_NAME, create_transfer_plugin,
+                                           transferred_to)
 from semantic_kernel.connectors.ai import FunctionChoiceBehavior
 
 
@@ -33,12 +44,13 @@ from semantic_kernel.contents import (
     RealtimeTextEvent,
     RealtimeAudioEvent,
     RealtimeEvent,
+    RealtimeFunctionCallEvent,
     TextContent,
 )
 
 # Environment variables for easy configuration & deployment of telemetry
 # Defaults to "console" if not set
-# Options: "console", "application_insights", "aspire_dashboard"
+# Options: "console", "application_insights", "aspire_dashboard", "none"
 # Can be set as a comma-separated list to enable multiple scenarios
 TELEMETRY_SCENARIOS = os.getenv("TELEMETRY_SCENARIO", "console").split(",")
 APP_INSIGHTS_CONNECTION_STRING = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
@@ -58,6 +70,7 @@ from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader, ConsoleMetricExporter
 from opentelemetry.sdk.metrics.view import View
 from opentelemetry.metrics import set_meter_provider
+from opentelemetry import metrics
 try:
     from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
     from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
@@ -109,6 +122,8 @@ for scenario in TELEMETRY_SCENARIOS:
             metric_readers.append(PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=ASPIRE_DASHBOARD_ENDPOINT), export_interval_millis=5000))
         else:
             raise ImportError("opentelemetry-exporter-otlp-proto-grpc is not installed. Please install it.")
+    elif scenario == "none":
+        pass
     else:
         raise ValueError(f"Invalid telemetry scenario: {scenario}")
 
@@ -138,6 +153,36 @@ logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+first_audio_histogram = metrics.get_meter(__name__).create_histogram(
+    "rtmt.turn.first_audio", unit="ms",
+    description="Time from a user's transcribed turn to the first audio of the reply")
+
+# Marks a reply that was requested, but not yet created, when it was cancelled.
+NEXT_RESPONSE = object()
+
+# Clients connecting with ?protocol=binary exchange audio as raw PCM16 (24 kHz, mono,
+# little-endian) in binary websocket frames: a binary frame from the client is an
+# input_audio_buffer.append, one to the client a response.audio.delta. Control events
+# stay JSON text frames. Without it, audio is base64 in JSON, as before.
+JSON_PROTOCOL = "json"
+BINARY_PROTOCOL = "binary"
+
+# Service events relayed to clients as they came, besides the audio and the events
+# RTMiddleTier handles itself: a comma-separated list, or * for all of them. Other events
+# are dropped before they are serialized. Clients can ask for their own with
+# ?events=type,type; the default is what the web and ACS clients use.
+REALTIME_CLIENT_EVENTS = os.getenv("REALTIME_CLIENT_EVENTS", "input_audio_buffer.speech_started,error")
+
+
+def parse_client_events(value: str) -> Optional[frozenset[str]]:
+    """The event types in a comma-separated list, or None (all of them) for "*"."""
+    if value.strip() == "*":
+        return None
+    return frozenset(name.strip() for name in value.split(",") if name.strip())
+
+
+CLIENT_EVENTS = parse_client_events(REALTIME_CLIENT_EVENTS)
+
 # --------------------------- RTMiddleTier Class ---------------------------
 class RTMiddleTier:
     model: Optional[str] = None
@@ -148,10 +193,24 @@ class RTMiddleTier:
     disable_audio: Optional[bool] = False
     max_history_length = 3
     _token_provider = None
-    use_classification_model: bool = True
-
-    # Distributed session state object. This uses Redis if available, otherwise in-memory.
-    session_state = SessionState()
+    # True: a classifier picks the agent for every user turn (detect_intent). False: agents
+    # hand off themselves by calling transfer_conversation, with no per-turn classification.
+    use_classification_model: bool = os.environ.get("USE_CLASSIFICATION_MODEL", "true").lower() == "true"
+    # Start each reply on the current agent while intent detection runs, rather than after it.
+    speculative_response: bool = os.environ.get("SPECULATIVE_RESPONSE", "false").lower() == "true"
+    # Merge consecutive audio deltas to a client into messages of up to this much audio,
+    # holding none for longer than the delay (relay.AudioCoalescer); 0 sends every delta.
+    audio_coalesce_ms: float = AUDIO_COALESCE_MS
+    audio_coalesce_max_delay_ms: float = AUDIO_COALESCE_MAX_DELAY_MS
+    # Bounds of each session's relay queues (relay.RelayQueue), one per direction.
+    relay_inbound_max_items: int = RELAY_INBOUND_MAX_ITEMS
+    relay_inbound_max_audio_age_ms: float = RELAY_INBOUND_MAX_AUDIO_AGE_MS
+    relay_outbound_max_items: int = RELAY_OUTBOUND_MAX_ITEMS
+    relay_outbound_max_audio_age_ms: float = RELAY_OUTBOUND_MAX_AUDIO_AGE_MS
+
+    # Distributed session state object. This uses Redis if available (pooled, with write-behind saves),
+    # otherwise in-memory.
+    session_state = AsyncSessionState(history_window=max_history_length)
 
     # Global Semantic Kernel objects keyed by agent name (shared among sessions)
     kernels: dict[str, Kernel] = {}
@@ -178,9 +237,9 @@ class RTMiddleTier:
             )
             self._token_provider()  # Warm up token
 
-        # A dictionary to hold all session-specific state.
+        # A table holding all session-specific state, evicting sessions left idle.
         # Keys: session_state_key; Values: dict holding current_agent, current_agent_kernel, history, etc.
-        self.sessions: dict[str, dict] = {}
+        self.sessions = SessionTable(self.session_state)
 
     def _load_agents(self):
         base_path = "agents/agent_profiles"
@@ -211,67 +270,39 @@ class RTMiddleTier:
                     logger.error("Error loading %s: %s", profile, exc)
         self.agent_names = [agent["name"] for agent in self.agents]
         logger.info("Available agents: %s", self.agent_names)
+        self._register_transfer_plugins()
         # Save the default agent and its kernel for new sessions.
         self.default_agent = next(
             agent for agent in self.agents if agent.get("default_agent"))
         self.default_agent_kernel = self.kernels.get(
             self.default_agent.get("name"))
+        # One immutable template per agent, referenced by every session it handles.
+        settings = self._realtime_settings()
+        self.agent_templates = {
+            agent["name"]: AgentTemplate(agent, self.kernels[agent["name"]], settings) for agent in self.agents
+        }
+        # Local fast path for intent detection; turns it is unsure about go to detect_intent.
+        self.intent_router = CentroidRouter(self.agents, aget_embeddings) if INTENT_ROUTER_ENABLED else None
+        # Skips turns that cannot change the domain and memoizes classifier answers, shared by all sessions.
+        self.intent_gate = IntentGate() if INTENT_GATE_ENABLED else None
+
+    def _register_transfer_plugins(self):
+        # Without a classifier, every agent can hand the conversation off to any of the
+        # others; with one, the classifier alone routes turns and agents get no such tool.
+        for agent_name, kernel in self.kernels.items():
+            if self.use_classification_model:
+                kernel.plugins.pop(TRANSFER_PLUGIN_NAME, None)
+            else:
+                kernel.add_plugin(create_transfer_plugin(self.agents, agent_name))
 
-    def _format_instructions(self, agent: dict, session: dict) -> str:
-        # Helper method to format the agent's persona template with session-specific customer details.
-        template = agent.get("persona", "")
-        return template.format(
-            customer_name=session.get("customer_name", "John Doe"),
-            customer_id=session.get("customer_id", "12345")
-        )
-
-    # ----------------- Session-specific helper methods -----------------
-    async def _detect_intent_change(self, session: dict):
-        # Use the session’s own conversation history and current agent.
-        extracted_history = [
-            f"{item.role.value}: {item.items[0].text}" for item in session["history"]
-        ]
-        logger.info("Current agent: %s", session["current_agent"].get("name"))
-        conversation = "\n".join(extracted_history)
-        intent = await detect_intent(conversation)
-        logger.info("Detected intent: %s", intent)
-        if intent in self.agent_names and intent != session["current_agent"].get("name"):
-            session["target_agent_name"] = intent
-            logger.info("Switching to new agent: %s",
-                        session["target_agent_name"])
-            session["transfer_conversation"] = True
-
-    async def _reinitialize_session(self, realtime_client: AzureRealtimeWebsocket, session: dict):
-        await realtime_client.send(RealtimeEvent(service_type="input_audio_buffer.clear"))
-        # Update instructions dynamically when switching agents:
-        session["current_agent"] = next(
-            (agent for agent in self.agents if agent.get(
-                "name") == session["target_agent_name"]), None
-        )
-        session["current_agent_kernel"] = self.kernels.get(
-            session["current_agent"].get("name"))
-        # Format the new agent's persona with session-specific customer details.
-        formatted_instructions = self._format_instructions(
-            session["current_agent"], session)
-        if session.get("realtime_settings"):
-            session["realtime_settings"].instructions = formatted_instructions
-        await realtime_client.update_session(
-            settings=session["realtime_settings"],
-            kernel=session["current_agent_kernel"]
-        )
-        session["transfer_conversation"] = False
-        session["target_agent_name"] = None
+    def _new_session(self, history: ChatHistoryTruncationReducer, customer_name: str, customer_id: str) -> Session:
+        return Session(self.agent_templates[self.default_agent["name"]], history, self._intent_window(history),
+                       customer_name, customer_id)
 
-    # -------------- Main realtime message forwarding (per session) --------------
-    async def _forward_messages(self, session_state_key: str, session: dict, ws: web.WebSocketResponse):
-        logger.info("Starting Semantic Kernel based realtime session")
-
-        # Build the realtime session settings using the session’s current agent
-        # and a formatted version of its persona (with the customer name and id).
-        formatted_instructions = self._format_instructions(
-            session["current_agent"], session)
-        session["realtime_settings"] = AzureRealtimeExecutionSettings(
-            instructions=formatted_instructions,
+    def _realtime_settings(self) -> AzureRealtimeExecutionSettings:
+        # The realtime session settings shared by every agent; each connection gets a copy
+        # with the current agent's persona formatted for its customer as instructions.
+        return AzureRealtimeExecutionSettings(
             turn_detection=TurnDetection(
                 type=os.environ.get("TURN_DETECTION_MODEL", "server_vad"),
                 threshold=float(os.environ.get(
@@ -293,19 +324,173 @@ class RTMiddleTier:
             function_choice_behavior=FunctionChoiceBehavior.Auto(),
         )
 
+    # ----------------- Session-specific helper methods -----------------
+    def _intent_window(self, history: ChatHistoryTruncationReducer) -> deque:
+        # The classifier input: the formatted turns the truncated history holds, plus the
+        # newest turn, which is classified before the history is reduced. New turns are
+        # appended as they are added to the history instead of reformatting all of it.
+        return deque((f"{item.role.value}: {item.items[0].text}" for item in history),
+                     maxlen=self.max_history_length + 1)
+
+    async def _detect_intent_change(self, session: Session):
+        # Use the session’s own conversation history and current agent.
+        logger.info("Current agent: %s", session.current_agent.get("name"))
+        turn = session.history.messages[-1].items[0].text
+        if self.intent_gate and not self.intent_gate.should_classify(turn):
+            logger.info("Skipping intent detection for turn: %s", turn)
+            return
+        intent = None
+        if self.intent_router:
+            intent = await self.intent_router.route(turn)
+        if intent is None:
+            conversation = "\n".join(session.intent_window)
+            if self.intent_gate:
+                intent = await self.intent_gate.classify(
+                    conversation, lambda window: detect_intent(window, self.agents))
+            else:
+                intent = await detect_intent(conversation, self.agents)
+        logger.info("Detected intent: %s", intent)
+        if intent in self.agent_names and intent != session.current_agent.get("name"):
+            session.target_agent_name = intent
+            logger.info("Switching to new agent: %s",
+                        session.target_agent_name)
+            session.transfer_conversation = True
+
+    async def _reinitialize_session(self, realtime_client: AzureRealtimeWebsocket, session: Session):
+        await realtime_client.send(RealtimeEvent(service_type="input_audio_buffer.clear"))
+        # Update instructions dynamically when switching agents:
+        session.agent = self.agent_templates[session.target_agent_name]
+        # The new agent's persona, formatted with session-specific customer details.
+        await realtime_client.update_session(
+            settings=session.agent.settings_for(session),
+            kernel=session.current_agent_kernel
+        )
+        session.transfer_conversation = False
+        session.target_agent_name = None
+
+    async def _request_response(self, realtime_client: AzureRealtimeWebsocket, session: Session):
+        session.response_requested = True
+        await realtime_client.send(RealtimeEvent(service_type="response.create"))
+
+    async def _on_user_turn(self, realtime_client: AzureRealtimeWebsocket, session: Session, ws: web.WebSocketResponse):
+        session.turn_started_at = time.perf_counter()
+        session.first_audio_at = None
+        session.agent_switched = False
+        if not self.use_classification_model:
+            # The current agent answers, or hands off through transfer_conversation.
+            if session.active_response == False:
+                await self._request_response(realtime_client, session)
+            return
+        if self.speculative_response:
+            # Answer as the current agent right away; intent detection runs alongside and
+            # only delays the turns where it switches agents.
+            if session.active_response == False:
+                await self._request_response(realtime_client, session)
+            task = asyncio.create_task(self._speculative_intent_change(realtime_client, session, ws))
+            session.intent_tasks.add(task)
+            task.add_done_callback(session.intent_tasks.discard)
+            return
+        await self._detect_intent_change(session)
+        if session.target_agent_name is not None:
+            session.agent_switched = True
+            await self._reinitialize_session(realtime_client, session)
+
+        # Generate response once intent is detected or agent swap (if any) is complete.
+        if session.active_response == False:
+            await self._request_response(realtime_client, session)
+
+    async def _speculative_intent_change(self, realtime_client: AzureRealtimeWebsocket, session: Session,
+                                         ws: web.WebSocketResponse):
+        try:
+            await self._detect_intent_change(session)
+            if session.target_agent_name is None:
+                return
+            # The reply under way is the previous agent's. Cancel it (its remaining events are
+            # dropped as stale) and have the client stop playing what it already received:
+            # both the web and the ACS client stop playback on speech_started.
+            if session.active_response:
+                session.stale_response_id = session.response_id
+                await realtime_client.send(RealtimeEvent(service_type="response.cancel"))
+            elif session.response_requested:
+                session.stale_response_id = NEXT_RESPONSE
+                await realtime_client.send(RealtimeEvent(service_type="response.cancel"))
+            if session.audio_out is not None:
+                session.audio_out.clear()
+            if session.outbound is not None:
+                session.outbound.discard_audio()
+            await ws.send_json({"type": "input_audio_buffer.speech_started"}, dumps=json_codec.dumps)
+            session.first_audio_at = None
+            session.agent_switched = True
+            await self._reinitialize_session(realtime_client, session)
+            # The service handles client events in order, so this follows the cancellation.
+            await self._request_response(realtime_client, session)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Speculative intent detection failed")
+
+    @staticmethod
+    def _is_transfer(event: RealtimeEvent) -> bool:
+        return (isinstance(event, RealtimeFunctionCallEvent)
+                and event.function_call.plugin_name == TRANSFER_PLUGIN_NAME
+                and event.function_call.function_name == TRANSFER_FUNCTION_NAME)
+
+    async def _transfer(self, realtime_client: AzureRealtimeWebsocket, session: Session, function_call):
+        # The function is invoked once this returns, from the kernel current by then: switch
+        # agents first so its result goes back to, and the next reply comes from, the new one.
+        agent_name = (function_call.parse_arguments() or {}).get("agent_name")
+        logger.info("Agent %s requested transfer to %s", session.current_agent.get("name"), agent_name)
+        # Read by the function, which runs in this task, to tell a handoff from a no-op.
+        transferred_to.set(None)
+        if agent_name not in self.agent_names or agent_name == session.current_agent.get("name"):
+            return
+        transferred_to.set(agent_name)
+        session.target_agent_name = agent_name
+        session.transfer_conversation = True
+        session.agent_switched = True
+        await self._reinitialize_session(realtime_client, session)
+
+    def _record_first_audio(self, session: Session):
+        if session.turn_started_at is None or session.first_audio_at is None:
+            return
+        latency_ms = (session.first_audio_at - session.turn_started_at) * 1000
+        session.turn_started_at = None
+        first_audio_histogram.record(latency_ms, {
+            "mode": ("speculative" if self.speculative_response else "serial") if self.use_classification_model else "tool",
+            "agent_switch": session.agent_switched,
+        })
+        logger.info("First audio of the reply %.0f ms after the user turn", latency_ms)
+
+    # -------------- Main realtime message forwarding (per session) --------------
+    async def _forward_messages(self, session_state_key: str, session: Session, ws: web.WebSocketResponse,
+                                binary_audio: bool = False, client_events: Optional[frozenset[str]] = CLIENT_EVENTS):
+        logger.info("Starting Semantic Kernel based realtime session (%s audio)",
+                    BINARY_PROTOCOL if binary_audio else JSON_PROTOCOL)
+
         realtime_client = AzureRealtimeWebsocket()
 
+        # The shared realtime settings with the current agent's persona, formatted with
+        # the customer name and id, as instructions.
         async with realtime_client(
-            settings=session["realtime_settings"],
-            kernel=session["current_agent_kernel"],
-            chat_history=session["history"]
+            settings=session.agent.settings_for(session),
+            kernel=session.current_agent_kernel,
+            chat_history=session.history
         ):
+            # Each direction is sent by its own task from a bounded queue, so a slow peer
+            # holds up only that direction. The handlers below send to the client through
+            # its queue as they would to the websocket.
+            inbound = RelayQueue("inbound", realtime_client.send, self.relay_inbound_max_items,
+                                 self.relay_inbound_max_audio_age_ms)
+            client = ClientQueue(ws, self.relay_outbound_max_items, self.relay_outbound_max_audio_age_ms)
+            # Replaces the queue of an earlier connection of the session still closing.
+            session.outbound = client
+            senders = [asyncio.create_task(inbound.run()), asyncio.create_task(client.run())]
 
             async def from_client_to_realtime():
                 async for msg in ws:
                     if msg.type == web.WSMsgType.TEXT:
                         try:
-                            message = json.loads(msg.data)
+                            message = json_codec.loads(msg.data)
                         except Exception as e:
                             logger.error("Error parsing client message: %s", e)
                             continue
@@ -317,101 +502,189 @@ class RTMiddleTier:
                         elif msg_type == SendEvents.INPUT_AUDIO_BUFFER_APPEND:
                             audio_data = message.get("audio")
                             if audio_data:
-                                await realtime_client.send(
-                                    event=RealtimeAudioEvent(
+                                inbound.put(
+                                    RealtimeAudioEvent(
                                         audio=AudioContent(
                                             data=audio_data, data_format="base64"),
-                                    )
+                                    ),
+                                    audio=True,
                                 )
 
-                        # Forward clear-buffer commands.
+                        # Forward clear-buffer commands, in place of the audio not yet sent.
                         elif msg_type == SendEvents.INPUT_AUDIO_BUFFER_CLEAR:
                             clear_event = RealtimeEvent(
                                 service_type=SendEvents.INPUT_AUDIO_BUFFER_CLEAR.value,
                             )
-                            await realtime_client.send(clear_event)
+                            inbound.discard_audio()
+                            inbound.put(clear_event)
                         else:
                             logger.warning(
                                 "Unhandled client message type: %s", msg_type)
+                    elif msg.type == web.WSMsgType.BINARY and binary_audio:
+                        # Raw PCM16: no JSON parsing or base64 decoding on the way in. The
+                        # format is what the client encodes it to for the service.
+                        if msg.data:
+                            inbound.put(
+                                RealtimeAudioEvent(
+                                    audio=AudioContent(data=msg.data, data_format="base64"),
+                                ),
+                                audio=True,
+                            )
                     else:
                         logger.error(
                             "Unexpected message type from client: %s", msg.type)
 
+            audio_out = None
+            if self.audio_coalesce_ms > 0:
+                audio_out = AudioCoalescer(lambda audio: self._send_audio(client, audio, binary_audio),
+                                           self.audio_coalesce_ms, self.audio_coalesce_max_delay_ms)
+            # Replaces the coalescer of an earlier connection of the session still closing.
+            session.audio_out = audio_out
+
             async def from_realtime_to_client():
                 async for event in realtime_client.receive():
-                    match event:
-                        case RealtimeAudioEvent():
-                            audio_data = event.audio.data
-                            audio_base64 = base64.b64encode(
-                                audio_data).decode('ascii')
-                            await ws.send_json({
-                                "type": "response.audio.delta",
-                                "delta": audio_base64
-                            })
-                        case _:
-                            match event.service_type:
-                                case ListenEvents.RESPONSE_AUDIO_TRANSCRIPT_DONE:
-                                    logger.info(
-                                        "Received response transcription.completed event: %s", event.service_event.transcript)
-                                    transcript = event.service_event.transcript
-                                    session["history"].add_assistant_message(
-                                        transcript)
-
-                                    # Retain only the last n turns.
-                                    await session["history"].reduce()
-                                    self.session_state.set(
-                                        session_state_key, session["history"])
-
-                                case ListenEvents.CONVERSATION_ITEM_INPUT_AUDIO_TRANSCRIPTION_COMPLETED:
-                                    logger.info(
-                                        "Received input transcription.completed event: %s", event.service_event.transcript)
-                                    transcript = event.service_event.transcript
-                                    if len(transcript) > 0:
-                                        session["history"].add_user_message(
-                                            transcript)
-
-                                        # Trigger intent detection – if enabled – so that conversation can be transferred.
-                                        if self.use_classification_model:
-                                            await self._detect_intent_change(session)
-                                            if session.get("target_agent_name") is not None:
-                                                await self._reinitialize_session(realtime_client, session)
-
-                                            # Generate response once intent is detected or agent swap (if any) is complete.
-                                            if session["active_response"] == False:
-                                                await realtime_client.send(RealtimeEvent(service_type="response.create"))
-
-                                    await session["history"].reduce()
-                                    self.session_state.set(
-                                        session_state_key, session["history"])
-
-                                case ListenEvents.RESPONSE_CREATED:
-                                    session["active_response"] = True
-
-                                case ListenEvents.RESPONSE_DONE:
-                                    session["active_response"] = False
-                                    if event.service_event.response.status != "completed":
-                                        logger.info(
-                                            "response.done event status: %s", event.service_event.response.status)
-                                        logger.info("response.done event status reason: %s",
-                                                    event.service_event.response.status_details.reason)
-
-                                case _:
-                                    try:
-                                        # For other events, convert any pydantic models to a dictionary.
-                                        e_payload = event.service_event
-                                        if hasattr(e_payload, "dict"):
-                                            e_payload = e_payload.dict()
-                                        await ws.send_json(e_payload)
-                                    except Exception as e:
-                                        logger.error(
-                                            "Error sending realtime event to client: %s", e)
-
-            await asyncio.gather(from_client_to_realtime(), from_realtime_to_client())
-
-    async def _websocket_handler(self, session_state_key: str, session: dict, request: web.Request) -> web.WebSocketResponse:
+                    await self._handle_realtime_event(session_state_key, session, client, realtime_client, event,
+                                                      binary_audio, client_events)
+
+            try:
+                await asyncio.gather(from_client_to_realtime(), from_realtime_to_client())
+            finally:
+                session.cancel_intent_tasks()
+                if audio_out is not None:
+                    audio_out.close()
+                    logger.info("Coalesced audio: %s", audio_out.stats())
+                    if session.audio_out is audio_out:
+                        session.audio_out = None
+                inbound.close()
+                client.close()
+                for task in senders:
+                    task.cancel()
+                logger.info("Relay queues of %s: inbound %s, outbound %s",
+                            session_state_key, inbound.stats(), client.stats())
+                if session.outbound is client:
+                    session.outbound = None
+
+    @staticmethod
+    async def _send_audio(ws: web.WebSocketResponse, audio: bytes, binary_audio: bool):
+        if binary_audio:
+            await ws.send_bytes(audio)
+            return
+        await ws.send_json({
+            "type": "response.audio.delta",
+            "delta": base64.b64encode(audio).decode('ascii')
+        }, dumps=json_codec.dumps)
+
+    async def _handle_realtime_event(self, session_state_key: str, session: Session, ws: web.WebSocketResponse,
+                                     realtime_client: AzureRealtimeWebsocket, event: RealtimeEvent,
+                                     binary_audio: bool = False,
+                                     client_events: Optional[frozenset[str]] = CLIENT_EVENTS):
+        # Drop everything still arriving from a reply cancelled by a speculative agent switch.
+        response_id = getattr(event.service_event, "response_id", None)
+        if response_id is not None and response_id == session.stale_response_id:
+            return
+        match event:
+            case RealtimeAudioEvent():
+                if session.turn_started_at is not None and session.first_audio_at is None:
+                    session.first_audio_at = time.perf_counter()
+                if session.audio_out is not None:
+                    await session.audio_out.add(event.audio.data, response_id)
+                else:
+                    await self._send_audio(ws, event.audio.data, binary_audio)
+            case _:
+                # Audio held for coalescing precedes this event. Transcript deltas, which the
+                # client only displays, arrive between the audio deltas and would keep
+                # every message down to a delta or two, so they don't send it. On a barge-in
+                # the client stops playing the reply, so its audio not yet sent is dropped.
+                if event.service_type == ListenEvents.INPUT_AUDIO_BUFFER_SPEECH_STARTED:
+                    if session.audio_out is not None:
+                        session.audio_out.clear()
+                    if session.outbound is not None:
+                        session.outbound.discard_audio()
+                elif (session.audio_out is not None
+                        and event.service_type != ListenEvents.RESPONSE_AUDIO_TRANSCRIPT_DELTA):
+                    await session.audio_out.flush()
+                match event.service_type:
+                    case ListenEvents.RESPONSE_AUDIO_TRANSCRIPT_DONE:
+                        logger.info(
+                            "Received response transcription.completed event: %s", event.service_event.transcript)
+                        transcript = event.service_event.transcript
+                        session.history.add_assistant_message(
+                            transcript)
+                        session.intent_window.append(f"assistant: {transcript}")
+                        self.session_state.append(session_state_key, "assistant", transcript)
+
+                        # Retain only the last n turns.
+                        await session.history.reduce()
+
+                    case ListenEvents.CONVERSATION_ITEM_INPUT_AUDIO_TRANSCRIPTION_COMPLETED:
+                        logger.info(
+                            "Received input transcription.completed event: %s", event.service_event.transcript)
+                        transcript = event.service_event.transcript
+                        if len(transcript) > 0:
+                            session.history.add_user_message(
+                                transcript)
+                            session.intent_window.append(f"user: {transcript}")
+                            self.session_state.append(session_state_key, "user", transcript)
+
+                            # Trigger intent detection – if enabled – so that conversation can be transferred.
+                            await self._on_user_turn(realtime_client, session, ws)
+
+                        await session.history.reduce()
+
+                    case ListenEvents.RESPONSE_FUNCTION_CALL_ARGUMENTS_DONE if self._is_transfer(event):
+                        await self._transfer(realtime_client, session, event.function_call)
+
+                    case ListenEvents.RESPONSE_CREATED:
+                        session.active_response = True
+                        session.response_requested = False
+                        session.response_id = event.service_event.response.id
+                        if session.stale_response_id is NEXT_RESPONSE:
+                            session.stale_response_id = session.response_id
+
+                    case ListenEvents.RESPONSE_DONE:
+                        session.active_response = False
+                        if event.service_event.response.status != "completed":
+                            logger.info(
+                                "response.done event status: %s", event.service_event.response.status)
+                            logger.info("response.done event status reason: %s",
+                                        event.service_event.response.status_details.reason)
+                        if event.service_event.response.id != session.stale_response_id:
+                            self._record_first_audio(session)
+
+                    case ListenEvents.ERROR if getattr(getattr(event.service_event, "error", None), "code", None) == "response_cancel_not_active":
+                        # A speculative reply finished before it could be cancelled.
+                        logger.info("Speculative response was already done when cancelled")
+
+                    case _:
+                        # Events of Semantic Kernel's own, such as the function result it sent
+                        # the service after calling a tool, carry no service event to relay.
+                        if event.service_event is None:
+                            return
+                        if client_events is not None and event.service_type not in client_events:
+                            return
+                        try:
+                            # Other events go out as the service sent them: the fields it set,
+                            # serialized straight from the pydantic model without a dict.
+                            e_payload = event.service_event
+                            if hasattr(e_payload, "model_dump_json"):
+                                await ws.send_str(e_payload.model_dump_json(exclude_unset=True))
+                            else:
+                                await ws.send_json(e_payload, dumps=json_codec.dumps)
+                        except Exception as e:
+                            logger.error(
+                                "Error sending realtime event to client: %s", e)
+
+    async def _websocket_handler(self, session_state_key: str, session: Session, request: web.Request) -> web.WebSocketResponse:
+        protocol = request.query.get("protocol", JSON_PROTOCOL)
+        if protocol not in (JSON_PROTOCOL, BINARY_PROTOCOL):
+            logger.warning("Unknown protocol %r requested, using %s", protocol, JSON_PROTOCOL)
+        client_events = CLIENT_EVENTS
+        if "events" in request.query:
+            client_events = parse_client_events(request.query["events"])
         ws = web.WebSocketResponse()
         await ws.prepare(request)
-        await self._forward_messages(session_state_key, session, ws)
+        await self._forward_messages(session_state_key, session, ws, binary_audio=protocol == BINARY_PROTOCOL,
+                                     client_events=client_events)
         return ws
 
     def attach_to_app(self, app, path):
@@ -426,7 +699,7 @@ class RTMiddleTier:
             customer_id = request.query.get("customer_id", "12345")
 
             # Try retrieving any backup conversation from persistent session_state.
-            init_history = self.session_state.get(session_state_key)
+            init_history = await self.session_state.get(session_state_key)
             logger.info("Initial history: %s", init_history)
             # Check if we already have a session for this key.
             session = self.sessions.get(session_state_key)
@@ -434,23 +707,36 @@ class RTMiddleTier:
                 if init_history is None:
                     init_history = ChatHistoryTruncationReducer(
                         target_count=self.max_history_length)
-                session = {
-                    "current_agent": self.default_agent,
-                    "current_agent_kernel": self.default_agent_kernel,
-                    "history": init_history,
-                    "target_agent_name": None,
-                    "transfer_conversation": False,
-                    "active_response": False,
-                    "realtime_settings": None,
-                    "customer_name": customer_name,
-                    "customer_id": customer_id,
-                }
+                session = self._new_session(init_history, customer_name, customer_id)
                 self.sessions[session_state_key] = session
             else:
                 if init_history:
-                    session["history"] = init_history
-                session["customer_name"] = customer_name
-                session["customer_id"] = customer_id
-            return await self._websocket_handler(session_state_key, session, request)
+                    session.history = init_history
+                    session.intent_window = self._intent_window(init_history)
+                session.customer_name = customer_name
+                session.customer_id = customer_id
+            # Keeps the reaper away from the session while the client is connected.
+            self.sessions.connect(session_state_key)
+            try:
+                return await self._websocket_handler(session_state_key, session, request)
+            finally:
+                self.sessions.disconnect(session_state_key)
+
+        async def _start_reaper(app):
+            self.sessions.start()
+
+        async def _close_clients(app):
+            logger.info("Intent classification: %s", intent_classifier.stats())
+            if self.intent_gate:
+                logger.info("Intent gate: %s", self.intent_gate.stats())
+            logger.info("Sessions: %s", self.sessions.stats())
+            await self.sessions.stop()
+            # Write the histories still waiting for the write-behind.
+            await self.session_state.close()
+            # Commit the booking changes still queued for the writers.
+            await asyncio.gather(asyncio.to_thread(flight_database.close), asyncio.to_thread(hotel_database.close))
+            await intent_shift_client.close()
 
         app.router.add_get(path, _handler_with_session_key)
+        app.on_startup.append(_start_reaper)
+        app.on_cleanup.append(_close_clients)
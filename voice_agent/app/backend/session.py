@@ -0,0 +1,137 @@
+"""
+Per-call state of RTMiddleTier.
+
+A Session holds only what differs from one call to the next: the conversation, the
+customer and the relay's flags. Everything that is the same for every call handled by
+an agent is an AgentTemplate, created once per agent when the agents are loaded and
+referenced by the sessions: the agent profile, its kernel, the persona and the realtime
+settings, shared by all agents. The instructions sent to the realtime service are
+formatted from the persona when settings are sent (on connect and on an agent switch),
+into a copy of the shared settings that lives as long as the connection; an idle
+session keeps neither.
+
+Session uses __slots__, so it has no per-instance __dict__, and creates the set of
+intent detection tasks only when speculative replies need one. While a client is
+connected, audio_out holds the connection's relay.AudioCoalescer, if audio is coalesced,
+and outbound its relay.ClientQueue. memory_bytes() estimates
+what a session holds on its own, leaving out the shared templates.
+"""
+
+import asyncio
+import sys
+from collections import deque
+from enum import Enum
+from typing import TYPE_CHECKING, Optional
+
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.open_ai import AzureRealtimeExecutionSettings
+from semantic_kernel.contents import ChatHistoryTruncationReducer
+
+if TYPE_CHECKING:
+    from relay import AudioCoalescer, ClientQueue
+
+
+class AgentTemplate:
+    """What every session handled by an agent shares; not to be modified once created."""
+
+    __slots__ = ("name", "profile", "kernel", "persona", "settings")
+
+    def __init__(self, profile: dict, kernel: Kernel, settings: AzureRealtimeExecutionSettings):
+        self.name = profile["name"]
+        self.profile = profile
+        self.kernel = kernel
+        self.persona = profile.get("persona", "")
+        self.settings = settings
+
+    def instructions(self, customer_name: str, customer_id: str) -> str:
+        return self.persona.format(customer_name=customer_name, customer_id=customer_id)
+
+    def settings_for(self, session: "Session") -> AzureRealtimeExecutionSettings:
+        """A copy of the shared settings with the session's instructions, for one connection.
+
+        The realtime client sets tools and the model id on the settings it is given, so
+        the shared instance is never passed to it.
+        """
+        return self.settings.model_copy(
+            update={"instructions": self.instructions(session.customer_name, session.customer_id)})
+
+
+class Session:
+    """One call's state, referencing its agent's AgentTemplate."""
+
+    __slots__ = (
+        "agent", "history", "intent_window", "customer_name", "customer_id",
+        "target_agent_name", "transfer_conversation", "active_response", "response_requested",
+        "response_id", "stale_response_id", "turn_started_at", "first_audio_at", "agent_switched",
+        "audio_out", "outbound", "_intent_tasks",
+    )
+
+    def __init__(self, agent: AgentTemplate, history: ChatHistoryTruncationReducer, intent_window: deque,
+                 customer_name: str, customer_id: str):
+        self.agent = agent
+        self.history = history
+        self.intent_window = intent_window
+        self.customer_name = customer_name
+        self.customer_id = customer_id
+        self.target_agent_name: Optional[str] = None
+        self.transfer_conversation = False
+        self.active_response = False
+        self.response_requested = False
+        self.response_id: Optional[str] = None
+        self.stale_response_id = None
+        self.turn_started_at: Optional[float] = None
+        self.first_audio_at: Optional[float] = None
+        self.agent_switched = False
+        self.audio_out: Optional["AudioCoalescer"] = None
+        self.outbound: Optional["ClientQueue"] = None
+        self._intent_tasks: Optional[set[asyncio.Task]] = None
+
+    @property
+    def current_agent(self) -> dict:
+        return self.agent.profile
+
+    @property
+    def current_agent_kernel(self) -> Kernel:
+        return self.agent.kernel
+
+    @property
+    def intent_tasks(self) -> set[asyncio.Task]:
+        if self._intent_tasks is None:
+            self._intent_tasks = set()
+        return self._intent_tasks
+
+    def cancel_intent_tasks(self) -> None:
+        for task in list(self._intent_tasks or ()):
+            task.cancel()
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by this session alone, leaving out its agent's shared template
+        and, like the connection's other buffers, its audio coalescer and relay queue."""
+        seen = {id(self.agent)}
+        size = sys.getsizeof(self)
+        for name in self.__slots__:
+            if name not in ("agent", "audio_out", "outbound"):
+                size += _deep_size(getattr(self, name), seen)
+        return size
+
+
+def _deep_size(obj, seen: set) -> int:
+    # Shared singletons (None, enum members, classes) and anything already counted add nothing.
+    if id(obj) in seen or obj is None or isinstance(obj, (bool, Enum, type)):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float)):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return size + sum(_deep_size(item, seen) for item in obj)
+    # Objects: their __dict__ and slots, including pydantic's private attributes.
+    if hasattr(obj, "__dict__"):
+        size += _deep_size(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name != "__dict__" and name != "__weakref__":
+                size += _deep_size(getattr(obj, name, None), seen)
+    return size
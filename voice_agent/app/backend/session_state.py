@@ -0,0 +1,387 @@
+"""
+Conversation history persistence for RTMiddleTier that never blocks the event loop.
+
+AsyncSessionState stores each session's history as a Redis list under
+"history:<session_state_key>", one compact record (role, text, timestamp) per message,
+on top of a pooled redis.asyncio client:
+
+- append() is called after every transcript, from the task relaying the session's audio.
+  It only encodes the message and returns; a background writer collects the appends made
+  within SESSION_WRITE_BEHIND_MS and sends them in one pipelined round trip, an RPUSH of
+  each session's new records followed by an LTRIM to the history window. A failed batch
+  is retried.
+- get() is awaited once per connecting client and rebuilds the ChatHistoryTruncationReducer
+  from the stored records, plus any not yet written. Sessions saved before by
+  utility.SessionState (a pickled reducer under the bare key) are still read when there
+  is no list for them.
+
+Records are msgpack arrays when msgpack is installed and JSON arrays otherwise; either is
+read back whichever wrote it. Without Redis configured (AZURE_REDIS_KEY), the records
+are kept in memory, in an LRU of SESSION_STORE_MAX_SESSIONS sessions that drops
+sessions idle for SESSION_STORE_TTL_SECONDS.
+
+SessionTable holds RTMiddleTier's live sessions (session.Session). A background reaper evicts
+sessions without a connected client once they have been idle for
+SESSION_IDLE_TTL_SECONDS, and the least recently used ones beyond SESSION_TABLE_MAX;
+their history is written out first, and a returning client gets it back from the
+store. Live sessions, their approximate size and evictions are exported as
+session.table.* OpenTelemetry instruments.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import pickle
+import random
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Callable, Optional
+
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from opentelemetry import metrics
+from semantic_kernel.contents import AuthorRole, ChatHistoryTruncationReducer, ChatMessageContent
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from agents.tools.cache import TTLLRUCache
+
+if TYPE_CHECKING:
+    from session import Session
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+SESSION_REDIS_MAX_CONNECTIONS = int(os.getenv("SESSION_REDIS_MAX_CONNECTIONS", 16))
+SESSION_REDIS_TIMEOUT_SECONDS = float(os.getenv("SESSION_REDIS_TIMEOUT_SECONDS", 5))
+SESSION_WRITE_BEHIND_MS = float(os.getenv("SESSION_WRITE_BEHIND_MS", 50))
+SESSION_WRITE_BATCH_MAX = int(os.getenv("SESSION_WRITE_BATCH_MAX", 256))
+SESSION_WRITE_RETRY_SECONDS = float(os.getenv("SESSION_WRITE_RETRY_SECONDS", 1))
+SESSION_STORE_MAX_SESSIONS = int(os.getenv("SESSION_STORE_MAX_SESSIONS", 20000))
+SESSION_STORE_TTL_SECONDS = float(os.getenv("SESSION_STORE_TTL_SECONDS", 86400))
+SESSION_TABLE_MAX = int(os.getenv("SESSION_TABLE_MAX", 10000))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", 1800))
+SESSION_REAP_INTERVAL_SECONDS = float(os.getenv("SESSION_REAP_INTERVAL_SECONDS", 60))
+# Sessions measured to estimate the table's memory; measuring them all walks every history.
+SESSION_SIZE_SAMPLE = 200
+
+HISTORY_KEY_PREFIX = "history:"
+
+meter = metrics.get_meter(__name__)
+session_evictions = meter.create_counter(
+    "session.table.evictions", description="Sessions evicted from the in-process table, by reason (idle, capacity)")
+
+
+def encode_message(role: str, text: str, timestamp: float) -> bytes:
+    if msgpack:
+        return msgpack.packb([role, text, timestamp])
+    return json.dumps([role, text, timestamp], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_message(record: bytes) -> tuple[str, str, float]:
+    # A JSON array starts with "["; a 3-element msgpack array with 0x93.
+    if record[:1] == b"[":
+        return tuple(json.loads(record))
+    return tuple(msgpack.unpackb(record))
+
+
+def redis_asyncio_client_from_env() -> Optional[aioredis.Redis]:
+    """A pooled redis.asyncio client for the SessionState settings, or None when Redis is not configured."""
+    AZURE_REDIS_ENDPOINT = os.getenv("AZURE_REDIS_ENDPOINT")
+    AZURE_REDIS_KEY = os.getenv("AZURE_REDIS_KEY")
+    if not AZURE_REDIS_KEY:
+        return None
+    # A blocking pool makes callers wait for a free connection instead of failing when all are in use.
+    pool = aioredis.BlockingConnectionPool(
+        connection_class=aioredis.SSLConnection, host=AZURE_REDIS_ENDPOINT, port=6380, password=AZURE_REDIS_KEY,
+        max_connections=SESSION_REDIS_MAX_CONNECTIONS, timeout=SESSION_REDIS_TIMEOUT_SECONDS,
+        socket_timeout=SESSION_REDIS_TIMEOUT_SECONDS, socket_connect_timeout=SESSION_REDIS_TIMEOUT_SECONDS)
+    return aioredis.Redis(connection_pool=pool)
+
+
+class AsyncSessionState:
+    """Session history store with pooled reads and write-behind, pipelined appends."""
+
+    def __init__(self, history_window: int, client: Optional[aioredis.Redis] = None,
+                 write_behind_ms: float = SESSION_WRITE_BEHIND_MS, batch_max: int = SESSION_WRITE_BATCH_MAX):
+        self.history_window = history_window
+        self.redis_client = client if client is not None else redis_asyncio_client_from_env()
+        self.write_behind_ms = write_behind_ms
+        self.batch_max = batch_max
+        self.session_store = TTLLRUCache(SESSION_STORE_MAX_SESSIONS, SESSION_STORE_TTL_SECONDS)
+        # Records not yet written to Redis, per key, and those of each batch being written.
+        self._pending: dict[str, list[bytes]] = {}
+        self._in_flight: list[dict[str, list[bytes]]] = []
+        # The writer and flush() (from the session reaper and on shutdown) write one batch
+        # at a time, so that a session's records reach Redis in order.
+        self._write_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.appends = 0
+        self.bytes_appended = 0
+        self.writes = 0
+        self.batches = 0
+        self.failures = 0
+        self.max_pending = 0
+        if self.redis_client:
+            logger.info("Using Redis for session storage")
+
+    async def get(self, key: str) -> Optional[ChatHistoryTruncationReducer]:
+        """The stored history for key, or None when there is none."""
+        if not self.redis_client:
+            records = list(self.session_store.get(key) or ())
+        else:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lrange(HISTORY_KEY_PREFIX + key, 0, -1)
+                pipe.get(key)
+                records, legacy = await pipe.execute()
+            # A batch written while reading shows up twice; the timestamp tells records apart.
+            in_flight = [record for batch in self._in_flight for record in batch.get(key, ())]
+            records = list(dict.fromkeys(records + in_flight + self._pending.get(key, [])))
+            if not records and legacy:
+                return pickle.loads(base64.b64decode(legacy))
+        if not records:
+            return None
+        history = ChatHistoryTruncationReducer(target_count=self.history_window)
+        for role, text, timestamp in map(decode_message, records[-self.history_window:]):
+            history.add_message(ChatMessageContent(role=AuthorRole(role), content=text,
+                                                   metadata={"timestamp": timestamp}))
+        return history
+
+    def append(self, key: str, role: str, text: str) -> None:
+        """Add a message to the history stored for key; with Redis, written shortly after."""
+        record = encode_message(role, text, time.time())
+        self.appends += 1
+        self.bytes_appended += len(record)
+        if not self.redis_client:
+            records = self.session_store.get(key) or deque(maxlen=self.history_window)
+            records.append(record)
+            # Set again to restart the entry's time to live.
+            self.session_store.set(key, records)
+            return
+        self._pending.setdefault(key, []).append(record)
+        self.max_pending = max(self.max_pending, len(self._pending))
+        if self._writer is None or self._writer.done():
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._write_behind())
+        self._wakeup.set()
+
+    async def _write_behind(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Let the appends of the next few turns join this batch.
+            await asyncio.sleep(self.write_behind_ms / 1000)
+            while self._pending:
+                if not await self._write_batch():
+                    await asyncio.sleep(SESSION_WRITE_RETRY_SECONDS)
+
+    async def _write_batch(self) -> bool:
+        async with self._write_lock:
+            if not self._pending:
+                # Written by the other caller while this one waited.
+                return True
+            keys = list(self._pending)[:self.batch_max]
+            batch = {key: self._pending.pop(key) for key in keys}
+            self._in_flight.append(batch)
+            try:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for key, records in batch.items():
+                        pipe.rpush(HISTORY_KEY_PREFIX + key, *records)
+                        pipe.ltrim(HISTORY_KEY_PREFIX + key, -self.history_window, -1)
+                    await pipe.execute()
+            except (aioredis.RedisError, OSError, asyncio.TimeoutError) as e:
+                self.failures += 1
+                logger.warning("Writing %d sessions to Redis failed, retrying: %s", len(batch), e)
+                self._requeue(batch)
+                return False
+            except asyncio.CancelledError:
+                # Shutting down mid-batch: close() writes it again.
+                self._requeue(batch)
+                raise
+            self._in_flight.remove(batch)
+            self.writes += len(batch)
+            self.batches += 1
+            return True
+
+    def _requeue(self, batch: dict[str, list[bytes]]) -> None:
+        # Appends made while the batch was in flight go after its records.
+        self._in_flight.remove(batch)
+        for key, records in batch.items():
+            self._pending[key] = records + self._pending.get(key, [])
+
+    async def flush(self) -> None:
+        """Write every pending append now."""
+        while self._pending:
+            if not await self._write_batch():
+                break
+
+    async def close(self) -> None:
+        if self._writer:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        if self.redis_client:
+            await self.flush()
+            if self._pending:
+                logger.error("Dropping unsaved messages of %d sessions on shutdown", len(self._pending))
+            await self.redis_client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "appends": self.appends,
+            "bytes_per_message": self.bytes_appended / self.appends if self.appends else 0.0,
+            "writes": self.writes,
+            "batches": self.batches,
+            "failures": self.failures,
+            "max_pending": self.max_pending,
+            "codec": "msgpack" if msgpack else "json",
+        }
+
+
+class SessionTable:
+    """RTMiddleTier's sessions by session_state_key, evicting idle ones in the background."""
+
+    def __init__(self, store: AsyncSessionState, max_sessions: int = SESSION_TABLE_MAX,
+                 idle_ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+                 reap_interval_seconds: float = SESSION_REAP_INTERVAL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.store = store
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.reap_interval_seconds = reap_interval_seconds
+        self._clock = clock
+        # Least recently active first.
+        self._sessions: OrderedDict[str, "Session"] = OrderedDict()
+        self._last_active: dict[str, float] = {}
+        self._connected: dict[str, int] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self.idle_evictions = 0
+        self.capacity_evictions = 0
+        meter.create_observable_gauge("session.table.sessions", callbacks=[self._observe_sessions],
+                                      description="Sessions held in the in-process table")
+        meter.create_observable_gauge("session.table.bytes", callbacks=[self._observe_bytes], unit="By",
+                                      description="Approximate memory held by the in-process session table")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sessions
+
+    def get(self, key: str) -> Optional["Session"]:
+        session = self._sessions.get(key)
+        if session is not None:
+            self._touch(key)
+        return session
+
+    def __setitem__(self, key: str, session: "Session") -> None:
+        self._sessions[key] = session
+        self._touch(key)
+
+    def connect(self, key: str) -> None:
+        """A client is using the session; it is not evicted until every client has disconnected."""
+        self._connected[key] = self._connected.get(key, 0) + 1
+        self._touch(key)
+
+    def disconnect(self, key: str) -> None:
+        if self._connected.get(key, 0) > 1:
+            self._connected[key] -= 1
+        else:
+            self._connected.pop(key, None)
+        if key in self._sessions:
+            self._touch(key)
+
+    def _touch(self, key: str) -> None:
+        self._sessions.move_to_end(key)
+        self._last_active[key] = self._clock()
+
+    async def reap(self) -> int:
+        """Evict idle sessions and, beyond max_sessions, the least recently active ones."""
+        idle_before = self._clock() - self.idle_ttl_seconds
+        over = len(self._sessions) - self.max_sessions
+        evicted: list[tuple[str, str]] = []
+        for key in self._sessions:
+            if key in self._connected:
+                continue
+            if self._last_active[key] < idle_before:
+                evicted.append((key, "idle"))
+            elif over > len(evicted):
+                evicted.append((key, "capacity"))
+            else:
+                # Everything after this one is more recently active.
+                break
+        if not evicted:
+            return 0
+        # Their history is already queued in the store; make sure it is written before the
+        # table lets go of them.
+        await self.store.flush()
+        count = 0
+        for key, reason in evicted:
+            # A client may have reconnected while the store was flushing.
+            if key in self._connected or key not in self._sessions:
+                continue
+            del self._sessions[key]
+            del self._last_active[key]
+            if reason == "idle":
+                self.idle_evictions += 1
+            else:
+                self.capacity_evictions += 1
+            session_evictions.add(1, {"reason": reason})
+            count += 1
+        logger.info("Evicted %d sessions, %d left", count, len(self._sessions))
+        return count
+
+    async def _reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval_seconds)
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("Reaping sessions failed")
+
+    def start(self) -> None:
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def stop(self) -> None:
+        if self._reaper:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+
+    def _observe_sessions(self, options):
+        yield metrics.Observation(len(self._sessions))
+
+    def _observe_bytes(self, options):
+        yield metrics.Observation(self.approx_bytes())
+
+    def approx_bytes(self, sample_size: int = SESSION_SIZE_SAMPLE) -> int:
+        """Memory held by the sessions, extrapolated from a random sample of them."""
+        # A copy, since the metrics reader calls this from its own thread.
+        sessions = list(self._sessions.values())
+        if len(sessions) > sample_size:
+            sample = random.sample(sessions, sample_size)
+            return sum(session.memory_bytes() for session in sample) * len(sessions) // sample_size
+        return sum(session.memory_bytes() for session in sessions)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "connected": len(self._connected),
+            "bytes": self.approx_bytes(),
+            "idle_evictions": self.idle_evictions,
+            "capacity_evictions": self.capacity_evictions,
+        }
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+# Modules read their settings at import time. The Azure OpenAI clients built from these
+# are never reached, and neither the intent router nor telemetry is needed.
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-01-preview")
+os.environ.update({"INTENT_ROUTER_ENABLED": "false", "TELEMETRY_SCENARIO": "none"})
+
+
+@pytest.fixture(scope="session")
+def middle_tier(tmp_path_factory):
+    """An RTMiddleTier whose tool plugins use throwaway databases, with agents transferring themselves."""
+    from benchmarks.fakes import import_tool_plugins
+
+    workdir = tmp_path_factory.mktemp("tools")
+    import_tool_plugins(str(workdir), str(workdir / "flight_db.db"), str(workdir / "hotel.db"))
+    import rtmt
+    from azure.core.credentials import AzureKeyCredential
+
+    tier = rtmt.RTMiddleTier("http://127.0.0.1", "fake", AzureKeyCredential("fake"))
+    tier.use_classification_model = False
+    tier._register_transfer_plugins()
+    return tier
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, select
+
+from agents.tools.db import Database
+
+metadata = MetaData()
+bookings = Table("bookings", metadata, Column("id", Integer, primary_key=True), Column("guest", String))
+
+
+def database(tmp_path) -> Database:
+    db = Database(f"sqlite:///{tmp_path / 'bookings.db'}")
+    db.create_schema(metadata)
+    return db
+
+
+def booked(db: Database) -> list[int]:
+    with db.session() as session:
+        return sorted(session.execute(select(bookings.c.id)).scalars())
+
+
+def test_failed_change_rolls_back_alone_and_none_runs_twice(tmp_path):
+    db = database(tmp_path)
+    calls = []
+
+    def book(booking_id):
+        def change(session):
+            calls.append(booking_id)
+            session.execute(bookings.insert().values(id=booking_id, guest="guest"))
+            return booking_id
+        return change
+
+    def fail(session):
+        calls.append("fail")
+        session.execute(bookings.insert().values(id=2, guest="guest"))
+        raise ValueError("no such reservation")
+
+    started, release = threading.Event(), threading.Event()
+
+    def hold(session):
+        started.set()
+        release.wait()
+
+    async def run():
+        # Queued while the writer is held up, so that it commits them as one group.
+        db.writer.submit(hold)
+        started.wait()
+        changes = asyncio.gather(db.write(book(1)), db.write(fail), db.write(book(3)), return_exceptions=True)
+        await asyncio.sleep(0)
+        release.set()
+        return await changes
+
+    first, failed, third = asyncio.run(run())
+    db.close()
+    assert (first, third) == (1, 3)
+    assert isinstance(failed, ValueError)
+    assert booked(db) == [1, 3]
+    assert sorted(calls, key=str) == [1, 3, "fail"]
+
+
+def test_close_commits_queued_changes(tmp_path):
+    db = database(tmp_path)
+    futures = [db.writer.submit(lambda session, n=n: session.execute(bookings.insert().values(id=n, guest="guest")))
+               for n in range(100)]
+    db.close()
+    assert all(future.done() for future in futures)
+    assert booked(db) == list(range(100))
+    try:
+        db.writer.submit(lambda session: None)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("submitted to a closed writer")
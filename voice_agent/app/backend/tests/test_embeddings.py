@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+from agents.tools.embeddings import EmbeddingBatcher
+
+
+class FakeEmbeddings:
+    """embeddings.create that leaves out the vectors of the inputs in skip."""
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+
+    async def create(self, input, model):
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(i)])
+                                     for i, text in enumerate(input) if text not in self.skip])
+
+
+def batcher(skip=()) -> EmbeddingBatcher:
+    return EmbeddingBatcher(SimpleNamespace(embeddings=FakeEmbeddings(skip)), max_batch_size=8, max_wait_ms=1)
+
+
+def test_batched_callers_get_their_own_vectors():
+    async def run():
+        embeddings = batcher()
+        return await asyncio.gather(*(embeddings.embed(text, "fake") for text in ("a", "b", "a")))
+
+    vectors = asyncio.run(run())
+    assert [vector.tolist() for vector in vectors] == [[0.0], [1.0], [0.0]]
+
+
+def test_response_missing_an_input_fails_only_its_callers():
+    async def run():
+        embeddings = batcher(skip={"b"})
+        return await asyncio.wait_for(asyncio.gather(
+            *(embeddings.embed(text, "fake") for text in ("a", "b", "c")), return_exceptions=True), timeout=1)
+
+    a, b, c = asyncio.run(run())
+    assert a.tolist() == [0.0] and c.tolist() == [2.0]
+    assert isinstance(b, ValueError)
+
+
+def test_malformed_response_fails_every_caller():
+    class Malformed:
+        async def create(self, input, model):
+            return SimpleNamespace(data=[SimpleNamespace(index=len(input), embedding=[0.0])])
+
+    async def run():
+        embeddings = EmbeddingBatcher(SimpleNamespace(embeddings=Malformed()), max_batch_size=8, max_wait_ms=1)
+        return await asyncio.wait_for(asyncio.gather(
+            *(embeddings.embed(text, "fake") for text in ("a", "b")), return_exceptions=True), timeout=1)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, IndexError) for result in results)
@@ -0,0 +1,66 @@
+import asyncio
+
+from intent import CircuitBreaker, ClassifierBackend, HedgedIntentClassifier, IntentGate
+
+
+async def hang(conversation, agents):
+    await asyncio.sleep(60)
+
+
+def test_cancelled_classification_counts_against_nothing():
+    async def run():
+        backend = ClassifierBackend("aml", hang, CircuitBreaker(failure_threshold=3))
+        classifier = HedgedIntentClassifier([backend], budget_ms=5000)
+        for _ in range(5):
+            task = asyncio.create_task(classifier.classify("user: change my flight"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            else:
+                raise AssertionError("classify swallowed the cancellation")
+        return backend, classifier
+
+    backend, classifier = asyncio.run(run())
+    assert backend.breaker.state == CircuitBreaker.CLOSED
+    assert backend.timeouts == 0
+    assert classifier.budget_exhausted == 0
+    assert classifier.unavailable == 0
+
+
+def test_cancelled_classification_gives_back_the_half_open_probe():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+        breaker.record_failure()
+        classifier = HedgedIntentClassifier([ClassifierBackend("aml", hang, breaker)], budget_ms=5000)
+        task = asyncio.create_task(classifier.classify("user: change my flight"))
+        await asyncio.sleep(0.01)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.failures == 1
+
+
+def test_gate_classifies_questions_made_of_short_words():
+    gate = IntentGate()
+    assert gate.should_classify("Is it all for me?")
+    assert gate.should_classify("Can I go?")
+
+
+def test_gate_classifies_turns_in_any_script():
+    gate = IntentGate()
+    assert gate.should_classify("我想改我的航班")
+    assert gate.should_classify("Я хочу изменить рейс")
+
+
+def test_gate_skips_acknowledgements():
+    gate = IntentGate()
+    for turn in ("Okay, thanks!", "Got it, thank you very much.", "Yes, that's right", "uh huh", "ok"):
+        assert not gate.should_classify(turn), turn
+    assert gate.skipped == 5
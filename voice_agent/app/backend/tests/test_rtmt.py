@@ -0,0 +1,70 @@
+import asyncio
+import json
+import logging
+import random
+
+from semantic_kernel.contents import ChatHistoryTruncationReducer, FunctionResultContent, RealtimeFunctionResultEvent
+from semantic_kernel.connectors.ai.open_ai.services._open_ai_realtime import SendEvents
+
+from benchmarks.bench_client_events import parse, typical_call
+from relay import ClientQueue
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent: list[str] = []
+
+    async def send_str(self, data: str) -> None:
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.sent.append(data)
+
+
+class NullRealtimeClient:
+    async def send(self, event) -> None:
+        pass
+
+    async def update_session(self, **kwargs) -> None:
+        pass
+
+
+def tool_call_turn() -> list:
+    """The events of a user turn answered by a tool call, then a spoken reply."""
+    events = asyncio.run(parse(typical_call(2, 100, random.Random(0))))
+    # Having called the tool, Semantic Kernel yields the result it sent the service too.
+    done = max(i for i, event in enumerate(events) if getattr(event.service_event, "response", None)
+               and event.service_event.response.id == "resp_call_1" and event.service_type == "response.done")
+    result = RealtimeFunctionResultEvent(
+        service_type=SendEvents.CONVERSATION_ITEM_CREATE,
+        function_result=FunctionResultContent(id="item_call_1", call_id="call_1", plugin_name="flight",
+                                              function_name="search_flights", result="No flights found"))
+    return events[:done] + [result] + events[done:]
+
+
+def test_all_events_relayed_without_semantic_kernel_events(middle_tier, caplog):
+    events = tool_call_turn()
+
+    async def run():
+        socket = RecordingSocket()
+        client = ClientQueue(socket)
+        sender = asyncio.create_task(client.run())
+        session = middle_tier._new_session(
+            ChatHistoryTruncationReducer(target_count=middle_tier.max_history_length), "Test", "1")
+        for event in events:
+            await middle_tier._handle_realtime_event("events-1", session, client, NullRealtimeClient(), event,
+                                                     False, None)
+        while client.items:
+            await asyncio.sleep(0.01)
+        client.close()
+        sender.cancel()
+        return socket.sent
+
+    with caplog.at_level(logging.ERROR):
+        sent = asyncio.run(run())
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+    messages = [json.loads(message) for message in sent]
+    assert None not in messages
+    types = {message["type"] for message in messages}
+    assert "response.function_call_arguments.delta" in types
+    assert SendEvents.CONVERSATION_ITEM_CREATE not in types
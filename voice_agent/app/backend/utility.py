@@ -1,4 +1,4 @@
-import os, yaml, random, json, yaml, asyncio, time, aiohttp, urllib.request, ssl, redis, pickle, base64, logging
+import os, yaml, random, json, yaml, asyncio, time, aiohttp, redis, pickle, base64, logging
 from typing import Any
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
@@ -9,6 +9,8 @@ from pathlib import Path
 from scipy import spatial  # for calculating vector similarities for search
 from typing import Dict
 
+from intent import ClassifierBackend, HedgedIntentClassifier, IntentShiftClient, agent_domain
+
 # Begin imports section for SK Logging, Tracing, and Metrics
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.semconv.resource import ResourceAttributes
@@ -169,7 +171,7 @@ def set_up_metrics(scenario="console", connection_string=None, endpoint=None, se
     """
     # Use a singleton meter provider and add metric readers for each exporter
     if not hasattr(set_up_metrics, "_meter_provider"):
-        views = [View(instrument_name="semantic_kernel*")]
+        views = [View(instrument_name="semantic_kernel*"), View(instrument_name="intent*")]
         if DROP_AGGREGATION_AVAILABLE:
             views.insert(0, View(instrument_name="*", aggregation=DropAggregation()))
         set_up_metrics._meter_provider = MeterProvider(resource=get_resource("console"), views=views)
@@ -225,74 +227,53 @@ AZURE_OPENAI_4O_MINI_DEPLOYMENT = os.environ.get(
     "AZURE_OPENAI_4O_MINI_DEPLOYMENT")
 
 
-def allowSelfSignedHttps(allowed):
-    if allowed and not os.environ.get('PYTHONHTTPSVERIFY', '') and getattr(ssl, '_create_unverified_context', None):
-        ssl._create_default_https_context = ssl._create_unverified_context
+intent_shift_client = IntentShiftClient(
+    INTENT_SHIFT_API_URL, INTENT_SHIFT_API_KEY, INTENT_SHIFT_API_DEPLOYMENT)
+
+
+def classifier_prompt(agents=None):
+    """System prompt for the gpt-4o-mini classifier, listing the loaded agents' domains."""
+    if agents:
+        domains = "\n".join(
+            f"- **{agent['name']}**: {agent_domain(agent)}" for agent in agents)
+    else:
+        domains = "- **hotel_agent**: Deal with hotel reservations, confirmations, changes, and general hotel policy questions.\n- **flight_agent**: Deal with flight reservations, confirmations, changes, and general airline policy questions."
+    return f"You are a classifier model whose job is to classify the intent of the most recent user question into one of the following domains:\n\n{domains}\n\nYou must only respond with the name of the predicted agent."
+
+
+async def classify_with_aml(conversation, agents=None):
+    return await intent_shift_client.classify(conversation)
 
 
-allowSelfSignedHttps(True)
+async def classify_with_gpt_4o_mini(conversation, agents=None):
+    messages = [
+        {"role": "system", "content": classifier_prompt(agents)},
+        {"role": "user", "content": conversation}
+    ]
+    response = await async_client.chat.completions.create(
+        model=AZURE_OPENAI_4O_MINI_DEPLOYMENT,
+        messages=messages,
+        max_tokens=20
+    )
+    return response.choices[0].message.content.strip()
 
 
-async def detect_intent(conversation):
+def create_intent_classifier():
+    """The AML endpoint first when configured, hedged with gpt-4o-mini."""
+    backends = []
     if INTENT_SHIFT_API_URL:
-        start_time = time.time()
-        # Prepare the request data
-        # Format the data according to the ServiceInput schema
-        value = f"{conversation}"
-        data = {
-            "input_data": {
-                "columns": ["input_string"],
-                "index": [0],
-                # Wrap value in a list to match the expected structure
-                "data": [[value]]
-            },
-            "params": {}
-        }
-
-        # Encode the data as JSON
-        body = json.dumps(data).encode('utf-8')
-
-        # Check if the API key is provided
-        if not INTENT_SHIFT_API_KEY:
-            raise Exception("A key should be provided to invoke the endpoint")
-
-        # Set the headers
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {INTENT_SHIFT_API_KEY}',
-            'azureml-model-deployment': INTENT_SHIFT_API_DEPLOYMENT
-        }
-
-        # Make the request
-        req = urllib.request.Request(
-            INTENT_SHIFT_API_URL, body, headers=headers)
-
-        try:
-            response = urllib.request.urlopen(req)
-            result = response.read()
-            result = json.loads(result)[0]['0'].strip()
-            end_time = time.time()
-            print(f"Job succeeded in {end_time - start_time:.2f} seconds.")
-            return result
-
-        except urllib.error.HTTPError as error:
-            print("The request failed with status code: " + str(error.code))
-            print(error.info())
-            print(error.read().decode("utf8", 'ignore'))
-            return None
-    else:
-        # fallback to gpt-4o-mini
-        messages = [
-            {"role": "system", "content": "You are a classifier model whose job is to classify the intent of the most recent user question into one of the following domains:\n\n- **hotel_agent**: Deal with hotel reservations, confirmations, changes, and general hotel policy questions.\n- **flight_agent**: Deal with flight reservations, confirmations, changes, and general airline policy questions.\n\nYou must only respond with the name of the predicted agent."},
-            {"role": "user", "content": conversation}
-        ]
-        response = await async_client.chat.completions.create(
-            model=AZURE_OPENAI_4O_MINI_DEPLOYMENT,
-            messages=messages,
-            max_tokens=20
-        )
-        intent = response.choices[0].message.content.strip()
-        return intent
+        backends.append(ClassifierBackend("aml", classify_with_aml))
+    if AZURE_OPENAI_4O_MINI_DEPLOYMENT or not backends:
+        backends.append(ClassifierBackend("gpt-4o-mini", classify_with_gpt_4o_mini))
+    return HedgedIntentClassifier(backends)
+
+
+intent_classifier = create_intent_classifier()
+
+
+async def detect_intent(conversation, agents=None):
+    """The predicted agent name, or None to stay on the current agent."""
+    return await intent_classifier.classify(conversation, agents)
 
 
 class SessionState:
@@ -310,8 +291,8 @@ class SessionState:
 
     def get(self, key):
         if self.redis_client:
-            self.data = self.redis_client.get(key)
-            return pickle.loads(base64.b64decode(self.data)) if self.data else None
+            data = self.redis_client.get(key)
+            return pickle.loads(base64.b64decode(data)) if data else None
         else:
             return self.session_store.get(key)
 
@@ -6,6 +6,7 @@ const fs = require("fs");
 const app = express();  
 const port = process.env.PORT || 3000;  
 const backendWsUrl = process.env.VITE_BACKEND_WS_URL || "ws://localhost:8765";  
+const binaryAudio = process.env.VITE_BINARY_AUDIO || "false";
 console.log("process.env.VITE_BACKEND_WS_URL =", process.env.VITE_BACKEND_WS_URL);
 
   
@@ -29,7 +30,7 @@ app.get("/*", (req, res) => {
     // Inject inline script to set window.__env  
     const injectedData = data.replace(  
       "<head>",  
-      `<head><script> window.__env = { VITE_BACKEND_WS_URL: "${backendWsUrl}" }; </script>`  
+      `<head><script> window.__env = { VITE_BACKEND_WS_URL: "${backendWsUrl}", VITE_BINARY_AUDIO: "${binaryAudio}" }; </script>`  
     );  
     // Debug line to print injectedData  
     console.log("Injected data:", injectedData);  
@@ -21,6 +21,7 @@
 
         const { startSession, addUserAudio, inputAudioBufferClear } = useRealTime({
             enableInputAudioTranscription: true, // Enable input audio transcription 
+            binaryAudio: (window.__env?.VITE_BINARY_AUDIO || import.meta.env.VITE_BINARY_AUDIO) === "true",
             onWebSocketOpen: () => console.log("WebSocket connection opened"),
             onWebSocketClose: () => console.log("WebSocket connection closed"),
             onWebSocketError: event => console.error("WebSocket error:", event),
@@ -2,6 +2,7 @@ declare global {
     interface Window {
     __env?: {
     VITE_BACKEND_WS_URL: string;
+    VITE_BINARY_AUDIO?: string;
     // add other runtime environment variables as needed.
     };
     }
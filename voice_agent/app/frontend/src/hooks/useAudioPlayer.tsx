@@ -12,10 +12,16 @@ export default function useAudioPlayer() {
         audioPlayer.current.init(SAMPLE_RATE);
     };
 
-    const play = (base64Audio: string) => {
-        const binary = atob(base64Audio);
-        const bytes = Uint8Array.from(binary, c => c.charCodeAt(0));
-        const pcmData = new Int16Array(bytes.buffer);
+    // Base64 from a JSON response.audio.delta, or the raw PCM16 of a binary frame.
+    const play = (audio: string | ArrayBuffer) => {
+        let pcmData: Int16Array;
+        if (typeof audio === "string") {
+            const binary = atob(audio);
+            const bytes = Uint8Array.from(binary, c => c.charCodeAt(0));
+            pcmData = new Int16Array(bytes.buffer);
+        } else {
+            pcmData = new Int16Array(audio);
+        }
 
         audioPlayer.current?.play(pcmData);
     };
@@ -4,7 +4,7 @@ import { Recorder } from "@/components/audio/recorder";
 const BUFFER_SIZE = 4800;
 
 type Parameters = {
-    onAudioRecorded: (base64: string) => void;
+    onAudioRecorded: (pcm: Uint8Array) => void;
 };
 
 export default function useAudioRecorder({ onAudioRecorded }: Parameters) {
@@ -27,10 +27,7 @@ export default function useAudioRecorder({ onAudioRecorded }: Parameters) {
             const toSend = new Uint8Array(buffer.slice(0, BUFFER_SIZE));
             buffer = new Uint8Array(buffer.slice(BUFFER_SIZE));
 
-            const regularArray = String.fromCharCode(...toSend);
-            const base64 = btoa(regularArray);
-
-            onAudioRecorded(base64);
+            onAudioRecorded(toSend);
         }
     };
 
@@ -19,6 +19,8 @@ type Parameters = {
     aoaiModelOverride?: string;
 
     enableInputAudioTranscription?: boolean;
+    // If true, audio is sent and received as raw PCM16 in binary frames (?protocol=binary) instead of base64 in JSON
+    binaryAudio?: boolean;
     onWebSocketOpen?: () => void;
     onWebSocketClose?: () => void;
     onWebSocketError?: (event: Event) => void;
@@ -39,6 +41,7 @@ export default function useRealTime({
     aoaiApiKeyOverride,
     aoaiModelOverride,
     enableInputAudioTranscription,
+    binaryAudio,
     onWebSocketOpen,
     onWebSocketClose,
     onWebSocketError,
@@ -69,11 +72,15 @@ export default function useRealTime({
 
     const wsEndpoint = useDirectAoaiApi  
         ? `${aoaiEndpointOverride}/openai/realtime?api-key=${aoaiApiKeyOverride}&deployment=${aoaiModelOverride}&api-version=2024-10-01-preview`  
-        : `${backendWsUrl}/realtime?session_state_key=${sessionKey}`;  
+        : `${backendWsUrl}/realtime?session_state_key=${sessionKey}${binaryAudio ? "&protocol=binary" : ""}`;  
 
     
-    const { sendJsonMessage } = useWebSocket(wsEndpoint, {
-        onOpen: () => onWebSocketOpen?.(),
+    const { sendJsonMessage, sendMessage } = useWebSocket(wsEndpoint, {
+        onOpen: event => {
+            // Binary frames arrive as ArrayBuffers rather than Blobs, so they can be played without awaiting.
+            (event.target as WebSocket).binaryType = "arraybuffer";
+            onWebSocketOpen?.();
+        },
         onClose: () => onWebSocketClose?.(),
         onError: event => onWebSocketError?.(event),
         onMessage: event => onMessageReceived(event),
@@ -103,10 +110,15 @@ export default function useRealTime({
         sendJsonMessage(command);
     };
 
-    const addUserAudio = (base64Audio: string) => {
+    const addUserAudio = (pcm: Uint8Array) => {
+        if (binaryAudio && !useDirectAoaiApi) {
+            sendMessage(pcm);
+            return;
+        }
+
         const command: InputAudioBufferAppendCommand = {
             type: "input_audio_buffer.append",
-            audio: base64Audio
+            audio: btoa(String.fromCharCode(...pcm))
         };
 
         sendJsonMessage(command);
@@ -123,6 +135,11 @@ export default function useRealTime({
     const onMessageReceived = (event: MessageEvent<any>) => {
         onWebSocketMessage?.(event);
 
+        if (event.data instanceof ArrayBuffer) {
+            onReceivedResponseAudioDelta?.({ type: "response.audio.delta", delta: event.data });
+            return;
+        }
+
         let message: Message;
         try {
             message = JSON.parse(event.data);
@@ -41,7 +41,8 @@ export type Message = {
 
 export type ResponseAudioDelta = {
     type: "response.audio.delta";
-    delta: string;
+    // Base64 PCM16, or the raw PCM16 of a binary frame when binaryAudio is on.
+    delta: string | ArrayBuffer;
 };
 
 export type ResponseAudioTranscriptDelta = {